@@ -1,18 +1,27 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
-from fastapi.responses import JSONResponse
+import asyncio
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Query, WebSocket, Depends, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import logging
-from typing import List
+from typing import Any, Awaitable, Dict, List, Optional
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 from config import Config
 from src.services.defect_detection_service import DefectDetectionService
+from src.services.frame_stream import FrameStream
+from src.services.job_manager import JobManager
+from src.services.job_store import JobStore
+from src.utils.deadline import record_cancellation
+from src.utils.metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from src.utils.uploads import UploadLimitMiddleware
+from src.utils.response_encoder import PACKED_MEDIA_TYPE, ResponseEncoder
+from src.utils.tracing import RequestTrace, SamplingProfiler
 
 logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL), format=Config.LOG_FORMAT)
 logger = logging.getLogger(__name__)
 
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(key_func=get_remote_address, enabled=Config.RATE_LIMIT_ENABLED)
 
 app = FastAPI(
     title=Config.API_TITLE,
@@ -23,19 +32,110 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# Refuse oversized uploads before their multipart body is parsed
+app.add_middleware(UploadLimitMiddleware, limits=Config.get_upload_limits())
+
+metrics_config = Config.get_metrics_config()
+if metrics_config["enabled"]:
+    app.add_middleware(MetricsMiddleware)
+
 detection_service = None
+job_manager = None
+response_encoder = ResponseEncoder()
+
+def encoded_response(data: Dict[str, Any], media_type: str) -> Response:
+    """Encode a prediction response in the negotiated media type"""
+    return Response(
+        content=response_encoder.encode(data, media_type),
+        media_type=media_type,
+        headers={"Vary": "Accept"}
+    )
+
+async def cancel_on_disconnect(request: Request, prediction: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Await a prediction, cancelling its queued and running work if the client disconnects first"""
+    task = asyncio.ensure_future(prediction)
+    
+    async def disconnected() -> None:
+        # The body has been read, so the next message is the disconnect
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+    
+    watcher = asyncio.ensure_future(disconnected())
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            await asyncio.wait({task})
+    
+    if task.cancelled():
+        record_cancellation()
+        logger.info(f"Client disconnected, cancelled {request.url.path} request")
+        raise HTTPException(status_code=499, detail="Client disconnected")
+    return task.result()
+
+async def traced_prediction(request: Request, prediction: Awaitable[Dict[str, Any]], media_type: str,
+                            profiler: Optional[SamplingProfiler] = None) -> Response:
+    """Run a prediction under a request trace and report its stages in Server-Timing
+    
+    With a profiler the request is also sampled and the response gains a
+    "profile" entry with stage timings and collapsed stacks. The prediction
+    is cancelled if the client disconnects before it completes.
+    """
+    with RequestTrace() as trace:
+        if profiler is not None and not profiler.start():
+            prediction.close()
+            raise HTTPException(status_code=429, detail="Another request is being profiled")
+        try:
+            result = await cancel_on_disconnect(request, prediction)
+        finally:
+            if profiler is not None:
+                profiler.stop()
+        
+        if profiler is not None:
+            result["profile"] = {"stages_ms": trace.totals(), **profiler.summary()}
+        response = encoded_response(result, media_type)
+    
+    if Config.SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
-    global detection_service
+    global detection_service, job_manager
     try:
+        if metrics_config["enabled"]:
+            REGISTRY.start(metrics_config["multiprocess_dir"], metrics_config["flush_seconds"])
+        
         detection_service = DefectDetectionService()
+        
+        job_config = Config.get_job_config()
+        job_manager = JobManager(
+            detection_service,
+            JobStore(job_config["db_path"], lease_seconds=job_config["lease_seconds"]),
+            storage_path=job_config["storage_path"],
+            directory_root=job_config["directory_root"],
+            workers=job_config["workers"],
+            max_images=job_config["max_images"],
+            max_file_bytes=job_config["max_file_bytes"]
+        )
+        await job_manager.start()
         logger.info("Application started successfully")
     except Exception as e:
         logger.error(f"Failed to start application: {str(e)}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release service resources on shutdown"""
+    if job_manager is not None:
+        await job_manager.stop()
+    if detection_service is not None:
+        detection_service.shutdown()
+    REGISTRY.stop()
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -53,39 +153,243 @@ async def health_check():
         "service_info": service_info
     }
 
+def tiling_options(
+    tiled: bool = Query(False),
+    tile_size: Optional[int] = Query(None, ge=64, le=4096),
+    tile_overlap: Optional[float] = Query(None, ge=0, lt=1),
+    tile_batch_size: Optional[int] = Query(None, ge=1, le=64)
+) -> Optional[Dict[str, Any]]:
+    """Per-request tiled inference overrides; None when tiling was not requested"""
+    overrides = {"tile_size": tile_size, "overlap": tile_overlap, "tile_batch_size": tile_batch_size}
+    if not tiled and all(value is None for value in overrides.values()):
+        return None
+    return overrides
+
+MODEL_NAME_PATTERN = "^[A-Za-z0-9][A-Za-z0-9._-]*$"
+
+def model_options(
+    model: Optional[str] = Query(None, pattern=MODEL_NAME_PATTERN),
+    model_version: Optional[str] = Query(None, pattern=MODEL_NAME_PATTERN)
+) -> Dict[str, Optional[str]]:
+    """Registry model (and optionally a pinned version) to serve the request; the default model when omitted"""
+    return {"model_name": model, "model_version": model_version}
+
+def profile_option(profile: bool = Query(False)) -> Optional[SamplingProfiler]:
+    """Sampling profiler for ?profile=1, only when profiling is enabled in the config"""
+    if not profile:
+        return None
+    if not Config.PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiling is disabled")
+    return SamplingProfiler(Config.PROFILE_INTERVAL_MS, Config.PROFILE_MAX_STACKS)
+
 @app.post("/predict/")
 @limiter.limit(Config.RATE_LIMIT_SINGLE)
-async def predict(request: Request, file: UploadFile = File(...)):
+async def predict(
+    request: Request,
+    file: UploadFile = File(...),
+    tiling: Optional[Dict[str, Any]] = Depends(tiling_options),
+    layout: str = Query("objects", pattern="^(objects|columnar)$"),
+    model: Dict[str, Optional[str]] = Depends(model_options),
+    profiler: Optional[SamplingProfiler] = Depends(profile_option)
+):
     """
     Predict defects in uploaded PCB image
     
     Args:
         file: Image file (JPEG, PNG, etc.)
+        tiling: Tiled inference settings for high-resolution panels (optional)
+        layout: "objects" (one object per defect) or "columnar" (parallel arrays)
+        model: Registry model name and version (optional, see GET /models)
+        profiler: Sampling profiler when ?profile=1 is allowed and requested
     
     Returns:
-        JSON response with detected defects and bounding boxes
+        Detected defects and bounding boxes as JSON, or MessagePack / packed
+        arrays when requested through the Accept header; stage timings are
+        reported in the Server-Timing header
     """
     if detection_service is None:
         raise HTTPException(status_code=503, detail="Service not initialized")
     
-    return await detection_service.predict_single(file)
+    media_type = response_encoder.negotiate(request.headers.get("accept"))
+    if media_type == PACKED_MEDIA_TYPE:
+        layout = "columnar"
+    if tiling is not None:
+        tiling = detection_service.resolve_tiling(**tiling)
+    
+    return await traced_prediction(
+        request,
+        detection_service.predict_single(file, tiling, layout=layout, **model), media_type, profiler
+    )
 
 @app.post("/predict/batch/")
 @limiter.limit(Config.RATE_LIMIT_BATCH)
-async def predict_batch(request: Request, files: List[UploadFile] = File(...)):
+async def predict_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    tiling: Optional[Dict[str, Any]] = Depends(tiling_options),
+    layout: str = Query("objects", pattern="^(objects|columnar)$"),
+    model: Dict[str, Optional[str]] = Depends(model_options),
+    profiler: Optional[SamplingProfiler] = Depends(profile_option)
+):
     """
     Predict defects in multiple uploaded PCB images
     
     Args:
         files: List of image files
+        tiling: Tiled inference settings for high-resolution panels (optional)
+        layout: "objects" (one object per defect) or "columnar" (parallel arrays)
+        model: Registry model name and version (optional, see GET /models)
+        profiler: Sampling profiler when ?profile=1 is allowed and requested
     
     Returns:
-        JSON response with predictions for each image
+        Predictions for each image as JSON, or MessagePack / packed arrays
+        when requested through the Accept header; stage timings (summed over
+        images) are reported in the Server-Timing header
     """
     if detection_service is None:
         raise HTTPException(status_code=503, detail="Service not initialized")
     
-    return await detection_service.predict_batch(files)
+    media_type = response_encoder.negotiate(request.headers.get("accept"))
+    if media_type == PACKED_MEDIA_TYPE:
+        layout = "columnar"
+    if tiling is not None:
+        tiling = detection_service.resolve_tiling(**tiling)
+    
+    return await traced_prediction(
+        request,
+        detection_service.predict_batch(files, tiling, layout=layout, **model), media_type, profiler
+    )
+
+@app.post("/predict/batch/stream")
+@limiter.limit(Config.RATE_LIMIT_BATCH)
+async def predict_batch_stream(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    format: Optional[str] = Query(None, pattern="^(ndjson|sse)$"),
+    tiling: Optional[Dict[str, Any]] = Depends(tiling_options),
+    layout: str = Query("objects", pattern="^(objects|columnar)$"),
+    model: Dict[str, Optional[str]] = Depends(model_options)
+):
+    """
+    Stream predictions for multiple uploaded PCB images as they complete
+    
+    Args:
+        files: List of image files
+        format: "ndjson" (one JSON object per line) or "sse" (Server-Sent Events);
+            defaults to SSE when the client accepts text/event-stream
+        tiling: Tiled inference settings for high-resolution panels (optional)
+        layout: "objects" (one object per defect) or "columnar" (parallel arrays)
+        model: Registry model name and version (optional, see GET /models)
+    
+    Returns:
+        One record per image in completion order, then a summary record
+    """
+    if detection_service is None:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+    
+    if tiling is not None:
+        tiling = detection_service.resolve_tiling(**tiling)
+    records = detection_service.predict_batch_stream(files, tiling, layout=layout, **model)
+    formatter = detection_service.response_formatter
+    
+    if format is None:
+        format = "sse" if "text/event-stream" in request.headers.get("accept", "") else "ndjson"
+    
+    if format == "sse":
+        async def events():
+            async for record in records:
+                yield formatter.to_sse(record, "summary" if "summary" in record else "result")
+        
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    async def lines():
+        async for record in records:
+            yield formatter.to_ndjson(record)
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.websocket("/ws/predict")
+async def predict_stream(websocket: WebSocket):
+    """
+    Stream image frames over a WebSocket and receive predictions on the same socket
+    
+    The server sends {"type": "credit", "credits": n} messages; each binary
+    frame uses one credit and the credit is returned with its result.
+    """
+    await websocket.accept()
+    
+    if detection_service is None or not detection_service.is_ready():
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Service not ready")
+        return
+    
+    await FrameStream(detection_service, websocket, credits=Config.STREAM_CREDITS).run()
+
+# Documents the multipart form that create_job parses itself
+JOB_FORM_SCHEMA = {
+    "requestBody": {
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+                        "directory": {"type": "string"}
+                    }
+                }
+            }
+        }
+    }
+}
+
+@app.post("/jobs", status_code=202, openapi_extra=JOB_FORM_SCHEMA)
+@limiter.limit(Config.RATE_LIMIT_BATCH)
+async def create_job(request: Request):
+    """
+    Submit an asynchronous inspection job
+    
+    Form fields:
+        files: Image files to inspect (up to JOB_MAX_IMAGES)
+        directory: Server-local directory of images (alternative to files)
+    
+    Returns:
+        Job id to poll with GET /jobs/{job_id}
+    """
+    if job_manager is None:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+    
+    # Parsed here instead of through File() parameters, whose parser stops at 1000 files
+    async with request.form(max_files=Config.JOB_MAX_IMAGES, max_fields=Config.JOB_MAX_IMAGES) as form:
+        directory = form.get("directory")
+        files = [file for file in form.getlist("files") if not isinstance(file, str)]
+        
+        if isinstance(directory, str) and directory:
+            return await job_manager.submit_directory(directory)
+        if files:
+            return await job_manager.submit_uploads(files)
+    raise HTTPException(status_code=400, detail="Provide image files or a directory path")
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(Config.JOB_RESULTS_PAGE_SIZE, ge=1, le=Config.JOB_RESULTS_PAGE_SIZE)
+):
+    """
+    Get job progress and a page of results
+    
+    Args:
+        job_id: Id returned by POST /jobs
+        offset: Index of the first result to return
+        limit: Number of results to return
+    """
+    if job_manager is None:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+    
+    return await job_manager.get_job(job_id, offset, limit)
 
 @app.get("/info")
 async def get_info():
@@ -95,6 +399,49 @@ async def get_info():
     
     return detection_service.get_service_info()
 
+@app.get("/models")
+async def list_models():
+    """List registry models with their versions, active version and resident entries"""
+    if detection_service is None:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+    
+    registry = detection_service.models
+    return {
+        "models": [registry.get_model_status(name) for name in registry.model_names()],
+        "registry": registry.get_stats()
+    }
+
+@app.post("/models/{name}/activate")
+async def activate_model(
+    name: str,
+    version: str = Query(..., pattern=MODEL_NAME_PATTERN)
+):
+    """
+    Load and warm a model version, then switch new requests to it
+    
+    Args:
+        name: Registry model name
+        version: Version directory under MODEL_REGISTRY_DIR/<name>/
+    
+    Returns:
+        The model's versions, active version and resident entries; requests
+        already running finish on the previous version
+    """
+    if detection_service is None:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+    if not Config.MODEL_ADMIN_ENABLED:
+        raise HTTPException(status_code=403, detail="Model administration is disabled")
+    
+    return await detection_service.models.activate(name, version)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics, merged across worker processes when configured"""
+    if not metrics_config["enabled"]:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler"""
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Batch latency benchmark for /predict/batch/
+
+Compares the sequential batch path (one predict_single call per file, as
+predict_batch worked before the pipeline) with the pipelined predict_batch
+across batch sizes.
+
+Usage:
+    python -m benchmarks.bench_batch_pipeline --sizes 1 2 4 8 10 --repeats 5
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import statistics
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from fastapi import UploadFile
+from PIL import Image
+
+from src.services.defect_detection_service import DefectDetectionService
+
+def make_image_bytes(width: int, height: int, seed: int = 0) -> bytes:
+    """Create a noisy JPEG so decode cost is realistic"""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+def make_uploads(image_bytes: bytes, count: int) -> List[UploadFile]:
+    """Wrap the same payload in fresh UploadFile objects"""
+    return [
+        UploadFile(file=io.BytesIO(image_bytes), filename=f"board_{i}.jpg")
+        for i in range(count)
+    ]
+
+async def sequential_batch(service: DefectDetectionService, files: List[UploadFile]) -> Dict[str, Any]:
+    """Baseline: await predict_single for each file in turn"""
+    batch_results = []
+    for file in files:
+        try:
+            result = await service.predict_single(file)
+            result["filename"] = file.filename
+            batch_results.append(result)
+        except Exception as e:
+            batch_results.append({"filename": file.filename, "error": str(e), "total_defects": 0})
+    return service.response_formatter.format_batch_prediction(batch_results)
+
+async def pipelined_batch(service: DefectDetectionService, files: List[UploadFile]) -> Dict[str, Any]:
+    """Current implementation"""
+    return await service.predict_batch(files)
+
+async def measure(service, mode, image_bytes: bytes, size: int, repeats: int) -> List[float]:
+    """Time repeated batch calls in milliseconds"""
+    runner = sequential_batch if mode == "sequential" else pipelined_batch
+    timings = []
+    for _ in range(repeats):
+        files = make_uploads(image_bytes, size)
+        start = time.perf_counter()
+        await runner(service, files)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+async def run_benchmark(sizes: List[int], repeats: int, width: int, height: int) -> List[Dict[str, Any]]:
+    """Run both modes for every batch size"""
+    service = DefectDetectionService()
+    image_bytes = make_image_bytes(width, height)
+    rows = []
+    
+    try:
+        # Warm up pools and the scheduler
+        await measure(service, "pipelined", image_bytes, 1, 1)
+        
+        for size in sizes:
+            row = {"batch_size": size}
+            for mode in ("sequential", "pipelined"):
+                timings = await measure(service, mode, image_bytes, size, repeats)
+                row[f"{mode}_ms"] = round(statistics.median(timings), 1)
+            row["speedup"] = round(row["sequential_ms"] / row["pipelined_ms"], 2)
+            rows.append(row)
+    finally:
+        service.shutdown()
+    
+    return rows
+
+def main():
+    """Parse arguments and print the latency curve"""
+    parser = argparse.ArgumentParser(description="Batch latency: sequential vs pipelined")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8, 10])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--width", type=int, default=1600)
+    parser.add_argument("--height", type=int, default=1200)
+    parser.add_argument("--output", help="Optional path to write results as JSON")
+    args = parser.parse_args()
+    
+    rows = asyncio.run(run_benchmark(args.sizes, args.repeats, args.width, args.height))
+    
+    print(f"{'batch':>6} {'sequential ms':>14} {'pipelined ms':>13} {'speedup':>8}")
+    for row in rows:
+        print(f"{row['batch_size']:>6} {row['sequential_ms']:>14} {row['pipelined_ms']:>13} {row['speedup']:>8}")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    main()
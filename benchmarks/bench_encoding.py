@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Response encoding benchmark for /predict/ and /predict/batch/
+
+Measures payload size and encode time of a batch prediction response for
+the previous stdlib JSON encoding and each negotiated media type, across
+detection densities.
+
+Usage:
+    python -m benchmarks.bench_encoding --detections 10 100 1000 --images 10
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.utils.response_encoder import (
+    ResponseEncoder, JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, PACKED_MEDIA_TYPE
+)
+from src.utils.response_formatter import ResponseFormatter
+
+def make_batch(formatter: ResponseFormatter, images: int, detections: int, layout: str) -> Dict[str, Any]:
+    """Build a formatted batch response with random detections"""
+    rng = np.random.default_rng(0)
+    names = ['missing_hole', 'mouse_bite', 'open_circuit', 'short', 'spur', 'spurious_copper']
+    batch_results = []
+    for i in range(images):
+        corners = rng.uniform(0, 3000, (detections, 2))
+        boxes = np.concatenate([corners, corners + rng.uniform(10, 80, (detections, 2))], axis=1)
+        result = formatter.format_single_prediction(
+            (boxes, rng.uniform(0.5, 1.0, detections), rng.integers(0, 6, detections), names),
+            0.1,
+            {"width": 4000, "height": 3000},
+            layout
+        )
+        result["filename"] = f"board_{i}.jpg"
+        batch_results.append(result)
+    return formatter.format_batch_prediction(batch_results)
+
+def measure(fn, repeats: int) -> float:
+    """Median wall time of fn() in milliseconds"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def run_benchmark(densities: List[int], images: int, repeats: int) -> List[Dict[str, Any]]:
+    """Encode batch responses at each density with every encoding"""
+    formatter = ResponseFormatter(confidence_threshold=0.0)
+    encoder = ResponseEncoder()
+    rows = []
+    
+    for detections in densities:
+        objects = make_batch(formatter, images, detections, "objects")
+        columnar = make_batch(formatter, images, detections, "columnar")
+        
+        encodings = {
+            "json (stdlib)": lambda: json.dumps(objects).encode(),
+            "json": lambda: encoder.encode(objects, JSON_MEDIA_TYPE),
+            "json columnar": lambda: encoder.encode(columnar, JSON_MEDIA_TYPE),
+            "packed": lambda: encoder.encode(columnar, PACKED_MEDIA_TYPE)
+        }
+        if MSGPACK_MEDIA_TYPE in encoder.media_types:
+            encodings["msgpack"] = lambda: encoder.encode(objects, MSGPACK_MEDIA_TYPE)
+            encodings["msgpack columnar"] = lambda: encoder.encode(columnar, MSGPACK_MEDIA_TYPE)
+        
+        for name, encode in encodings.items():
+            rows.append({
+                "detections_per_image": detections,
+                "encoding": name,
+                "bytes": len(encode()),
+                "encode_ms": round(measure(encode, repeats), 3)
+            })
+    return rows
+
+def main():
+    """Parse arguments and print payload sizes and encode times"""
+    parser = argparse.ArgumentParser(description="Response encoding: size and encode time")
+    parser.add_argument("--detections", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", help="Optional path to write results as JSON")
+    args = parser.parse_args()
+    
+    rows = run_benchmark(args.detections, args.images, args.repeats)
+    
+    print(f"{'detections':>10} {'encoding':>17} {'bytes':>10} {'encode ms':>10}")
+    for row in rows:
+        print(f"{row['detections_per_image']:>10} {row['encoding']:>17} {row['bytes']:>10} {row['encode_ms']:>10}")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Non-maximum suppression benchmark for src/utils/postprocess.py
+
+Compares the vectorized class-aware NMS against a naive per-box Python loop
+on synthetic panels with clustered detections, and checks that both keep
+exactly the same boxes.
+
+Usage:
+    python -m benchmarks.bench_postprocess --sizes 500 2000 5000 20000 --naive-limit 5000
+"""
+
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.utils.postprocess import nms
+
+def make_detections(count: int, panel_size: int = 8000, seed: int = 0):
+    """Create clustered candidate boxes, scores and class ids like raw detector output"""
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, panel_size, (max(1, count // 20), 2))
+    points = centers[rng.integers(0, len(centers), count)] + rng.normal(0, 6, (count, 2))
+    sizes = rng.uniform(15, 60, (count, 2))
+    boxes = np.concatenate([points - sizes / 2, points + sizes / 2], axis=1)
+    return boxes, rng.random(count), rng.integers(0, 6, count)
+
+def naive_nms(boxes, scores, iou_threshold: float, classes) -> List[int]:
+    """Reference greedy NMS with one Python step per box pair"""
+    boxes = boxes.tolist()
+    classes = classes.tolist()
+    keep = []
+    for i in sorted(range(len(boxes)), key=lambda i: -scores[i]):
+        x1, y1, x2, y2 = boxes[i]
+        suppressed = False
+        for j in keep:
+            if classes[i] != classes[j]:
+                continue
+            kx1, ky1, kx2, ky2 = boxes[j]
+            intersection = max(0.0, min(x2, kx2) - max(x1, kx1)) * max(0.0, min(y2, ky2) - max(y1, ky1))
+            union = (x2 - x1) * (y2 - y1) + (kx2 - kx1) * (ky2 - ky1) - intersection
+            if intersection / union > iou_threshold:
+                suppressed = True
+                break
+        if not suppressed:
+            keep.append(i)
+    return keep
+
+def measure(fn, repeats: int) -> float:
+    """Median wall time of fn() in milliseconds"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+def run_benchmark(sizes: List[int], repeats: int, iou_threshold: float,
+                  naive_limit: int) -> List[Dict[str, Any]]:
+    """Time both implementations for every candidate count"""
+    rows = []
+    for size in sizes:
+        boxes, scores, classes = make_detections(size)
+        vectorized = nms(boxes, scores, iou_threshold, classes=classes)
+        row: Dict[str, Optional[Any]] = {
+            "boxes": size,
+            "kept": len(vectorized),
+            "vectorized_ms": round(measure(lambda: nms(boxes, scores, iou_threshold, classes=classes), repeats), 2),
+            "naive_ms": None,
+            "speedup": None
+        }
+        
+        if size <= naive_limit:
+            assert naive_nms(boxes, scores, iou_threshold, classes) == vectorized.tolist()
+            row["naive_ms"] = round(measure(lambda: naive_nms(boxes, scores, iou_threshold, classes), 1), 2)
+            row["speedup"] = round(row["naive_ms"] / row["vectorized_ms"], 1)
+        rows.append(row)
+    return rows
+
+def main():
+    """Parse arguments and print the timing table"""
+    parser = argparse.ArgumentParser(description="NMS: vectorized vs naive loop")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 5000, 20000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--iou-threshold", type=float, default=0.45)
+    parser.add_argument("--naive-limit", type=int, default=5000,
+                        help="Skip the naive loop above this many boxes")
+    parser.add_argument("--output", help="Optional path to write results as JSON")
+    args = parser.parse_args()
+    
+    rows = run_benchmark(args.sizes, args.repeats, args.iou_threshold, args.naive_limit)
+    
+    print(f"{'boxes':>7} {'kept':>6} {'naive ms':>10} {'vectorized ms':>14} {'speedup':>8}")
+    for row in rows:
+        naive = "-" if row["naive_ms"] is None else row["naive_ms"]
+        speedup = "-" if row["speedup"] is None else f"{row['speedup']}x"
+        print(f"{row['boxes']:>7} {row['kept']:>6} {naive:>10} {row['vectorized_ms']:>14} {speedup:>8}")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    main()
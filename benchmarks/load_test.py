@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Load test for the prediction API
+
+Drives /predict/ and /predict/batch/ either in-process (ASGI transport, no
+sockets) or against a uvicorn server on a local port, at a fixed
+concurrency (closed loop) or a fixed arrival rate (open loop, latency
+measured from each request's scheduled start so queueing is not hidden).
+Reports p50/p95/p99 latency, throughput and peak RSS, writes the run as
+JSON and optionally compares it with a baseline run.
+
+Every upload gets a unique trailer after the JPEG end marker, so the
+result cache never answers a request; pass --cache-hits to allow it.
+
+Usage:
+    python run_tests.py bench --transport inprocess --concurrency 8 --duration 20
+    python -m benchmarks.load_test --transport uvicorn --workers 2 --rate 30 \\
+        --mix predict=0.8,batch=0.2 --output bench.json --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks.bench_batch_pipeline import make_image_bytes
+
+ENDPOINTS = {"predict": "/predict/", "batch": "/predict/batch/"}
+
+# Metrics compared against a baseline: (path in the report, higher is better)
+COMPARED_METRICS = [
+    ("throughput_rps", True),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False)
+]
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse "predict=0.8,batch=0.2" into normalized endpoint weights"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}', expected one of {sorted(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Traffic mix weights must add up to more than 0")
+    return {name: weight / total for name, weight in weights.items()}
+
+def latency_summary(latencies_ms: List[float]) -> Dict[str, float]:
+    """Percentiles, mean and max of a list of latencies"""
+    if not latencies_ms:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    values = np.asarray(latencies_ms)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 2),
+        "p95": round(float(p95), 2),
+        "p99": round(float(p99), 2),
+        "mean": round(float(values.mean()), 2),
+        "max": round(float(values.max()), 2)
+    }
+
+def peak_rss_mb(children: bool = False) -> float:
+    """Peak resident set size of this process (or of its waited-for children)"""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(usage.ru_maxrss / scale, 1)
+
+class LoadGenerator:
+    """Issue a weighted mix of prediction requests and record their outcomes"""
+    
+    # Shared by every generator so warm-up and measured uploads never repeat
+    _upload_ids = itertools.count()
+    
+    def __init__(self, client: httpx.AsyncClient, mix: Dict[str, float], batch_size: int,
+                 image_bytes: bytes, cache_hits: bool = False, seed: int = 0):
+        self.client = client
+        self.mix = mix
+        self.batch_size = batch_size
+        self.image_bytes = image_bytes
+        self.cache_hits = cache_hits
+        self._random = random.Random(seed)
+        # (endpoint, status code or None on transport error, latency ms, images)
+        self.records: List[Tuple[str, Optional[int], float, int]] = []
+    
+    def _upload(self) -> bytes:
+        if self.cache_hits:
+            return self.image_bytes
+        return self.image_bytes + f"load-test-{next(self._upload_ids)}".encode()
+    
+    async def request(self, scheduled: Optional[float] = None) -> None:
+        """Send one request; latency counts from `scheduled` when given (open loop)"""
+        endpoint = self._random.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        if endpoint == "batch":
+            images = self.batch_size
+            files = [("files", (f"board_{i}.jpg", self._upload(), "image/jpeg")) for i in range(images)]
+        else:
+            images = 1
+            files = {"file": ("board.jpg", self._upload(), "image/jpeg")}
+        
+        start = scheduled if scheduled is not None else time.perf_counter()
+        try:
+            response = await self.client.post(ENDPOINTS[endpoint], files=files)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = None
+        self.records.append((endpoint, status, (time.perf_counter() - start) * 1000, images))
+    
+    async def closed_loop(self, concurrency: int, duration: float) -> None:
+        """Keep `concurrency` requests in flight until the duration has passed"""
+        deadline = time.perf_counter() + duration
+        
+        async def worker():
+            while time.perf_counter() < deadline:
+                await self.request()
+        
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    
+    async def open_loop(self, rate: float, duration: float) -> None:
+        """Start requests at `rate` per second (Poisson arrivals) regardless of responses"""
+        start = time.perf_counter()
+        scheduled = start
+        tasks = []
+        while True:
+            scheduled += self._random.expovariate(rate)
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(self.request(scheduled)))
+        await asyncio.gather(*tasks)
+    
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        """Aggregate the recorded outcomes, overall and per endpoint"""
+        def aggregate(records):
+            ok = [r for r in records if r[1] == 200]
+            statuses: Dict[str, int] = {}
+            for _, status, _, _ in records:
+                key = str(status) if status is not None else "transport_error"
+                statuses[key] = statuses.get(key, 0) + 1
+            return {
+                "requests": len(records),
+                "errors": len(records) - len(ok),
+                "status_codes": statuses,
+                "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+                "images_per_second": round(sum(r[3] for r in ok) / elapsed, 2) if elapsed else 0.0,
+                "latency_ms": latency_summary([r[2] for r in ok])
+            }
+        
+        report = aggregate(self.records)
+        report["endpoints"] = {
+            endpoint: aggregate([r for r in self.records if r[0] == endpoint])
+            for endpoint in self.mix
+        }
+        return report
+
+async def run_load(client: httpx.AsyncClient, args: argparse.Namespace) -> Dict[str, Any]:
+    """Warm up, then drive the configured load and summarize it"""
+    mix = parse_mix(args.mix)
+    image_bytes = make_image_bytes(args.width, args.height)
+    
+    if args.warmup > 0:
+        warmup = LoadGenerator(client, mix, args.batch_size, image_bytes, args.cache_hits, args.seed + 1)
+        await warmup.closed_loop(args.concurrency, args.warmup)
+    
+    generator = LoadGenerator(client, mix, args.batch_size, image_bytes, args.cache_hits, args.seed)
+    start = time.perf_counter()
+    if args.rate:
+        await generator.open_loop(args.rate, args.duration)
+    else:
+        await generator.closed_loop(args.concurrency, args.duration)
+    return generator.summary(time.perf_counter() - start)
+
+async def run_inprocess(args: argparse.Namespace) -> Dict[str, Any]:
+    """Drive the ASGI app directly in this process (no sockets)"""
+    from app import app, limiter
+    
+    logging.getLogger().setLevel(args.log_level)
+    
+    limiter.enabled = False
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            report = await run_load(client, args)
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def _wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                if (await client.get("/health")).json().get("status") == "healthy":
+                    return
+            except (httpx.HTTPError, ValueError):
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not become ready in time")
+
+async def run_uvicorn(args: argparse.Namespace) -> Dict[str, Any]:
+    """Drive a uvicorn server started on a free local port"""
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, RATE_LIMIT_ENABLED="false")
+    env["LOG_LEVEL"] = args.log_level
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        env=env
+    )
+    try:
+        await _wait_until_ready(base_url, server)
+        limits = httpx.Limits(max_connections=max(args.concurrency, 100))
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            report = await run_load(client, args)
+    finally:
+        server.terminate()
+        server.wait()
+    
+    report["peak_rss_mb"] = peak_rss_mb(children=True)
+    return report
+
+def _lookup(report: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = report
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """Compare a run with a baseline, flagging metrics that got worse by more than tolerance"""
+    rows = []
+    for path, higher_is_better in COMPARED_METRICS:
+        current, previous = _lookup(report, path), _lookup(baseline, path)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        worse = -change if higher_is_better else change
+        rows.append({
+            "metric": path,
+            "baseline": previous,
+            "current": current,
+            "change": round(change, 4),
+            "regression": worse > tolerance
+        })
+    return rows
+
+def print_report(report: Dict[str, Any], comparison: Optional[List[Dict[str, Any]]]) -> None:
+    """Print a readable summary of a run"""
+    settings = report["settings"]
+    load = f"rate {settings['rate']}/s" if settings["rate"] else f"concurrency {settings['concurrency']}"
+    print(f"{settings['transport']} | {load} | {settings['duration']}s | mix {settings['mix']}")
+    print(f"{'endpoint':>10} {'requests':>9} {'errors':>7} {'req/s':>8} {'img/s':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = list(report["endpoints"].items()) + [("all", report)]
+    for name, stats in rows:
+        latency = stats["latency_ms"]
+        print(f"{name:>10} {stats['requests']:>9} {stats['errors']:>7} {stats['throughput_rps']:>8} "
+              f"{stats['images_per_second']:>8} {latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9}")
+    print(f"peak RSS: {report['peak_rss_mb']} MB")
+    
+    if comparison:
+        print("\nvs baseline:")
+        for row in comparison:
+            flag = "REGRESSION" if row["regression"] else "ok"
+            print(f"  {row['metric']:>16}: {row['baseline']} -> {row['current']} "
+                  f"({row['change'] * 100:+.1f}%) {flag}")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transport", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--mix", default="predict=0.8,batch=0.2", help="endpoint weights")
+    parser.add_argument("--batch-size", type=int, default=4, help="images per /predict/batch/ request")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight (closed loop)")
+    parser.add_argument("--rate", type=float, default=0.0, help="arrivals per second (open loop)")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before the run")
+    parser.add_argument("--width", type=int, default=1600)
+    parser.add_argument("--height", type=int, default=1200)
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--cache-hits", action="store_true", help="reuse identical uploads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING",
+                        help="server log level (per-request INFO logs skew mock-model runs)")
+    parser.add_argument("--output", help="write the run as JSON")
+    parser.add_argument("--baseline", help="JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="relative change counted as a regression (default 10%%)")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    runner = run_uvicorn if args.transport == "uvicorn" else run_inprocess
+    report = asyncio.run(runner(args))
+    
+    report["settings"] = {
+        key: getattr(args, key)
+        for key in ("transport", "workers", "mix", "batch_size", "concurrency", "rate",
+                    "duration", "warmup", "width", "height", "cache_hits", "seed")
+    }
+    report["environment"] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.time()
+    }
+    
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(report, json.load(f), args.tolerance)
+        report["comparison"] = comparison
+    
+    print_report(report, comparison)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved {args.output}")
+    
+    return 1 if comparison and any(row["regression"] for row in comparison) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
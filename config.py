@@ -8,6 +8,34 @@ class Config:
     MODEL_NAME = "yolov5s"
     MODEL_CONFIDENCE_THRESHOLD = 0.5
     MODEL_IMAGE_SIZE = 640
+    # "reduced" decodes straight to MODEL_IMAGE_SIZE (JPEG DCT scaling + letterbox),
+    # "full" decodes at full resolution
+    DECODE_MODE = os.getenv("DECODE_MODE", "reduced").lower()
+    MODEL_IOU_THRESHOLD = float(os.getenv("MODEL_IOU_THRESHOLD", "0.45"))
+    MODEL_MAX_DETECTIONS = int(os.getenv("MODEL_MAX_DETECTIONS", "300"))
+    
+    # Inference backend: "mock" (demo detections) or "onnx" (ONNX Runtime on CPU).
+    # 0 threads lets ONNX Runtime pick; size intra-op threads to the cores left
+    # over by the decode pool when INFERENCE_POOL_SIZE > 1
+    MODEL_BACKEND = os.getenv("MODEL_BACKEND", "mock").lower()
+    ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "models/trained_model.onnx")
+    ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+    ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", "0"))
+    
+    # Model registry: versions live in MODEL_REGISTRY_DIR/<name>/<version>/model.onnx.
+    # Requests without a model name use DEFAULT_MODEL (MODEL_PATH until a registry
+    # version is activated). At most MODEL_MAX_RESIDENT models, and
+    # MODEL_MEMORY_BUDGET_MB of model files, stay loaded (least recently used unloaded first).
+    # Both limits are per process: with EXECUTOR_KIND=process the server and each
+    # inference pool worker hold their own copies, up to (INFERENCE_POOL_SIZE + 1) x the budget
+    MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "models/registry")
+    DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "default")
+    DEFAULT_MODEL_VERSION = os.getenv("DEFAULT_MODEL_VERSION", "1")
+    MODEL_MAX_RESIDENT = int(os.getenv("MODEL_MAX_RESIDENT", "3"))
+    MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "2048"))
+    # POST /models/{name}/activate is unauthenticated and swaps the model for every
+    # station; only enable it behind an internal network or an authenticating proxy
+    MODEL_ADMIN_ENABLED = os.getenv("MODEL_ADMIN_ENABLED", "false").lower() == "true"
     
     # API configuration
     API_TITLE = "PCB Defect Detection API"
@@ -15,10 +43,25 @@ class Config:
     API_VERSION = "1.0.0"
     MAX_BATCH_SIZE = 10
     MAX_FILE_SIZE_MB = 50
+    MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "120000000"))
+    # Allowance per uploaded file for multipart headers and form fields
+    MULTIPART_OVERHEAD_BYTES = 64 * 1024
     
-    # Rate limiting
-    RATE_LIMIT_SINGLE = "100/minute"
-    RATE_LIMIT_BATCH = "20/minute"
+    # Rate limiting (disable for load tests)
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_SINGLE = os.getenv("RATE_LIMIT_SINGLE", "100/minute")
+    RATE_LIMIT_BATCH = os.getenv("RATE_LIMIT_BATCH", "20/minute")
+    
+    # Server-wide admission control: requests are refused with 503 and Retry-After
+    # once ADMISSION_MAX_IN_FLIGHT images are in progress. Batch uploads may only
+    # use ADMISSION_BATCH_SHARE of that, and are refused entirely (with the
+    # interactive limit halved) while the p95 latency of single-image requests over
+    # the last ADMISSION_LATENCY_WINDOW_SECONDS exceeds ADMISSION_LATENCY_SLO_MS (0 disables)
+    ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+    ADMISSION_BATCH_SHARE = float(os.getenv("ADMISSION_BATCH_SHARE", "0.5"))
+    ADMISSION_LATENCY_SLO_MS = float(os.getenv("ADMISSION_LATENCY_SLO_MS", "2000"))
+    ADMISSION_LATENCY_WINDOW_SECONDS = float(os.getenv("ADMISSION_LATENCY_WINDOW_SECONDS", "10"))
     
     # Logging configuration
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -28,10 +71,67 @@ class Config:
     MODEL_PATH = os.getenv("MODEL_PATH", "models/trained_model.pt")
     DATA_PATH = "data"
     
+    # Asynchronous inspection jobs
+    JOB_DB_PATH = os.getenv("JOB_DB_PATH", "data/jobs/jobs.db")
+    JOB_STORAGE_PATH = os.getenv("JOB_STORAGE_PATH", "data/jobs/uploads")
+    JOB_DIRECTORY_ROOT = os.getenv("JOB_DIRECTORY_ROOT", "data")
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+    JOB_MAX_IMAGES = int(os.getenv("JOB_MAX_IMAGES", "10000"))
+    # Largest POST /jobs upload, refused from its Content-Length before the body is
+    # spooled; larger runs should be submitted as a server-local directory
+    JOB_MAX_UPLOAD_BYTES = int(os.getenv("JOB_MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+    # Unfinished items are owned by one worker process under a lease it renews;
+    # items of a dead worker, or with an expired lease, are taken over by another
+    JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+    JOB_RESULTS_PAGE_SIZE = 100
+    
     # Performance settings
-    INFERENCE_TIMEOUT = 30
+    # Deadline for each prediction request (per image for jobs and WebSocket frames);
+    # work still queued for decode or inference when it passes is dropped with 504
+    INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "30"))
     ENABLE_GPU = os.getenv("ENABLE_GPU", "false").lower() == "true"
     
+    # Micro-batching (coalesces concurrent single-image requests)
+    MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "8"))
+    MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5"))
+    MICRO_BATCH_QUEUE_DEPTH = int(os.getenv("MICRO_BATCH_QUEUE_DEPTH", "256"))
+    
+    # Executor for CPU-bound stages ("thread" or "process" pools)
+    EXECUTOR_KIND = os.getenv("EXECUTOR_KIND", "thread").lower()
+    DECODE_POOL_SIZE = int(os.getenv("DECODE_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+    INFERENCE_POOL_SIZE = int(os.getenv("INFERENCE_POOL_SIZE", "1"))
+    
+    # Prediction result cache (0 MB disables it, 0 s TTL never expires)
+    RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+    RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "0"))
+    
+    # Reusable buffers for decoded images and model input tensors; buffers
+    # larger than BUFFER_POOL_MAX_BUFFER_MB (huge full-resolution panels) are not pooled
+    BUFFER_POOL_MAX_MB = float(os.getenv("BUFFER_POOL_MAX_MB", "256"))
+    BUFFER_POOL_MAX_BUFFER_MB = float(os.getenv("BUFFER_POOL_MAX_BUFFER_MB", "64"))
+    
+    # Tiled inference for high-resolution panels (defaults for per-request overrides)
+    TILE_SIZE = int(os.getenv("TILE_SIZE", str(MODEL_IMAGE_SIZE)))
+    TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+    TILE_BATCH_SIZE = int(os.getenv("TILE_BATCH_SIZE", "8"))
+    TILE_MERGE_IOU = float(os.getenv("TILE_MERGE_IOU", "0.5"))
+    
+    # Prometheus metrics (/metrics). Point PROMETHEUS_MULTIPROC_DIR at an empty
+    # directory to aggregate metrics across uvicorn workers and process pools
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+    METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+    
+    # Per-request stage timings (Server-Timing header) and ?profile=1 sampling
+    # profiles; keep profiling off unless diagnosing a slow station
+    SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_MAX_STACKS = 50
+    
+    # WebSocket frame streaming (frames a client may have in flight at once)
+    STREAM_CREDITS = int(os.getenv("STREAM_CREDITS", "4"))
+    
     @classmethod
     def get_model_config(cls) -> Dict[str, Any]:
         """Get model-specific configuration"""
@@ -39,10 +139,28 @@ class Config:
             "name": cls.MODEL_NAME,
             "confidence_threshold": cls.MODEL_CONFIDENCE_THRESHOLD,
             "image_size": cls.MODEL_IMAGE_SIZE,
+            "decode_mode": cls.DECODE_MODE,
+            "iou_threshold": cls.MODEL_IOU_THRESHOLD,
+            "max_detections": cls.MODEL_MAX_DETECTIONS,
+            "backend": cls.MODEL_BACKEND,
             "path": cls.MODEL_PATH,
+            "onnx_path": cls.ONNX_MODEL_PATH,
+            "intra_op_threads": cls.ORT_INTRA_OP_THREADS,
+            "inter_op_threads": cls.ORT_INTER_OP_THREADS,
             "enable_gpu": cls.ENABLE_GPU
         }
     
+    @classmethod
+    def get_registry_config(cls) -> Dict[str, Any]:
+        """Get model registry configuration"""
+        return {
+            "registry_dir": cls.MODEL_REGISTRY_DIR,
+            "default_name": cls.DEFAULT_MODEL,
+            "default_version": cls.DEFAULT_MODEL_VERSION,
+            "max_resident": cls.MODEL_MAX_RESIDENT,
+            "memory_budget_bytes": int(cls.MODEL_MEMORY_BUDGET_MB * 1024 * 1024)
+        }
+    
     @classmethod
     def get_api_config(cls) -> Dict[str, Any]:
         """Get API-specific configuration"""
@@ -52,5 +170,97 @@ class Config:
             "version": cls.API_VERSION,
             "max_batch_size": cls.MAX_BATCH_SIZE,
             "max_file_size_mb": cls.MAX_FILE_SIZE_MB,
+            "max_image_pixels": cls.MAX_IMAGE_PIXELS,
             "inference_timeout": cls.INFERENCE_TIMEOUT
         }
+    
+    @classmethod
+    def get_upload_limits(cls) -> Dict[str, int]:
+        """Largest request body accepted per upload endpoint (checked against Content-Length)"""
+        per_file = cls.MAX_FILE_SIZE_MB * 1024 * 1024 + cls.MULTIPART_OVERHEAD_BYTES
+        return {
+            "/predict/": per_file,
+            "/predict/batch/": per_file * cls.MAX_BATCH_SIZE,
+            "/predict/batch/stream": per_file * cls.MAX_BATCH_SIZE,
+            "/jobs": cls.JOB_MAX_UPLOAD_BYTES
+        }
+    
+    @classmethod
+    def get_admission_config(cls) -> Dict[str, Any]:
+        """Get admission control configuration"""
+        return {
+            "enabled": cls.ADMISSION_ENABLED,
+            "max_in_flight": cls.ADMISSION_MAX_IN_FLIGHT,
+            "batch_share": cls.ADMISSION_BATCH_SHARE,
+            "latency_slo_ms": cls.ADMISSION_LATENCY_SLO_MS,
+            "latency_window_seconds": cls.ADMISSION_LATENCY_WINDOW_SECONDS
+        }
+    
+    @classmethod
+    def get_batching_config(cls) -> Dict[str, Any]:
+        """Get micro-batching scheduler configuration"""
+        return {
+            "max_batch_size": cls.MICRO_BATCH_MAX_SIZE,
+            "max_wait_ms": cls.MICRO_BATCH_MAX_WAIT_MS,
+            "max_queue_depth": cls.MICRO_BATCH_QUEUE_DEPTH
+        }
+    
+    @classmethod
+    def get_executor_config(cls) -> Dict[str, Any]:
+        """Get executor configuration for CPU-bound pipeline stages"""
+        return {
+            "kind": cls.EXECUTOR_KIND,
+            "pool_sizes": {
+                "decode": cls.DECODE_POOL_SIZE,
+                "inference": cls.INFERENCE_POOL_SIZE
+            }
+        }
+    
+    @classmethod
+    def get_tiling_config(cls) -> Dict[str, Any]:
+        """Get default tiled inference settings"""
+        return {
+            "tile_size": cls.TILE_SIZE,
+            "overlap": cls.TILE_OVERLAP,
+            "tile_batch_size": cls.TILE_BATCH_SIZE,
+            "merge_iou": cls.TILE_MERGE_IOU
+        }
+    
+    @classmethod
+    def get_cache_config(cls) -> Dict[str, Any]:
+        """Get prediction result cache configuration"""
+        return {
+            "max_bytes": int(cls.RESULT_CACHE_MAX_MB * 1024 * 1024),
+            "ttl_seconds": cls.RESULT_CACHE_TTL_SECONDS or None
+        }
+    
+    @classmethod
+    def get_buffer_pool_config(cls) -> Dict[str, Any]:
+        """Get preprocessing buffer pool configuration"""
+        return {
+            "max_bytes": int(cls.BUFFER_POOL_MAX_MB * 1024 * 1024),
+            "max_buffer_bytes": int(cls.BUFFER_POOL_MAX_BUFFER_MB * 1024 * 1024)
+        }
+    
+    @classmethod
+    def get_metrics_config(cls) -> Dict[str, Any]:
+        """Get metrics exposition configuration"""
+        return {
+            "enabled": cls.METRICS_ENABLED,
+            "multiprocess_dir": cls.METRICS_MULTIPROC_DIR or None,
+            "flush_seconds": cls.METRICS_FLUSH_SECONDS
+        }
+    
+    @classmethod
+    def get_job_config(cls) -> Dict[str, Any]:
+        """Get asynchronous job subsystem configuration"""
+        return {
+            "db_path": cls.JOB_DB_PATH,
+            "storage_path": cls.JOB_STORAGE_PATH,
+            "directory_root": cls.JOB_DIRECTORY_ROOT,
+            "workers": cls.JOB_WORKERS,
+            "max_images": cls.JOB_MAX_IMAGES,
+            "max_file_bytes": cls.MAX_FILE_SIZE_MB * 1024 * 1024,
+            "lease_seconds": cls.JOB_LEASE_SECONDS,
+            "results_page_size": cls.JOB_RESULTS_PAGE_SIZE
+        }
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+INT8 quantization of the exported PCB defect model
+
+Quantizes the FP32 ONNX model written by train_model.py, calibrating static
+quantization on a sample of the validation images, then benchmarks both
+models on the validation set and writes a report comparing latency,
+throughput, model size and per-class mAP.
+
+Serve the quantized model with:
+    MODEL_BACKEND=onnx MODEL_PATH=models/trained_model.int8.onnx python app.py
+
+Usage:
+    python quantize_model.py --mode static --calibration-images 100
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from config import Config
+from src.models.backends import OnnxRuntimeBackend, letterbox_batch
+from src.utils.evaluation import evaluate_detections, load_yolo_labels
+
+try:
+    import onnxruntime
+    from onnxruntime import quantization
+except ImportError:  # reported when quantizing; the report helpers work without it
+    onnxruntime = None
+    quantization = None
+
+VAL_IMAGES = 'data/pcb_dataset/val/images'
+VAL_LABELS = 'data/pcb_dataset/val/labels'
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# YOLOv5 validation settings: keep low-confidence boxes so the PR curve is complete
+EVAL_CONF_THRESHOLD = 0.001
+EVAL_IOU_THRESHOLD = 0.6
+
+def load_class_names(data_yaml: str = 'data.yaml') -> List[str]:
+    """Read the class names from data.yaml (without requiring PyYAML)"""
+    with open(data_yaml) as f:
+        for line in f:
+            if line.strip().startswith('names:'):
+                return [name.strip(" '\"") for name in line.split('[', 1)[1].rsplit(']', 1)[0].split(',')]
+    raise ValueError(f"No class names found in {data_yaml}")
+
+def list_images(image_dir: str) -> List[Path]:
+    """Sorted validation image paths"""
+    return sorted(path for path in Path(image_dir).iterdir() if path.suffix.lower() in IMAGE_SUFFIXES)
+
+def read_image(path: Path) -> np.ndarray:
+    """Load an image as an RGB uint8 array"""
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGB'))
+
+class ValidationCalibrationReader(quantization.CalibrationDataReader if quantization else object):
+    """Feeds letterboxed validation images to the static quantization calibrator"""
+    
+    def __init__(self, image_paths: List[Path], input_name: str, image_size: int):
+        self.image_paths = iter(image_paths)
+        self.input_name = input_name
+        self.image_size = image_size
+    
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        path = next(self.image_paths, None)
+        if path is None:
+            return None
+        batch, _ = letterbox_batch([read_image(path)], self.image_size)
+        return {self.input_name: batch}
+
+def quantize(fp32_path: str, int8_path: str, mode: str, calibration_paths: List[Path],
+             image_size: int) -> None:
+    """Write an INT8 copy of the FP32 model (static QDQ with calibration, or dynamic)"""
+    if quantization is None:
+        raise SystemExit("Error: onnxruntime is required for quantization (pip install onnxruntime)")
+    
+    if mode == 'dynamic':
+        quantization.quantize_dynamic(fp32_path, int8_path, weight_type=quantization.QuantType.QInt8)
+        return
+    
+    input_name = onnxruntime.InferenceSession(
+        fp32_path, providers=['CPUExecutionProvider']
+    ).get_inputs()[0].name
+    quantization.quantize_static(
+        fp32_path,
+        int8_path,
+        ValidationCalibrationReader(calibration_paths, input_name, image_size),
+        quant_format=quantization.QuantFormat.QDQ,
+        activation_type=quantization.QuantType.QUInt8,
+        weight_type=quantization.QuantType.QInt8,
+        per_channel=True,
+        calibrate_method=quantization.CalibrationMethod.MinMax
+    )
+
+def benchmark_model(model_path: str, image_paths: List[Path], class_names: List[str],
+                    image_size: int, batch_size: int, latency_runs: int, threads: int) -> Dict[str, Any]:
+    """Accuracy, single-image latency and batched throughput of one ONNX model"""
+    backend = OnnxRuntimeBackend(
+        model_path,
+        image_size=image_size,
+        conf_threshold=EVAL_CONF_THRESHOLD,
+        iou_threshold=EVAL_IOU_THRESHOLD,
+        intra_op_threads=threads,
+        class_names=class_names
+    )
+    
+    detections, labels = [], []
+    for path in image_paths:
+        image = read_image(path)
+        detections.append(backend.predict([image])[0])
+        height, width = image.shape[:2]
+        labels.append(load_yolo_labels(str(Path(VAL_LABELS) / f"{path.stem}.txt"), width, height))
+    accuracy = evaluate_detections(detections, labels, class_names)
+    
+    sample = [read_image(path) for path in image_paths[:max(batch_size, latency_runs)]]
+    backend.predict(sample[:1])  # warm-up
+    latencies = []
+    for i in range(latency_runs):
+        start = time.perf_counter()
+        backend.predict([sample[i % len(sample)]])
+        latencies.append((time.perf_counter() - start) * 1000)
+    
+    batch = (sample * batch_size)[:batch_size]
+    start = time.perf_counter()
+    rounds = max(1, latency_runs // batch_size)
+    for _ in range(rounds):
+        backend.predict(batch)
+    elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    return {
+        "model_path": model_path,
+        "size_mb": round(os.path.getsize(model_path) / (1024 * 1024), 2),
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 2),
+            "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+            "mean": round(statistics.fmean(latencies), 2)
+        },
+        "throughput_ips": round(rounds * batch_size / elapsed, 2),
+        **accuracy
+    }
+
+def compare_models(fp32: Dict[str, Any], int8: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change of the INT8 model against FP32"""
+    def change(new: Optional[float], old: Optional[float]) -> Optional[float]:
+        if new is None or old is None or old == 0:
+            return None
+        return round((new - old) / old * 100, 2)
+    
+    return {
+        "size_change_pct": change(int8["size_mb"], fp32["size_mb"]),
+        "latency_p50_change_pct": change(int8["latency_ms"]["p50"], fp32["latency_ms"]["p50"]),
+        "throughput_change_pct": change(int8["throughput_ips"], fp32["throughput_ips"]),
+        "map50_delta": None if int8["map50"] is None else round(int8["map50"] - fp32["map50"], 4),
+        "map50_95_delta": None if int8["map50_95"] is None else round(int8["map50_95"] - fp32["map50_95"], 4)
+    }
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Render the comparison as a Markdown report"""
+    fp32, int8 = report["fp32"], report["int8"]
+    
+    def value(v: Any) -> str:
+        return "n/a" if v is None else str(v)
+    
+    lines = [
+        f"# INT8 quantization report ({report['mode']})",
+        "",
+        f"Evaluated on {report['images']} validation images, batch size {report['batch_size']}.",
+        "",
+        "| Metric | FP32 | INT8 |",
+        "|---|---|---|",
+        f"| Model size (MB) | {fp32['size_mb']} | {int8['size_mb']} |",
+        f"| Latency p50 (ms, 1 image) | {fp32['latency_ms']['p50']} | {int8['latency_ms']['p50']} |",
+        f"| Latency p95 (ms, 1 image) | {fp32['latency_ms']['p95']} | {int8['latency_ms']['p95']} |",
+        f"| Throughput (images/s) | {fp32['throughput_ips']} | {int8['throughput_ips']} |",
+        f"| mAP@0.5 | {value(fp32['map50'])} | {value(int8['map50'])} |",
+        f"| mAP@0.5:0.95 | {value(fp32['map50_95'])} | {value(int8['map50_95'])} |",
+        "",
+        "| Class | Labels | FP32 AP@0.5 | INT8 AP@0.5 | FP32 AP@0.5:0.95 | INT8 AP@0.5:0.95 |",
+        "|---|---|---|---|---|---|"
+    ]
+    for name, result in fp32["per_class"].items():
+        quantized = int8["per_class"][name]
+        lines.append(
+            f"| {name} | {result['labels']} | {value(result['ap50'])} | {value(quantized['ap50'])} "
+            f"| {value(result['ap50_95'])} | {value(quantized['ap50_95'])} |"
+        )
+    lines.extend(["", "Changes vs FP32: " + ", ".join(f"{k}={value(v)}" for k, v in report["change"].items())])
+    return "\n".join(lines) + "\n"
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Quantize the PCB defect model to INT8 and compare it with FP32")
+    parser.add_argument('--fp32', default=Config.ONNX_MODEL_PATH, help="FP32 ONNX model from train_model.py")
+    parser.add_argument('--output', default=None, help="INT8 model path (default <fp32>.int8.onnx)")
+    parser.add_argument('--mode', choices=('static', 'dynamic'), default='static')
+    parser.add_argument('--calibration-images', type=int, default=100,
+                        help="validation images sampled for static calibration")
+    parser.add_argument('--eval-images', type=int, default=0, help="limit evaluation images (0 = all)")
+    parser.add_argument('--image-size', type=int, default=Config.MODEL_IMAGE_SIZE)
+    parser.add_argument('--batch-size', type=int, default=Config.MICRO_BATCH_MAX_SIZE)
+    parser.add_argument('--latency-runs', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=Config.ORT_INTRA_OP_THREADS)
+    parser.add_argument('--report-dir', default='runs/quantization')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = build_parser().parse_args(argv)
+    
+    if not os.path.exists(args.fp32):
+        raise SystemExit(f"Error: {args.fp32} not found. Run train_model.py to export the ONNX model first.")
+    image_paths = list_images(VAL_IMAGES)
+    if not image_paths:
+        raise SystemExit(f"Error: no validation images in {VAL_IMAGES}. Please run preparation_script.py first.")
+    
+    int8_path = args.output or args.fp32.replace('.onnx', '.int8.onnx')
+    calibration_paths = random.Random(args.seed).sample(
+        image_paths, min(args.calibration_images, len(image_paths))
+    )
+    print(f"Quantizing {args.fp32} ({args.mode}, {len(calibration_paths)} calibration images)")
+    quantize(args.fp32, int8_path, args.mode, calibration_paths, args.image_size)
+    print(f"INT8 model saved to {int8_path}")
+    
+    eval_paths = image_paths[:args.eval_images] if args.eval_images else image_paths
+    class_names = load_class_names()
+    results = {}
+    for label, path in (('fp32', args.fp32), ('int8', int8_path)):
+        print(f"Evaluating {label} model on {len(eval_paths)} images")
+        results[label] = benchmark_model(
+            path, eval_paths, class_names, args.image_size, args.batch_size, args.latency_runs, args.threads
+        )
+    
+    report = {
+        "mode": args.mode,
+        "images": len(eval_paths),
+        "batch_size": args.batch_size,
+        "calibration_images": len(calibration_paths) if args.mode == 'static' else 0,
+        "fp32": results['fp32'],
+        "int8": results['int8'],
+        "change": compare_models(results['fp32'], results['int8'])
+    }
+    
+    os.makedirs(args.report_dir, exist_ok=True)
+    with open(os.path.join(args.report_dir, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    markdown = format_report(report)
+    with open(os.path.join(args.report_dir, 'report.md'), 'w') as f:
+        f.write(markdown)
+    print(markdown)
+    print(f"Report written to {args.report_dir}")
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,12 @@ import subprocess
 import sys
 import os
 
-def run_tests(test_type="all"):
+def run_tests(test_type="all", extra_args=None):
     """Run tests based on type"""
     
-    if test_type == "unit":
+    if test_type == "bench":
+        cmd = ["python", "-m", "benchmarks.load_test"] + list(extra_args or [])
+    elif test_type == "unit":
         cmd = ["python", "-m", "pytest", "tests/test_config.py", "tests/test_image_processor.py", "tests/test_response_formatter.py", "-v"]
     elif test_type == "integration":
         cmd = ["python", "-m", "pytest", "tests/test_integration.py", "-v"]
@@ -33,7 +35,8 @@ def main():
     else:
         test_type = "all"
     
-    success = run_tests(test_type)
+    # Anything after "bench" is passed to the load test (see --help)
+    success = run_tests(test_type, sys.argv[2:])
     
     if success:
         print(f"\n✅ {test_type.title()} tests passed!")
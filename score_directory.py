@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Offline batch scoring of a directory tree of PCB images
+
+Re-scores archived boards without going through the HTTP API. Images are
+read and decoded by a pool of worker processes, run through the model in
+batches, and written in directory order, one record per image with the
+fields of a /predict/ response plus "filename" (relative to the
+directory). Output is JSON lines, or Parquet part files with --format
+parquet. A manifest next to the output is updated at every checkpoint, so
+running the same command again after an interruption resumes from the
+last checkpoint.
+
+Usage:
+    python score_directory.py data/archive --workers 6 --batch-size 16
+    python score_directory.py data/archive --format parquet --output runs/scoring/archive.parquet
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from config import Config
+from src.models.yolo_model import YOLOModel
+from src.services.job_manager import IMAGE_EXTENSIONS
+from src.utils.image_processor import ImageProcessor
+from src.utils.response_formatter import BOX_FIELDS, ResponseFormatter, dumps_json
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # only needed for --format parquet
+    pyarrow = None
+
+OUTPUT_FORMATS = ('jsonl', 'parquet')
+
+# (relative path, model input or None, letterbox or None, error or None)
+Decoded = Tuple[str, Optional[np.ndarray], Optional[Dict[str, Any]], Optional[str]]
+
+# Decoder of a decode worker process, created by _init_decoder
+_image_processor: Optional[ImageProcessor] = None
+
+def list_images(root: Path) -> List[str]:
+    """Image paths under root, relative and sorted so that every run sees the same order"""
+    return sorted(
+        path.relative_to(root).as_posix() for path in root.rglob('*')
+        if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS
+    )
+
+def _init_decoder(max_size_mb: int, max_pixels: int) -> None:
+    global _image_processor
+    _image_processor = ImageProcessor(max_size_mb=max_size_mb, max_pixels=max_pixels)
+
+def decode_file(path: str, image_size: int,
+                decode_mode: str) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]], Optional[str]]:
+    """Read and decode one image in a decode worker: (model input, letterbox, None) or (None, None, error)"""
+    try:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        if decode_mode == 'reduced':
+            image, letterbox = _image_processor.decode_for_model(image_bytes, path, target_size=image_size)
+            return image, letterbox, None
+        return _image_processor.decode_image(image_bytes, path), None, None
+    except HTTPException as e:
+        return None, None, str(e.detail)
+    except Exception as e:
+        return None, None, str(e)
+
+def decode_in_order(pool: Executor, root: Path, paths: List[str], image_size: int, decode_mode: str,
+                    prefetch: int) -> Iterator[Decoded]:
+    """Decode images on the pool, yielding them in input order with at most prefetch in flight"""
+    pending: Deque = deque()
+    for relative in paths:
+        pending.append((relative, pool.submit(decode_file, str(root / relative), image_size, decode_mode)))
+        if len(pending) >= prefetch:
+            relative, future = pending.popleft()
+            yield (relative, *future.result())
+    while pending:
+        relative, future = pending.popleft()
+        yield (relative, *future.result())
+
+def batched(items: Iterator[Decoded], batch_size: int) -> Iterator[List[Decoded]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def score_batch(model: YOLOModel, formatter: ResponseFormatter, image_processor: ImageProcessor,
+                batch: List[Decoded]) -> List[Dict[str, Any]]:
+    """Run the decoded images of a batch through one forward pass; records keep the batch order"""
+    decoded = [item for item in batch if item[3] is None]
+    predictions = {}
+    inference_error = None
+    if decoded:
+        try:
+            outcomes = model.predict_batch([image for _, image, _, _ in decoded])
+            predictions = {relative: outcome for (relative, _, _, _), outcome in zip(decoded, outcomes)}
+        except RuntimeError as e:
+            inference_error = str(e)
+    
+    records = []
+    for relative, image, letterbox, error in batch:
+        error = error or (inference_error if image is not None else None)
+        if error is not None:
+            records.append({"filename": relative, "error": error, "total_defects": 0})
+            continue
+        
+        # Map boxes back to the original image, as the service does for /predict/
+        prediction = predictions[relative]
+        results = prediction["results"]
+        if letterbox is not None and hasattr(results, "xyxy"):
+            detections = results.xyxy[0]
+            detections[:, :4] = image_processor.scale_boxes(detections[:, :4], letterbox)
+        response = formatter.format_single_prediction(
+            results, prediction["inference_time"], image_processor.get_image_info(image, letterbox)
+        )
+        records.append({"filename": relative, **response})
+    return records
+
+class JsonlWriter:
+    """Appends records as JSON lines; a checkpoint is the file size after an fsync"""
+    
+    def __init__(self, path: str, resume: Optional[Dict[str, Any]] = None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if resume is not None:
+            # Drop lines written after the last checkpoint
+            self._file = open(path, 'r+b')
+            self._file.truncate(resume["output_bytes"])
+            self._file.seek(resume["output_bytes"])
+        else:
+            self._file = open(path, 'wb')
+    
+    def write(self, record: Dict[str, Any]) -> None:
+        self._file.write(dumps_json(record) + b"\n")
+    
+    def checkpoint(self) -> Dict[str, Any]:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"output_bytes": self._file.tell()}
+    
+    def close(self) -> None:
+        self._file.close()
+
+def parquet_schema() -> "pyarrow.Schema":
+    """Parquet columns for the records written by score_batch"""
+    box = pyarrow.struct([(field, pyarrow.int64()) for field in BOX_FIELDS])
+    prediction = pyarrow.struct([
+        ("class", pyarrow.string()), ("confidence", pyarrow.float64()), ("bounding_box", box)
+    ])
+    image_info = pyarrow.struct([
+        ("width", pyarrow.int64()), ("height", pyarrow.int64()),
+        ("channels", pyarrow.int64()), ("dtype", pyarrow.string())
+    ])
+    return pyarrow.schema([
+        ("filename", pyarrow.string()),
+        ("predictions", pyarrow.list_(prediction)),
+        ("total_defects", pyarrow.int64()),
+        ("inference_time_ms", pyarrow.float64()),
+        ("image_info", image_info),
+        ("confidence_threshold", pyarrow.float64()),
+        ("timestamp", pyarrow.float64()),
+        ("error", pyarrow.string())
+    ])
+
+class ParquetWriter:
+    """Writes the records of each checkpoint as one numbered part file in a directory"""
+    
+    def __init__(self, directory: str, resume: Optional[Dict[str, Any]] = None):
+        if pyarrow is None:
+            raise SystemExit("Error: --format parquet needs pyarrow (pip install pyarrow)")
+        
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.parts = resume["parts"] if resume is not None else 0
+        # Parts past the checkpoint (or from an earlier run when starting over)
+        for name in os.listdir(directory):
+            if name.startswith('part-') and int(name[5:10]) >= self.parts:
+                os.remove(os.path.join(directory, name))
+        self._schema = parquet_schema()
+        self._rows: List[Dict[str, Any]] = []
+    
+    def write(self, record: Dict[str, Any]) -> None:
+        self._rows.append(record)
+    
+    def checkpoint(self) -> Dict[str, Any]:
+        if self._rows:
+            table = pyarrow.Table.from_pylist(self._rows, schema=self._schema)
+            path = os.path.join(self.directory, f"part-{self.parts:05d}.parquet")
+            pyarrow.parquet.write_table(table, path + '.tmp')
+            os.replace(path + '.tmp', path)
+            self.parts += 1
+            self._rows = []
+        return {"parts": self.parts}
+    
+    def close(self) -> None:
+        pass
+
+def load_manifest(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    """Replace the manifest atomically, so a crash leaves the previous checkpoint intact"""
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+class Progress:
+    """Prints images per second, overall and over the last interval"""
+    
+    def __init__(self, total: int, interval: float):
+        self.total = total
+        self.interval = interval
+        self.started = self._last_time = time.perf_counter()
+        self._last_count = 0
+    
+    def update(self, scored: int, done: int, failed: int, force: bool = False) -> None:
+        now = time.perf_counter()
+        if not force and now - self._last_time < self.interval:
+            return
+        
+        rate = scored / max(now - self.started, 1e-9)
+        recent = (scored - self._last_count) / max(now - self._last_time, 1e-9)
+        remaining = (self.total - done) / rate if rate > 0 else 0.0
+        print(
+            f"{done}/{self.total} images ({failed} failed) | {rate:.1f} images/s, "
+            f"{recent:.1f} images/s recently | ETA {remaining / 60:.1f} min",
+            flush=True
+        )
+        self._last_time = now
+        self._last_count = scored
+
+def build_parser() -> argparse.ArgumentParser:
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Score a directory tree of PCB images offline")
+    parser.add_argument('directory', help="directory searched recursively for images")
+    parser.add_argument('--output', default=None,
+                        help="JSONL file or Parquet directory (default runs/scoring/<directory name>.<format>)")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='jsonl')
+    parser.add_argument('--model', default=None, help="ONNX model to score with (default: the configured model)")
+    parser.add_argument('--workers', type=int, default=max(1, cpus // 2), help="decode worker processes")
+    parser.add_argument('--threads', type=int, default=max(1, cpus - max(1, cpus // 2)),
+                        help="ONNX Runtime intra-op threads")
+    parser.add_argument('--batch-size', type=int, default=Config.MICRO_BATCH_MAX_SIZE)
+    parser.add_argument('--checkpoint-every', type=int, default=1000, help="images between checkpoints")
+    parser.add_argument('--report-seconds', type=float, default=10.0, help="seconds between progress lines")
+    parser.add_argument('--limit', type=int, default=0, help="score at most this many more images (0 = all)")
+    parser.add_argument('--restart', action='store_true', help="ignore the checkpoint and overwrite the output")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = build_parser().parse_args(argv)
+    
+    root = Path(args.directory).resolve()
+    if not root.is_dir():
+        raise SystemExit(f"Error: {args.directory} is not a directory")
+    output = args.output or os.path.join('runs', 'scoring', f"{root.name}.{args.format}")
+    manifest_path = output + '.manifest.json'
+    
+    manifest = None if args.restart else load_manifest(manifest_path)
+    if manifest is not None:
+        if manifest["directory"] != str(root) or manifest["format"] != args.format:
+            raise SystemExit(
+                f"Error: {manifest_path} checkpoints a {manifest['format']} run over {manifest['directory']}; "
+                f"pass --restart to start over"
+            )
+        print(f"Resuming after {manifest['last']} ({manifest['images']} images already scored)")
+    elif os.path.exists(output) and not args.restart:
+        raise SystemExit(f"Error: {output} exists without a checkpoint manifest; pass --restart to overwrite it")
+    else:
+        manifest = {
+            "directory": str(root), "format": args.format, "output": output,
+            "images": 0, "failed": 0, "total_defects": 0, "last": None, "finished": False
+        }
+    
+    paths = list_images(root)
+    remaining = [path for path in paths if manifest["last"] is None or path > manifest["last"]]
+    if args.limit:
+        remaining = remaining[:args.limit]
+    
+    model_config = Config.get_model_config()
+    model_config["intra_op_threads"] = args.threads
+    if args.model:
+        model_config.update(backend='onnx', path=args.model)
+    
+    writer_class = JsonlWriter if args.format == 'jsonl' else ParquetWriter
+    writer = writer_class(output, manifest if manifest["last"] is not None else None)
+    
+    def checkpoint() -> None:
+        manifest.update(writer.checkpoint())
+        manifest["finished"] = not paths or manifest["last"] == paths[-1]
+        manifest["updated_at"] = time.time()
+        save_manifest(manifest_path, manifest)
+    
+    print(f"Scoring {len(remaining)} of {len(paths)} images in {root} with {args.workers} decode workers")
+    # Spawned before the model loads, so no worker inherits inference threads
+    pool = ProcessPoolExecutor(
+        max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_decoder, initargs=(Config.MAX_FILE_SIZE_MB, Config.MAX_IMAGE_PIXELS)
+    )
+    model = YOLOModel(model_config)
+    formatter = ResponseFormatter(Config.MODEL_CONFIDENCE_THRESHOLD)
+    image_processor = ImageProcessor(max_size_mb=Config.MAX_FILE_SIZE_MB, max_pixels=Config.MAX_IMAGE_PIXELS)
+    progress = Progress(len(paths), args.report_seconds)
+    
+    scored = since_checkpoint = 0
+    decoded = decode_in_order(
+        pool, root, remaining, Config.MODEL_IMAGE_SIZE, Config.DECODE_MODE,
+        prefetch=max(2 * args.batch_size, 4 * args.workers)
+    )
+    try:
+        for batch in batched(decoded, args.batch_size):
+            for record in score_batch(model, formatter, image_processor, batch):
+                writer.write(record)
+                manifest["last"] = record["filename"]
+                manifest["images"] += 1
+                manifest["failed"] += "error" in record
+                manifest["total_defects"] += record["total_defects"]
+            
+            scored += len(batch)
+            since_checkpoint += len(batch)
+            if since_checkpoint >= args.checkpoint_every:
+                checkpoint()
+                since_checkpoint = 0
+            progress.update(scored, manifest["images"], manifest["failed"])
+        checkpoint()
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise SystemExit(f"Interrupted after {manifest['last']}; run the same command to resume from the last checkpoint")
+    finally:
+        writer.close()
+        pool.shutdown()
+        model.model.close()
+    
+    progress.update(scored, manifest["images"], manifest["failed"], force=True)
+    print(
+        f"Scored {scored} images in {time.perf_counter() - progress.started:.1f}s; "
+        f"{manifest['images']} of {len(paths)} done, {manifest['failed']} failed, "
+        f"{manifest['total_defects']} defects. Results in {output}"
+    )
+    return manifest
+
+if __name__ == "__main__":
+    main()
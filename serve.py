@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Pre-fork multi-worker server for the defect detection API
+
+Loads the application and the default model's weights once in a master
+process, then forks uvicorn workers that accept connections on one shared
+socket. The weights are inherited copy-on-write, so each worker only adds
+its own session state instead of another copy of the model, and workers
+start without re-reading the model. Each worker gets an equal share of
+the CPUs for its ONNX Runtime and decode threads. Dead workers are
+replaced; SIGTERM or SIGINT stops them all gracefully.
+
+Usage:
+    python serve.py --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger("serve")
+
+# A worker that exits sooner than this after starting is restarted only after a pause
+MIN_WORKER_UPTIME_SECONDS = 5.0
+
+def available_cpus() -> int:
+    """CPUs this process may run on (honours container CPU sets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def configure_worker_threads(workers: int, threads: Optional[int] = None) -> int:
+    """Size each worker's thread pools so that all workers together fit the CPUs
+    
+    Sets defaults through the environment, before the configuration is
+    imported; variables set explicitly are left alone. Returns the threads
+    given to each worker.
+    """
+    threads = threads or max(1, available_cpus() // workers)
+    inference_pools = int(os.getenv("INFERENCE_POOL_SIZE", "1"))
+    os.environ.setdefault("ORT_INTRA_OP_THREADS", str(max(1, threads // inference_pools)))
+    os.environ.setdefault("ORT_INTER_OP_THREADS", "1")
+    os.environ.setdefault("DECODE_POOL_SIZE", str(threads))
+    # NumPy runs inside the decode pool already; nested BLAS threads would oversubscribe
+    for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(variable, "1")
+    if workers > 1 and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="defectnet-metrics-")
+    return threads
+
+def default_model_path() -> str:
+    """The ONNX file the default model is served from"""
+    from config import Config
+    from src.models.backends import onnx_model_path
+    from src.models.model_registry import MODEL_FILENAME
+    
+    registry_path = os.path.join(
+        Config.MODEL_REGISTRY_DIR, Config.DEFAULT_MODEL, Config.DEFAULT_MODEL_VERSION, MODEL_FILENAME
+    )
+    return registry_path if os.path.isfile(registry_path) else onnx_model_path(Config.get_model_config())
+
+def preload_model() -> None:
+    """Load the default model's weights in the master so workers inherit them"""
+    from config import Config
+    from src.models.backends import share_model
+    from src.utils.metrics import process_memory
+    
+    if Config.MODEL_BACKEND != "onnx":
+        logger.info(f"The {Config.MODEL_BACKEND} backend has no weights to share")
+        return
+    share_model(default_model_path())
+    logger.info(f"Master memory after loading the model: {process_memory()}")
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    """Listening socket shared by every worker"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(sock: socket.socket, index: int, log_level: str) -> None:
+    """Serve the application on the shared socket in a forked child (does not return)
+    
+    Job items are owned per worker process in the job store, so a replaced
+    worker's unfinished items are taken over by the surviving workers.
+    """
+    import uvicorn
+    import app as application
+    
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+    
+    status = 0
+    try:
+        config = uvicorn.Config(application.app, log_level=log_level.lower(), lifespan="on")
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        logger.exception(f"Worker {index} failed")
+        status = 1
+    finally:
+        logging.shutdown()
+        os._exit(status)
+
+class Master:
+    """Forks the workers and keeps their number constant until stopped"""
+    
+    def __init__(self, sock: socket.socket, workers: int, log_level: str):
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.children: Dict[int, int] = {}
+        self.started_at: Dict[int, float] = {}
+        self.stopping = False
+    
+    def spawn(self, index: int) -> None:
+        """Fork worker number index"""
+        pid = os.fork()
+        if pid == 0:
+            run_worker(self.sock, index, self.log_level)
+        self.children[pid] = index
+        self.started_at[pid] = time.monotonic()
+        logger.info(f"Started worker {index} (pid {pid})")
+    
+    def stop(self, signum, frame) -> None:
+        """Ask every worker to finish its requests and exit"""
+        if not self.stopping:
+            logger.info(f"Received {signal.Signals(signum).name}, stopping {len(self.children)} workers")
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    def run(self) -> int:
+        """Start the workers and replace any that die; returns once all have stopped"""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self.workers):
+            self.spawn(index)
+        
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = self.children.pop(pid, None)
+            if index is None:
+                continue
+            uptime = time.monotonic() - self.started_at.pop(pid)
+            if self.stopping:
+                continue
+            
+            cause = f"signal {os.WTERMSIG(status)}" if os.WIFSIGNALED(status) else f"status {os.WEXITSTATUS(status)}"
+            logger.warning(f"Worker {index} (pid {pid}) exited with {cause}")
+            if uptime < MIN_WORKER_UPTIME_SECONDS:
+                time.sleep(1.0)
+            if not self.stopping:
+                self.spawn(index)
+        
+        logger.info("All workers stopped")
+        return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Serve the defect detection API with pre-forked workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", "0")),
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("WORKER_THREADS", "0")),
+                        help="CPU threads per worker (default: CPUs / workers)")
+    parser.add_argument("--backlog", type=int, default=2048)
+    return parser
+
+def main(argv: Optional[list] = None) -> int:
+    args = build_parser().parse_args(argv)
+    workers = args.workers or available_cpus()
+    threads = configure_worker_threads(workers, args.threads or None)
+    
+    from config import Config
+    logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL), format=Config.LOG_FORMAT)
+    logger.info(f"Serving on {args.host}:{args.port} with {workers} workers of {threads} threads")
+    
+    # Everything the workers share is imported and loaded before forking
+    import app  # noqa: F401
+    preload_model()
+    sock = bind_socket(args.host, args.port, args.backlog)
+    
+    # Keep the garbage collector from touching (and so copying) the master's objects in workers
+    gc.collect()
+    gc.freeze()
+    
+    try:
+        return Master(sock, workers, Config.LOG_LEVEL).run()
+    finally:
+        sock.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+import abc
+import ast
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..utils.buffer_pool import BufferPool
+from ..utils.image_processor import LETTERBOX_FILL
+from ..utils.metrics import timed_stage
+from ..utils.postprocess import decode_yolov5_output
+
+try:
+    import onnxruntime
+except ImportError:  # only needed by the "onnx" backend
+    onnxruntime = None
+
+logger = logging.getLogger(__name__)
+
+BACKEND_KINDS = ("mock", "onnx")
+
+# Class names from data.yaml
+CLASS_NAMES = ['missing_hole', 'mouse_bite', 'open_circuit', 'short', 'spur', 'spurious_copper']
+
+# Models serialized in ORT format by a pre-forking master (serve.py), keyed by the
+# .onnx path they came from. Forked workers build their sessions on these bytes,
+# so the weights are one copy-on-write block shared by every worker
+_shared_models: Dict[str, bytes] = {}
+
+# Mock detections in model input (letterboxed 640x640) coordinates
+MOCK_DETECTIONS = np.array([
+    [100, 150, 200, 250, 0.85, 0],  # missing_hole
+    [300, 100, 350, 180, 0.72, 4]   # spur
+], dtype=np.float64)
+
+class InferenceBackend(abc.ABC):
+    """Runs a detector on a batch of RGB uint8 images
+    
+    predict returns one (n, 6) array per image of x_min, y_min, x_max,
+    y_max, confidence, class id in that image's own pixel coordinates.
+    """
+    
+    name = "base"
+    device = "cpu"
+    
+    def __init__(self, class_names: Optional[Sequence[str]] = None):
+        self.class_names = list(class_names or CLASS_NAMES)
+    
+    @abc.abstractmethod
+    def predict(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        """Detect defects in each image"""
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Describe the backend for /info"""
+        return {"backend": self.name, "device": self.device}
+    
+    def close(self) -> None:
+        """Release backend resources"""
+
+class MockBackend(InferenceBackend):
+    """Fixed detections after a simulated forward pass (demo and tests)"""
+    
+    name = "mock"
+    
+    def __init__(self, class_names: Optional[Sequence[str]] = None, latency: float = 0.1):
+        super().__init__(class_names)
+        self.latency = latency
+    
+    def predict(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        # Simulate inference time (paid once per forward pass, not per image)
+        time.sleep(self.latency)
+        return [MOCK_DETECTIONS.copy() for _ in images]
+
+def resize_bilinear(image: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Resize an (H, W, C) image with bilinear interpolation (pixel-centre aligned, like OpenCV)"""
+    source_height, source_width = image.shape[:2]
+    
+    def sample_points(size: int, source_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        points = (np.arange(size, dtype=np.float32) + 0.5) * (source_size / size) - 0.5
+        points = np.clip(points, 0, source_size - 1)
+        low = points.astype(np.intp)
+        high = np.minimum(low + 1, source_size - 1)
+        return low, high, (points - low)
+    
+    y0, y1, wy = sample_points(height, source_height)
+    x0, x1, wx = sample_points(width, source_width)
+    wx = wx[None, :, None]
+    
+    rows_top = image[y0].astype(np.float32)
+    rows_bottom = image[y1].astype(np.float32)
+    top = rows_top[:, x0] * (1 - wx) + rows_top[:, x1] * wx
+    bottom = rows_bottom[:, x0] * (1 - wx) + rows_bottom[:, x1] * wx
+    return top + (bottom - top) * wy[:, None, None]
+
+def letterbox_batch(images: List[np.ndarray], size: int,
+                    out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, List[Tuple[float, int, int]]]:
+    """Letterbox RGB uint8 images into one (N, 3, size, size) float32 batch scaled to [0, 1]
+    
+    Images already size x size (the usual case, since the decode stage
+    letterboxes to the model input size) are only converted. Returns the
+    batch and each image's (scale, pad_x, pad_y).
+    """
+    batch_shape = (len(images), 3, size, size)
+    if out is not None and out.shape == batch_shape and out.dtype == np.float32:
+        batch = out
+    else:
+        batch = np.empty(batch_shape, dtype=np.float32)
+    
+    geometry = []
+    for i, image in enumerate(images):
+        height, width = image.shape[:2]
+        scale = size / max(width, height)
+        new_width = max(1, round(width * scale))
+        new_height = max(1, round(height * scale))
+        pad_x = (size - new_width) // 2
+        pad_y = (size - new_height) // 2
+        
+        pixels = image[..., :3]
+        if (new_width, new_height) != (width, height):
+            pixels = resize_bilinear(pixels, new_width, new_height)
+        if (new_width, new_height) != (size, size):
+            batch[i] = LETTERBOX_FILL / 255.0
+        # HWC -> CHW while scaling to [0, 1], written straight into the batch
+        np.multiply(
+            pixels.transpose(2, 0, 1), np.float32(1 / 255.0),
+            out=batch[i, :, pad_y:pad_y + new_height, pad_x:pad_x + new_width],
+            casting="unsafe"
+        )
+        geometry.append((scale, pad_x, pad_y))
+    return batch, geometry
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """YOLOv5 exported to ONNX, run with ONNX Runtime on CPU
+    
+    Expects the YOLOv5 export layout: one "images" input of shape
+    (batch, 3, size, size) and an output of (batch, candidates, 5 + classes).
+    A fixed batch dimension is honoured by running the batch in chunks.
+    Class names come from the model's "names" metadata when present.
+    """
+    
+    name = "onnx"
+    shared_weights = False
+    
+    def __init__(self, model_path: str, image_size: int = 640, conf_threshold: float = 0.25,
+                 iou_threshold: float = 0.45, max_detections: int = 300,
+                 intra_op_threads: int = 0, inter_op_threads: int = 0,
+                 class_names: Optional[Sequence[str]] = None,
+                 buffer_pool: Optional[BufferPool] = None):
+        if onnxruntime is None:
+            raise RuntimeError("onnxruntime is required for the onnx backend (pip install onnxruntime)")
+        
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        shared = _shared_models.get(model_path)
+        if shared is not None:
+            # Already optimized; initializers are read in place from the shared bytes
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+            options.add_session_config_entry("session.load_model_format", "ORT")
+            options.add_session_config_entry("session.use_ort_model_bytes_directly", "1")
+            options.add_session_config_entry("session.use_ort_model_bytes_for_initializers", "1")
+        else:
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(
+            shared if shared is not None else model_path, sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.shared_weights = shared is not None
+        
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch_dim, _, height, _ = model_input.shape
+        self.batch_size = batch_dim if isinstance(batch_dim, int) else None
+        self.image_size = height if isinstance(height, int) else image_size
+        
+        self.model_path = model_path
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.max_detections = max_detections
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        # Input batches are letterboxed and normalised in place into pooled tensors
+        self.buffer_pool = buffer_pool or BufferPool()
+        super().__init__(class_names or self._metadata_names())
+        logger.info(
+            f"Loaded ONNX model {model_path} (input {self.image_size}, "
+            f"batch {self.batch_size or 'dynamic'}, {len(self.class_names)} classes)"
+        )
+    
+    def _metadata_names(self) -> Optional[List[str]]:
+        """Class names stored by the YOLOv5 exporter as a dict literal, if any"""
+        names = self.session.get_modelmeta().custom_metadata_map.get("names")
+        if not names:
+            return None
+        try:
+            parsed = ast.literal_eval(names)
+        except (ValueError, SyntaxError):
+            return None
+        if isinstance(parsed, dict):
+            return [parsed[key] for key in sorted(parsed)]
+        return list(parsed)
+    
+    def predict(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        batch = self.buffer_pool.acquire((len(images), 3, self.image_size, self.image_size), np.float32)
+        try:
+            batch, geometry = letterbox_batch(images, self.image_size, out=batch)
+            
+            chunk = self.batch_size or len(images)
+            outputs = []
+            for start in range(0, len(images), chunk):
+                raw = self.session.run(None, {self.input_name: batch[start:start + chunk]})[0]
+                outputs.append(raw)
+            raw = np.concatenate(outputs) if len(outputs) > 1 else outputs[0]
+        finally:
+            self.buffer_pool.release(batch)
+        
+        detections = self._decode(raw)
+        for image, found, (scale, pad_x, pad_y) in zip(images, detections, geometry):
+            # Map from the letterboxed network input back to the image's pixels
+            found[:, [0, 2]] = (found[:, [0, 2]] - pad_x) / scale
+            found[:, [1, 3]] = (found[:, [1, 3]] - pad_y) / scale
+            found[:, [0, 2]] = np.clip(found[:, [0, 2]], 0, image.shape[1])
+            found[:, [1, 3]] = np.clip(found[:, [1, 3]], 0, image.shape[0])
+        return detections
+    
+    @timed_stage("nms")
+    def _decode(self, raw: np.ndarray) -> List[np.ndarray]:
+        return decode_yolov5_output(raw, self.conf_threshold, self.iou_threshold, self.max_detections)
+    
+    def get_info(self) -> Dict[str, Any]:
+        info = super().get_info()
+        info.update({
+            "model_path": self.model_path,
+            "image_size": self.image_size,
+            "batch_size": self.batch_size or "dynamic",
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "shared_weights": self.shared_weights
+        })
+        return info
+    
+    def close(self) -> None:
+        """Drop the session and, when it was built on them, this process's shared model bytes"""
+        self.session = None
+        if self.shared_weights:
+            _shared_models.pop(self.model_path, None)
+
+def share_model(model_path: str) -> int:
+    """Optimize a model once and keep it in memory for sessions created in forked workers
+    
+    Call before forking. The optimized graph is serialized in ORT format,
+    which lets later sessions use its initializers without copying them.
+    Returns the number of bytes shared.
+    """
+    if onnxruntime is None:
+        raise RuntimeError("onnxruntime is required for the onnx backend (pip install onnxruntime)")
+    
+    with tempfile.TemporaryDirectory() as directory:
+        ort_path = os.path.join(directory, "model.ort")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # A single thread keeps the master free of thread pools that would not survive fork
+        options.intra_op_num_threads = 1
+        options.inter_op_num_threads = 1
+        options.optimized_model_filepath = ort_path
+        options.add_session_config_entry("session.save_model_format", "ORT")
+        session = onnxruntime.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        del session
+        with open(ort_path, "rb") as f:
+            _shared_models[model_path] = f.read()
+    
+    logger.info(f"Sharing {model_path} with forked workers ({len(_shared_models[model_path]) / 1e6:.1f} MB)")
+    return len(_shared_models[model_path])
+
+def onnx_model_path(config: Dict[str, Any]) -> str:
+    """The ONNX file to serve: MODEL_PATH when it names one (e.g. a quantized variant), else ONNX_MODEL_PATH"""
+    path = config.get("path") or ""
+    return path if path.endswith(".onnx") else config["onnx_path"]
+
+def create_backend(config: Dict[str, Any], buffer_pool: Optional[BufferPool] = None) -> InferenceBackend:
+    """Build the inference backend named by config["backend"] (default "mock")"""
+    kind = config.get("backend", "mock")
+    if kind == "mock":
+        return MockBackend()
+    if kind == "onnx":
+        return OnnxRuntimeBackend(
+            onnx_model_path(config),
+            image_size=config.get("image_size", 640),
+            conf_threshold=config.get("confidence_threshold", 0.25),
+            iou_threshold=config.get("iou_threshold", 0.45),
+            max_detections=config.get("max_detections", 300),
+            intra_op_threads=config.get("intra_op_threads", 0),
+            inter_op_threads=config.get("inter_op_threads", 0),
+            buffer_pool=buffer_pool
+        )
+    raise ValueError(f"Unknown model backend '{kind}', expected one of {BACKEND_KINDS}")
@@ -0,0 +1,323 @@
+import asyncio
+import contextlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from ..utils.buffer_pool import BufferPool
+from .yolo_model import YOLOModel
+
+logger = logging.getLogger(__name__)
+
+# File each version directory must hold: <registry_dir>/<name>/<version>/model.onnx
+MODEL_FILENAME = "model.onnx"
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+def version_sort_key(version: str) -> Tuple:
+    """Order versions naturally, so that v10 sorts after v9"""
+    return tuple(int(part) if part.isdigit() else part for part in re.split(r"(\d+)", version))
+
+def model_size(config: Dict[str, Any]) -> int:
+    """Memory estimate for a model: its weights file size (0 for the mock backend)"""
+    if config.get("backend", "mock") == "mock":
+        return 0
+    path = config["path"] if str(config.get("path", "")).endswith(".onnx") else config.get("onnx_path", "")
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+class ModelEntry:
+    """A resident model version and the requests currently using it"""
+    
+    def __init__(self, name: str, version: str, model: YOLOModel, size_bytes: int):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.size_bytes = size_bytes
+        self.leases = 0
+        self.loaded_at = time.time()
+        self.last_used = time.monotonic()
+        # Set once a newer version has been swapped in; unloaded when its last lease ends
+        self.retired = False
+    
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.name, self.version)
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Describe the entry for /models"""
+        return {
+            "name": self.name,
+            "version": self.version,
+            "size_bytes": self.size_bytes,
+            "leases": self.leases,
+            "loaded_at": self.loaded_at,
+            "retired": self.retired
+        }
+
+class ModelRegistry:
+    """Load models by name and version on demand and keep the most recently used resident
+    
+    Versions live in <registry_dir>/<name>/<version>/model.onnx; the default
+    model falls back to the configured MODEL_PATH. At most max_resident
+    models, and at most memory_budget_bytes of model files, stay loaded;
+    least recently used models without running requests are unloaded to
+    make room. Both limits apply per process: inference pool workers keep
+    their own copies within the same limits. Requests hold a lease on the version they started with, so
+    activate() can warm a new version and swap it in without disturbing them.
+    """
+    
+    def __init__(self, base_config: Dict[str, Any], registry_dir: str, default_name: str = "default",
+                 default_version: str = "1", max_resident: int = 3,
+                 memory_budget_bytes: int = 2 * 1024 * 1024 * 1024,
+                 buffer_pool: Optional[BufferPool] = None,
+                 loader: Optional[Callable[[Dict[str, Any]], YOLOModel]] = None):
+        self.base_config = dict(base_config)
+        self.registry_dir = registry_dir
+        self.default_name = default_name
+        self.default_version = default_version
+        self.max_resident = max(1, max_resident)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.buffer_pool = buffer_pool
+        self._loader = loader or (lambda config: YOLOModel(config, buffer_pool=self.buffer_pool))
+        
+        # (name, version) -> entry, least recently used first
+        self._resident: "OrderedDict[Tuple[str, str], ModelEntry]" = OrderedDict()
+        # Loads in progress, shared by concurrent requests for the same version
+        self._loading: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._active: Dict[str, str] = {}
+        
+        self._loads = 0
+        self._evictions = 0
+        self._swaps = 0
+    
+    def _check_name(self, value: str, what: str) -> None:
+        if not _NAME_PATTERN.match(value):
+            raise HTTPException(status_code=400, detail=f"Invalid model {what}: {value}")
+    
+    def _version_path(self, name: str, version: str) -> str:
+        return os.path.join(self.registry_dir, name, version, MODEL_FILENAME)
+    
+    def available_versions(self, name: str) -> List[str]:
+        """Versions of a model found in the registry directory (plus the configured default)"""
+        versions = set()
+        model_dir = os.path.join(self.registry_dir, name)
+        if os.path.isdir(model_dir):
+            versions.update(
+                version for version in os.listdir(model_dir)
+                if os.path.isfile(self._version_path(name, version))
+            )
+        if name == self.default_name:
+            versions.add(self.default_version)
+        return sorted(versions, key=version_sort_key)
+    
+    def model_names(self) -> List[str]:
+        """Every model name with at least one version"""
+        names = {self.default_name}
+        if os.path.isdir(self.registry_dir):
+            names.update(name for name in os.listdir(self.registry_dir) if self.available_versions(name))
+        return sorted(names)
+    
+    def active_version(self, name: str) -> str:
+        """The version new requests for a model get: the activated one, else the newest"""
+        version = self._active.get(name)
+        if version is not None:
+            return version
+        if name == self.default_name:
+            return self.default_version
+        versions = self.available_versions(name)
+        if not versions:
+            raise HTTPException(status_code=404, detail=f"Unknown model: {name}")
+        return versions[-1]
+    
+    def _model_config(self, name: str, version: str) -> Dict[str, Any]:
+        """Model configuration for one version"""
+        self._check_name(name, "name")
+        self._check_name(version, "version")
+        config = dict(self.base_config, model=name, version=version)
+        
+        path = self._version_path(name, version)
+        if os.path.isfile(path):
+            config["path"] = path
+        elif not (name == self.default_name and version == self.default_version):
+            raise HTTPException(status_code=404, detail=f"Unknown model version: {name} {version}")
+        return config
+    
+    def _load(self, config: Dict[str, Any], warm: bool) -> YOLOModel:
+        """Load a model (and run one forward pass to warm it), on a worker thread"""
+        model = self._loader(config)
+        if warm:
+            size = config.get("image_size", 640)
+            model.predict_batch([np.zeros((size, size, 3), dtype=np.uint8)])
+        return model
+    
+    def _admit(self, name: str, version: str, model: YOLOModel, size_bytes: int) -> ModelEntry:
+        """Make a freshly loaded model resident, unloading idle models to stay within limits"""
+        self._make_room(size_bytes)
+        entry = ModelEntry(name, version, model, size_bytes)
+        self._resident[entry.key] = entry
+        self._loads += 1
+        logger.info(f"Loaded model {name} version {version}")
+        return entry
+    
+    def _make_room(self, size_bytes: int) -> None:
+        """Evict least recently used idle models until a new model of size_bytes fits"""
+        def over_limits() -> bool:
+            used = sum(entry.size_bytes for entry in self._resident.values())
+            return (len(self._resident) + 1 > self.max_resident
+                    or used + size_bytes > self.memory_budget_bytes)
+        
+        for entry in list(self._resident.values()):
+            if not over_limits():
+                return
+            if entry.leases == 0 and entry.key != self._default_key():
+                self._unload(entry)
+                self._evictions += 1
+        
+        if over_limits():
+            raise HTTPException(
+                status_code=503,
+                detail="Model capacity exhausted: every resident model is serving requests"
+            )
+    
+    def _unload(self, entry: ModelEntry) -> None:
+        self._resident.pop(entry.key, None)
+        if entry.model.model is not None:
+            entry.model.model.close()
+        logger.info(f"Unloaded model {entry.name} version {entry.version}")
+    
+    def _default_key(self) -> Tuple[str, str]:
+        return (self.default_name, self.active_version(self.default_name))
+    
+    def preload_default(self) -> ModelEntry:
+        """Load the default model synchronously (service startup)"""
+        name, version = self._default_key()
+        config = self._model_config(name, version)
+        return self._admit(name, version, self._load(config, warm=False), model_size(config))
+    
+    async def _get_entry(self, name: str, version: str, warm: bool = True) -> ModelEntry:
+        """Return a resident entry, loading it once however many requests ask at the same time"""
+        key = (name, version)
+        entry = self._resident.get(key)
+        if entry is not None:
+            return entry
+        
+        loading = self._loading.get(key)
+        if loading is None:
+            config = self._model_config(name, version)
+            loading = asyncio.get_running_loop().create_future()
+            self._loading[key] = loading
+            try:
+                try:
+                    model = await asyncio.to_thread(self._load, config, warm)
+                except Exception as e:
+                    logger.error(f"Failed to load model {name} version {version}: {str(e)}")
+                    raise HTTPException(
+                        status_code=500, detail=f"Failed to load model {name} version {version}: {str(e)}"
+                    )
+                entry = self._admit(name, version, model, model_size(config))
+                loading.set_result(entry)
+            except BaseException as e:
+                loading.set_exception(e)
+                # Mark the exception retrieved when nobody else was waiting
+                loading.exception()
+                raise
+            finally:
+                self._loading.pop(key, None)
+            return entry
+        return await asyncio.shield(loading)
+    
+    def resolve(self, name: Optional[str] = None, version: Optional[str] = None) -> Tuple[str, str]:
+        """The (name, version) a request would get, raising 404 for unknown models"""
+        name = name or self.default_name
+        version = version or self.active_version(name)
+        self._model_config(name, version)
+        return name, version
+    
+    async def acquire(self, name: Optional[str] = None, version: Optional[str] = None) -> ModelEntry:
+        """Lease a model version for one request (the active version unless pinned)"""
+        name = name or self.default_name
+        entry = await self._get_entry(name, version or self.active_version(name))
+        entry.leases += 1
+        entry.last_used = time.monotonic()
+        self._resident.move_to_end(entry.key)
+        return entry
+    
+    def release(self, entry: ModelEntry) -> None:
+        """End a request's lease; retired versions are unloaded after their last request"""
+        entry.leases -= 1
+        if entry.leases == 0 and entry.retired and entry.key in self._resident:
+            self._unload(entry)
+    
+    @contextlib.asynccontextmanager
+    async def lease(self, name: Optional[str] = None, version: Optional[str] = None) -> AsyncIterator[ModelEntry]:
+        """`async with registry.lease(name) as entry:` for the duration of a request"""
+        entry = await self.acquire(name, version)
+        try:
+            yield entry
+        finally:
+            self.release(entry)
+    
+    async def activate(self, name: str, version: str) -> Dict[str, Any]:
+        """Load and warm a version, then make it the one new requests get
+        
+        Requests already running keep their lease on the previous version,
+        which is unloaded once the last of them finishes.
+        """
+        entry = await self.acquire(name, version)
+        try:
+            previous = self._resident.get((name, self.active_version(name)))
+            self._active[name] = version
+            entry.retired = False
+            self._swaps += 1
+            
+            if previous is not None and previous is not entry:
+                previous.retired = True
+                if previous.leases == 0:
+                    self._unload(previous)
+            logger.info(
+                f"Activated model {name} version {version}"
+                + (f" (was {previous.version})" if previous is not None and previous is not entry else "")
+            )
+        finally:
+            self.release(entry)
+        return self.get_model_status(name)
+    
+    @property
+    def default_model(self) -> Optional[YOLOModel]:
+        """The active default model, when resident"""
+        entry = self._resident.get(self._default_key())
+        return entry.model if entry is not None else None
+    
+    def get_model_status(self, name: str) -> Dict[str, Any]:
+        """Versions, active version and resident entries of one model"""
+        return {
+            "name": name,
+            "active_version": self.active_version(name),
+            "versions": self.available_versions(name),
+            "resident": [entry.get_info() for entry in self._resident.values() if entry.name == name]
+        }
+    
+    def close(self) -> None:
+        """Unload every resident model"""
+        for entry in list(self._resident.values()):
+            self._unload(entry)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get residency limits and counters"""
+        return {
+            "default": self.default_name,
+            "max_resident": self.max_resident,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "resident_bytes": sum(entry.size_bytes for entry in self._resident.values()),
+            "resident": [entry.get_info() for entry in self._resident.values()],
+            "active_versions": dict(self._active),
+            "loads": self._loads,
+            "evictions": self._evictions,
+            "swaps": self._swaps
+        }
@@ -3,110 +3,146 @@ import logging
 from typing import Optional, Dict, Any, List
 import time
 import json
+import numpy as np
 from config import Config
+from ..utils.buffer_pool import BufferPool
+from ..utils.metrics import timed_stage
+from ..utils.postprocess import merge_tile_detections
+from .backends import CLASS_NAMES, MOCK_DETECTIONS, InferenceBackend, create_backend
 
 logger = logging.getLogger(__name__)
 
 class YOLOModel:
-    """Mock YOLOv5 model wrapper for demo purposes"""
+    """YOLOv5 model wrapper over a pluggable inference backend ("mock" or "onnx")"""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], buffer_pool: Optional[BufferPool] = None):
         self.config = config
-        self.model = "mock_model"
+        self.buffer_pool = buffer_pool
+        self.model: Optional[InferenceBackend] = None
         self.device = "cpu"
         self._load_model()
     
     def _load_model(self) -> None:
-        """Load mock model"""
+        """Create the configured inference backend"""
         try:
-            logger.info(f"Loading mock YOLOv5 model: {self.config['name']}")
-            logger.info("Using online API simulation for demo purposes")
-            self.model = "mock_model"
-            logger.info("Mock model loaded successfully")
+            backend = self.config.get("backend", "mock")
+            logger.info(f"Loading YOLOv5 model {self.config['name']} with the {backend} backend")
+            if backend == "mock":
+                logger.info("Using online API simulation for demo purposes")
+            self.model = create_backend(self.config, self.buffer_pool)
+            self.device = self.model.device
+            logger.info("Model loaded successfully")
         except Exception as e:
             logger.error(f"Failed to load model: {str(e)}")
             raise RuntimeError(f"Model loading failed: {str(e)}")
     
-    def predict(self, image_array, timeout: int = 30) -> Dict[str, Any]:
-        """Run mock inference on image"""
+    def predict(self, image_array) -> Dict[str, Any]:
+        """Run inference on image"""
+        return self.predict_batch([image_array])[0]
+    
+    @timed_stage("inference")
+    def predict_batch(self, image_arrays: List) -> List[Dict[str, Any]]:
+        """Run inference on a batch of images in a single forward pass
+        
+        Time limits are enforced by the caller through the request deadline.
+        """
         if self.model is None:
             raise RuntimeError("Model not loaded")
         
         try:
             start_time = time.time()
             
-            # Simulate inference time
-            time.sleep(0.1)
-            
-            # Mock results
-            mock_results = MockResults()
+            detections = self.model.predict(list(image_arrays))
+            batch_results = [MockResults(found, self.model.class_names) for found in detections]
             
             inference_time = time.time() - start_time
             
-            if inference_time > timeout:
-                logger.warning(f"Inference took {inference_time:.2f}s, exceeding timeout of {timeout}s")
-            
-            return {
-                "results": mock_results,
-                "inference_time": inference_time,
-                "device": str(self.device)
-            }
+            return [
+                {
+                    "results": results,
+                    "inference_time": inference_time,
+                    "device": str(self.device),
+                    "batch_size": len(image_arrays)
+                }
+                for results in batch_results
+            ]
             
         except Exception as e:
             logger.error(f"Inference failed: {str(e)}")
             raise RuntimeError(f"Prediction failed: {str(e)}")
     
+    @timed_stage("tile_merge")
+    def merge_tiles(self, tile_predictions: List[Dict[str, Any]], origins: np.ndarray,
+                    image_size: tuple, merge_iou: float = 0.5,
+                    inference_time: float = 0.0) -> Dict[str, Any]:
+        """Combine per-tile predictions into one prediction in full image coordinates"""
+        detections = merge_tile_detections(
+            [prediction["results"].xyxy[0] for prediction in tile_predictions],
+            origins,
+            image_size,
+            merge_iou
+        )
+        return {
+            "results": MockResults(detections, self.model.class_names),
+            "inference_time": inference_time,
+            "device": str(self.device),
+            "tiles": len(origins)
+        }
+    
     def is_loaded(self) -> bool:
         """Check if model is loaded and ready"""
         return self.model is not None
     
     def get_model_info(self) -> Dict[str, Any]:
         """Get model information"""
-        return {
+        info = {
             "name": self.config['name'],
             "device": str(self.device),
             "loaded": self.is_loaded(),
             "confidence_threshold": self.config['confidence_threshold']
         }
+        if "version" in self.config:
+            info["model"] = self.config["model"]
+            info["version"] = self.config["version"]
+        if self.model is not None:
+            info.update(self.model.get_info())
+        return info
 
 class MockResults:
-    """Mock YOLOv5 results for demo purposes"""
+    """YOLOv5-style results over a detections array"""
+    
+    def __init__(self, detections: Optional[np.ndarray] = None, names: Optional[List[str]] = None):
+        self.names = names or CLASS_NAMES
+        # Like YOLOv5 Detections: one (n, 6) array per image of
+        # x_min, y_min, x_max, y_max, confidence, class id
+        self.xyxy = [MOCK_DETECTIONS.copy() if detections is None else detections]
     
     def pandas(self):
-        return MockPandas()
+        return MockPandas(self.xyxy[0], self.names)
 
 class MockPandas:
     """Mock pandas results"""
     
-    def __init__(self):
-        self.xyxy = [MockDataFrame()]
+    def __init__(self, detections: np.ndarray, names: List[str]):
+        self.xyxy = [MockDataFrame(detections, names)]
 
 class MockDataFrame:
-    """Mock DataFrame with sample predictions"""
+    """Mock DataFrame over a detections array"""
+    
+    def __init__(self, detections: np.ndarray, names: List[str]):
+        self.detections = detections
+        self.names = names
     
     def iterrows(self):
-        # Return mock predictions
-        mock_data = [
-            {
-                'name': 'missing_hole',
-                'confidence': 0.85,
-                'xmin': 100,
-                'ymin': 150,
-                'xmax': 200,
-                'ymax': 250
-            },
-            {
-                'name': 'spur',
-                'confidence': 0.72,
-                'xmin': 300,
-                'ymin': 100,
-                'xmax': 350,
-                'ymax': 180
-            }
-        ]
-        
-        for i, data in enumerate(mock_data):
-            yield i, MockRow(data)
+        for i, (xmin, ymin, xmax, ymax, confidence, class_id) in enumerate(self.detections.tolist()):
+            yield i, MockRow({
+                'name': self.names[int(class_id)],
+                'confidence': confidence,
+                'xmin': xmin,
+                'ymin': ymin,
+                'xmax': xmax,
+                'ymax': ymax
+            })
 
 class MockRow:
     """Mock DataFrame row"""
@@ -114,3 +150,6 @@ class MockRow:
     def __init__(self, data):
         for key, value in data.items():
             setattr(self, key, value)
+    
+    def __getitem__(self, key):
+        return getattr(self, key)
@@ -0,0 +1,171 @@
+import contextlib
+import contextvars
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException
+
+from ..utils.metrics import ADMISSION_DECISIONS, ADMISSION_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+# Single images (/predict/, WebSocket frames) are served ahead of batch uploads
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+
+# Priority class of the current request; work queued outside a request is interactive
+_current_priority: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "request_priority", default=PRIORITY_INTERACTIVE
+)
+
+# Interactive latencies kept for the SLO check (the newest, within the window)
+LATENCY_SAMPLES = 256
+
+@contextlib.contextmanager
+def request_priority(priority: str) -> Iterator[str]:
+    """Queue the stage work started in this context (and tasks it creates) at priority"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{priority}', expected one of {PRIORITIES}")
+    token = _current_priority.set(priority)
+    try:
+        yield priority
+    finally:
+        _current_priority.reset(token)
+
+def current_priority() -> str:
+    """Priority class of the current request"""
+    return _current_priority.get()
+
+def priority_rank(priority: str) -> int:
+    """Order in which queued work of a priority class is served; lowest first"""
+    return PRIORITIES.index(priority)
+
+class AdmissionController:
+    """Reject work early with 503 and Retry-After instead of letting it queue up
+    
+    In-flight work is counted in images across every client. Interactive
+    requests are admitted up to max_in_flight; batch requests only up to
+    batch_share of it, so that the remaining headroom is kept for single
+    images. While the p95 latency of recent interactive requests exceeds
+    latency_slo_ms, batch requests are refused and the interactive limit is
+    halved until latency recovers.
+    """
+    
+    def __init__(self, max_in_flight: int = 64, batch_share: float = 0.5, latency_slo_ms: float = 2000.0,
+                 latency_window_seconds: float = 10.0, enabled: bool = True,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.batch_share = batch_share
+        self.latency_slo_ms = latency_slo_ms
+        self.latency_window_seconds = latency_window_seconds
+        self.enabled = enabled
+        self._clock = clock
+        
+        self._in_flight = {priority: 0 for priority in PRIORITIES}
+        # (completed at, seconds) of successful interactive requests
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=LATENCY_SAMPLES)
+        self._p95: Optional[float] = None
+        self._p95_stale = False
+        
+        self._admitted = {priority: 0 for priority in PRIORITIES}
+        self._rejected = {priority: 0 for priority in PRIORITIES}
+    
+    @property
+    def in_flight(self) -> int:
+        """Images admitted and not yet finished"""
+        return sum(self._in_flight.values())
+    
+    def recent_latency(self) -> Optional[float]:
+        """p95 latency in seconds of interactive requests completed within the window"""
+        horizon = self._clock() - self.latency_window_seconds
+        while self._latencies and self._latencies[0][0] < horizon:
+            self._latencies.popleft()
+            self._p95_stale = True
+        
+        if self._p95_stale:
+            samples = sorted(seconds for _, seconds in self._latencies)
+            self._p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else None
+            self._p95_stale = False
+        return self._p95
+    
+    def over_slo(self) -> bool:
+        """Whether recent interactive latency exceeds the SLO (never when the SLO is 0)"""
+        latency = self.recent_latency()
+        return self.latency_slo_ms > 0 and latency is not None and latency * 1000 > self.latency_slo_ms
+    
+    def limit(self, priority: str) -> int:
+        """Most images that may be in flight when admitting a request of this class"""
+        if priority == PRIORITY_BATCH:
+            return 0 if self.over_slo() else max(1, int(self.max_in_flight * self.batch_share))
+        return max(1, self.max_in_flight // 2) if self.over_slo() else self.max_in_flight
+    
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait: the recent p95 latency, at least one second"""
+        latency = self.recent_latency()
+        return max(1, math.ceil(latency)) if latency is not None else 1
+    
+    def check(self, priority: str, cost: int = 1) -> None:
+        """Raise 503 with Retry-After when a request of cost images cannot be admitted now
+        
+        An idle service admits any request, however large.
+        """
+        if not self.enabled:
+            return
+        
+        limit = self.limit(priority)
+        if self.in_flight == 0 or self.in_flight + cost <= limit:
+            return
+        
+        self._rejected[priority] += 1
+        ADMISSION_DECISIONS.labels(priority, "rejected").inc()
+        reason = "latency above SLO" if self.over_slo() else f"{self.in_flight} images in flight"
+        logger.warning(f"Rejected {priority} request of {cost} images: {reason}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server overloaded ({reason}), retry later",
+            headers={"Retry-After": str(self.retry_after())}
+        )
+    
+    @contextlib.contextmanager
+    def track(self, priority: str, cost: int = 1) -> Iterator[None]:
+        """Count already admitted work as in flight and record its latency on success"""
+        self._admitted[priority] += 1
+        ADMISSION_DECISIONS.labels(priority, "admitted").inc()
+        self._in_flight[priority] += cost
+        ADMISSION_IN_FLIGHT.labels(priority).inc(cost)
+        started = self._clock()
+        completed = False
+        try:
+            yield
+            completed = True
+        finally:
+            self._in_flight[priority] -= cost
+            ADMISSION_IN_FLIGHT.labels(priority).dec(cost)
+            if completed and priority == PRIORITY_INTERACTIVE:
+                now = self._clock()
+                self._latencies.append((now, now - started))
+                self._p95_stale = True
+    
+    def admit(self, priority: str, cost: int = 1) -> contextlib.AbstractContextManager:
+        """`with admission.admit(PRIORITY_BATCH, len(files)):` around a request, or raise 503"""
+        self.check(priority, cost)
+        return self.track(priority, cost)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get limits, in-flight work and decision counters"""
+        latency = self.recent_latency()
+        return {
+            "enabled": self.enabled,
+            "max_in_flight": self.max_in_flight,
+            "batch_share": self.batch_share,
+            "latency_slo_ms": self.latency_slo_ms,
+            "recent_p95_ms": round(latency * 1000, 2) if latency is not None else None,
+            "over_slo": self.over_slo(),
+            "in_flight": dict(self._in_flight),
+            "admitted": dict(self._admitted),
+            "rejected": dict(self._rejected)
+        }
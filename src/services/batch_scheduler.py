@@ -0,0 +1,243 @@
+import asyncio
+import contextvars
+import inspect
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from ..utils.deadline import DeadlineExceeded, current_deadline, expired, record_timeout
+from ..utils.metrics import BATCH_QUEUE_SECONDS, BATCH_REJECTIONS, BATCH_SIZE
+from .admission import current_priority, priority_rank, request_priority
+
+logger = logging.getLogger(__name__)
+
+# (image, future, enqueue time, key, deadline, priority) of a request waiting for a batch
+PendingRequest = Tuple[Any, asyncio.Future, float, Any, Optional[float], str]
+
+class MicroBatchScheduler:
+    """Coalesce concurrent inference requests into batched forward passes
+    
+    Requests submitted with a key (e.g. the model that should serve them)
+    are only batched with requests of the same key, and the key is passed
+    to predict_batch_fn as a second argument. Requests are only batched
+    with requests of the same priority class; the most urgent class is
+    collected first, and its forward pass is queued at that priority.
+    Requests whose deadline passes while queued, or whose caller gave up,
+    are dropped before the forward pass.
+    """
+    
+    def __init__(
+        self,
+        predict_batch_fn: Callable[[List[Any]], Any],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        max_queue_depth: int = 256,
+        max_inflight_batches: int = 1
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        
+        self.predict_batch_fn = predict_batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_queue_depth = max_queue_depth
+        self.max_inflight_batches = max_inflight_batches
+        
+        self._pending: Deque[PendingRequest] = deque()
+        # Requests taken off the queue for the batch being collected
+        self._collecting: List[PendingRequest] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        self._batches_run = 0
+        self._requests_processed = 0
+        self._requests_rejected = 0
+        self._requests_expired = 0
+        self._max_batch_seen = 0
+    
+    async def submit(self, image_array, key: Any = None) -> Dict[str, Any]:
+        """Queue an image for the next batched forward pass and wait for its result"""
+        self._ensure_started()
+        
+        if len(self._pending) >= self.max_queue_depth:
+            self._requests_rejected += 1
+            BATCH_REJECTIONS.inc()
+            raise HTTPException(
+                status_code=503,
+                detail=f"Inference queue full ({self.max_queue_depth} pending requests)"
+            )
+        
+        future = self._loop.create_future()
+        self._pending.append(
+            (image_array, future, time.perf_counter(), key, current_deadline(), current_priority())
+        )
+        self._wakeup.set()
+        return await future
+    
+    def _ensure_started(self) -> None:
+        """Start the batching worker on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker is not None and not self._worker.done():
+            return
+        
+        # Requests left behind by a worker that died would otherwise wait forever
+        self._fail_pending(RuntimeError("Batching worker stopped before running the request"))
+        self._loop = loop
+        self._pending = deque()
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_inflight_batches)
+        # Run the worker in an empty context: it serves every caller, so it must
+        # not inherit (and record stages into) the first caller's request trace
+        self._worker = contextvars.Context().run(loop.create_task, self._run())
+        self._worker.add_done_callback(self._on_worker_done)
+    
+    def _on_worker_done(self, worker: asyncio.Task) -> None:
+        """Fail the queued requests as soon as the batching worker dies"""
+        error = None if worker.cancelled() else worker.exception()
+        if error is not None:
+            logger.error(f"Batching worker failed: {str(error)}")
+        self._fail_pending(RuntimeError(f"Batching worker stopped: {str(error) if error else 'cancelled'}"))
+    
+    def _fail_pending(self, error: Exception) -> None:
+        """Resolve every queued or collecting request with error"""
+        waiting, self._collecting = list(self._pending) + self._collecting, []
+        self._pending.clear()
+        for _, future, _, _, _, _ in waiting:
+            if not future.done() and not future.get_loop().is_closed():
+                future.set_exception(error)
+    
+    async def _run(self) -> None:
+        """Collect pending requests into batches and dispatch them"""
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            # Hold off collecting while every batch slot is busy so that
+            # requests keep accumulating into the next (larger) batch
+            await self._slots.acquire()
+            batch = await self._collect_batch()
+            self._collecting = []
+            task = self._loop.create_task(self._dispatch(batch))
+            task.add_done_callback(lambda _: self._slots.release())
+    
+    def _take_first(self) -> PendingRequest:
+        """Remove the oldest pending request of the most urgent priority class"""
+        rank = min(priority_rank(item[5]) for item in self._pending)
+        for i, item in enumerate(self._pending):
+            if priority_rank(item[5]) == rank:
+                del self._pending[i]
+                return item
+    
+    def _take_matching(self, key: Any, priority: str, limit: int) -> List[PendingRequest]:
+        """Remove up to limit pending requests matching key and priority, keeping the others in order"""
+        if all(item[3] is key and item[5] == priority for item in self._pending):
+            return [self._pending.popleft() for _ in range(min(limit, len(self._pending)))]
+        
+        taken, kept = [], deque()
+        for item in self._pending:
+            if len(taken) < limit and item[3] is key and item[5] == priority:
+                taken.append(item)
+            else:
+                kept.append(item)
+        self._pending = kept
+        return taken
+    
+    async def _collect_batch(self) -> List[PendingRequest]:
+        """Take up to max_batch_size requests, waiting at most max_wait_ms for stragglers"""
+        batch = self._collecting = [self._take_first()]
+        key, priority = batch[0][3], batch[0][5]
+        deadline = self._loop.time() + self.max_wait_ms / 1000.0
+        
+        while len(batch) < self.max_batch_size:
+            taken = self._take_matching(key, priority, self.max_batch_size - len(batch))
+            if taken:
+                batch.extend(taken)
+                continue
+            
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+        
+        return batch
+    
+    async def _dispatch(self, batch: List[PendingRequest]) -> None:
+        """Run one batched forward pass and fan results back out to the callers"""
+        dispatched_at = time.perf_counter()
+        key, priority = batch[0][3], batch[0][5]
+        live = []
+        for image, future, _, _, deadline, _ in batch:
+            if future.done():
+                # Cancelled, e.g. because the client disconnected
+                continue
+            if expired(deadline):
+                self._requests_expired += 1
+                record_timeout("batch_wait")
+                future.set_exception(DeadlineExceeded("batch_wait"))
+                continue
+            live.append((image, future))
+        if not live:
+            return
+        
+        for _, _, enqueued_at, _, _, _ in batch:
+            BATCH_QUEUE_SECONDS.observe(dispatched_at - enqueued_at)
+        BATCH_SIZE.observe(len(live))
+        
+        try:
+            images = [image for image, _ in live]
+            with request_priority(priority):
+                results = self.predict_batch_fn(images) if key is None else self.predict_batch_fn(images, key)
+                if inspect.isawaitable(results):
+                    results = await results
+            if len(results) != len(live):
+                raise RuntimeError(f"Expected {len(live)} results, got {len(results)}")
+        except Exception as e:
+            logger.error(f"Batched inference failed for {len(live)} requests: {str(e)}")
+            for _, future in live:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        self._batches_run += 1
+        self._requests_processed += len(live)
+        self._max_batch_seen = max(self._max_batch_seen, len(live))
+        
+        for (_, future), result in zip(live, results):
+            if not future.done():
+                future.set_result(result)
+    
+    @property
+    def queue_depth(self) -> int:
+        """Requests waiting for a batch"""
+        return len(self._pending)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get scheduler configuration and counters"""
+        average_batch_size = (
+            self._requests_processed / self._batches_run if self._batches_run else 0.0
+        )
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "max_queue_depth": self.max_queue_depth,
+            "max_inflight_batches": self.max_inflight_batches,
+            "queue_depth": self.queue_depth,
+            "batches_run": self._batches_run,
+            "requests_processed": self._requests_processed,
+            "requests_rejected": self._requests_rejected,
+            "requests_expired": self._requests_expired,
+            "average_batch_size": round(average_batch_size, 2),
+            "max_batch_size_seen": self._max_batch_seen
+        }
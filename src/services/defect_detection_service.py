@@ -1,73 +1,269 @@
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+import os
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from fastapi import HTTPException, UploadFile
 
+from ..models.model_registry import ModelEntry, ModelRegistry, model_size
 from ..models.yolo_model import YOLOModel
+from ..utils.buffer_pool import BufferPool
+from ..utils.deadline import DeadlineExceeded, get_deadline_stats, request_deadline, within_deadline
 from ..utils.image_processor import ImageProcessor
+from ..utils.metrics import (
+    BATCH_QUEUE_DEPTH, BUFFER_POOL_BYTES, CACHE_BYTES, CACHE_ENTRIES, REGISTRY, process_memory, time_stage
+)
+from ..utils.tracing import record_stage
+from ..utils.uploads import read_upload, release_upload
 from ..utils.response_formatter import ResponseFormatter
+from .admission import PRIORITY_BATCH, PRIORITY_INTERACTIVE, AdmissionController, request_priority
+from .batch_scheduler import MicroBatchScheduler
+from .executor import StageExecutor
+from .result_cache import ResultCache
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Per-process models used when the inference stage runs on a process pool,
+# keyed by registry name and version, least recently used first, with their sizes
+_worker_models: "OrderedDict[Tuple[str, str], Tuple[YOLOModel, int]]" = OrderedDict()
+
+def _init_metrics_worker(metrics_config: Dict[str, Any]) -> None:
+    """Publish a pool worker process's stage metrics for multi-process aggregation"""
+    if metrics_config["enabled"]:
+        REGISTRY.start(metrics_config["multiprocess_dir"], metrics_config["flush_seconds"])
+
+def _worker_model(model_config: Dict[str, Any]) -> YOLOModel:
+    """Load a model version in this worker process, within the same per-process limits as the registry"""
+    key = (model_config.get("model"), model_config.get("version"))
+    if key not in _worker_models:
+        size = model_size(model_config)
+        budget = Config.MODEL_MEMORY_BUDGET_MB * 1024 * 1024
+        while _worker_models and (
+                len(_worker_models) >= Config.MODEL_MAX_RESIDENT
+                or sum(used for _, used in _worker_models.values()) + size > budget):
+            _, (evicted, _) = _worker_models.popitem(last=False)
+            evicted.model.close()
+        _worker_models[key] = (YOLOModel(model_config), size)
+    _worker_models.move_to_end(key)
+    return _worker_models[key][0]
+
+def _init_inference_worker(model_config: Dict[str, Any], metrics_config: Dict[str, Any]) -> None:
+    """Load the default model once in each inference worker process"""
+    _init_metrics_worker(metrics_config)
+    _worker_model(model_config)
+
+def _predict_batch_in_worker(image_arrays: List, model_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Run a batched forward pass on the worker process's copy of a model version"""
+    return _worker_model(model_config).predict_batch(image_arrays)
+
+def _decode_image(image_processor: ImageProcessor, image_bytes: bytes, filename: str = None,
+                  full_resolution: bool = False):
+    """Validate and decode uploaded bytes in one pass (runs on the decode pool)
+    
+    Returns (model_input, letterbox). In "reduced" decode mode the image is
+    decoded straight to the letterboxed model input size and letterbox holds
+    the geometry for mapping boxes back; in "full" mode, or when
+    full_resolution is requested for tiling, letterbox is None.
+    """
+    if Config.DECODE_MODE == "reduced" and not full_resolution:
+        return image_processor.decode_for_model(
+            image_bytes, filename, target_size=Config.MODEL_IMAGE_SIZE
+        )
+    return image_processor.decode_image(image_bytes, filename), None
+
 class DefectDetectionService:
     """Main service for PCB defect detection"""
     
     def __init__(self):
-        self.model = None
-        self.image_processor = ImageProcessor(max_size_mb=Config.MAX_FILE_SIZE_MB)
+        pool_config = Config.get_buffer_pool_config()
+        self.buffer_pool = BufferPool(
+            max_bytes=pool_config["max_bytes"],
+            max_buffer_bytes=pool_config["max_buffer_bytes"]
+        )
+        self.image_processor = ImageProcessor(
+            max_size_mb=Config.MAX_FILE_SIZE_MB,
+            max_pixels=Config.MAX_IMAGE_PIXELS,
+            buffer_pool=self.buffer_pool
+        )
         self.response_formatter = ResponseFormatter(
             confidence_threshold=Config.MODEL_CONFIDENCE_THRESHOLD
         )
+        self.models = ModelRegistry(
+            Config.get_model_config(), **Config.get_registry_config(), buffer_pool=self.buffer_pool
+        )
         self._initialize_model()
+        
+        executor_config = Config.get_executor_config()
+        self.executor = StageExecutor(
+            kind=executor_config["kind"],
+            pool_sizes=executor_config["pool_sizes"],
+            initializers={
+                "decode": (_init_metrics_worker, (Config.get_metrics_config(),)),
+                "inference": (_init_inference_worker, (self.model.config, Config.get_metrics_config()))
+            }
+        )
+        
+        batching_config = Config.get_batching_config()
+        self.batch_scheduler = MicroBatchScheduler(
+            self._run_inference_batch,
+            max_batch_size=batching_config["max_batch_size"],
+            max_wait_ms=batching_config["max_wait_ms"],
+            max_queue_depth=batching_config["max_queue_depth"],
+            max_inflight_batches=executor_config["pool_sizes"]["inference"]
+        )
+        
+        self.admission = AdmissionController(**Config.get_admission_config())
+        
+        cache_config = Config.get_cache_config()
+        self.result_cache = ResultCache(
+            max_bytes=cache_config["max_bytes"],
+            ttl_seconds=cache_config["ttl_seconds"]
+        )
+        self._register_metrics()
+    
+    def _register_metrics(self) -> None:
+        """Export this service's queue and cache sizes as scrape-time gauges"""
+        BATCH_QUEUE_DEPTH.set_function(lambda: self.batch_scheduler.queue_depth)
+        CACHE_BYTES.set_function(lambda: self.result_cache.get_stats()["bytes_used"])
+        CACHE_ENTRIES.set_function(lambda: self.result_cache.get_stats()["entries"])
+        BUFFER_POOL_BYTES.labels("in_use").set_function(lambda: self.buffer_pool.get_stats()["in_use_bytes"])
+        BUFFER_POOL_BYTES.labels("pooled").set_function(lambda: self.buffer_pool.get_stats()["pooled_bytes"])
+    
+    @property
+    def model(self) -> Optional[YOLOModel]:
+        """The active version of the default model"""
+        return self.models.default_model
     
     def _initialize_model(self) -> None:
-        """Initialize the YOLOv5 model"""
+        """Load the default model version"""
         try:
-            model_config = Config.get_model_config()
-            self.model = YOLOModel(model_config)
+            self.models.preload_default()
             logger.info("Defect detection service initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize defect detection service: {str(e)}")
             raise RuntimeError(f"Service initialization failed: {str(e)}")
     
+    async def _run_inference_batch(self, image_arrays: List, model: YOLOModel) -> List[Dict[str, Any]]:
+        """Run one batched forward pass of a model version on the inference pool"""
+        if self.executor.kind == "process":
+            return await self.executor.run("inference", _predict_batch_in_worker, image_arrays, model.config)
+        return await self.executor.run("inference", model.predict_batch, image_arrays)
+    
+    def shutdown(self) -> None:
+        """Release worker pools and loaded models"""
+        self.executor.shutdown()
+        self.models.close()
+    
     def is_ready(self) -> bool:
         """Check if service is ready for predictions"""
         return self.model is not None and self.model.is_loaded()
     
-    async def predict_single(self, file: UploadFile) -> Dict[str, Any]:
-        """Predict defects in a single image"""
+    def resolve_tiling(self, tile_size: Optional[int] = None, overlap: Optional[float] = None,
+                       tile_batch_size: Optional[int] = None) -> Dict[str, Any]:
+        """Fill per-request tiling overrides in from the configured defaults"""
+        tiling = Config.get_tiling_config()
+        overrides = {"tile_size": tile_size, "overlap": overlap, "tile_batch_size": tile_batch_size}
+        tiling.update({key: value for key, value in overrides.items() if value is not None})
+        return tiling
+    
+    async def predict_single(self, file: UploadFile, tiling: Optional[Dict[str, Any]] = None,
+                             layout: str = "objects", model_name: Optional[str] = None,
+                             model_version: Optional[str] = None) -> Dict[str, Any]:
+        """Predict defects in a single image, tiled when tiling settings are given
+        
+        model_name selects a registry model (the default model when None) and
+        model_version pins a version (its active version when None).
+        """
+        if not self.is_ready():
+            raise HTTPException(status_code=503, detail="Service not ready")
+        
+        with self.admission.admit(PRIORITY_INTERACTIVE):
+            return await self._predict_single(file, tiling, layout, model_name, model_version)
+    
+    async def _predict_single(self, file: UploadFile, tiling: Optional[Dict[str, Any]], layout: str,
+                              model_name: Optional[str], model_version: Optional[str]) -> Dict[str, Any]:
+        with request_deadline(Config.INFERENCE_TIMEOUT):
+            with time_stage("upload_read"):
+                image_bytes = await self._read_upload(file)
+            try:
+                return await self.predict_image_bytes(
+                    image_bytes, file.filename, tiling, layout, model_name, model_version
+                )
+            finally:
+                release_upload(image_bytes)
+    
+    async def predict_image_bytes(self, image_bytes: bytes, filename: str = None,
+                                  tiling: Optional[Dict[str, Any]] = None,
+                                  layout: str = "objects", model_name: Optional[str] = None,
+                                  model_version: Optional[str] = None) -> Dict[str, Any]:
+        """Predict defects in an image that has already been read into memory"""
         if not self.is_ready():
             raise HTTPException(status_code=503, detail="Service not ready")
         
+        # The whole request runs on the version it started with, even if a
+        # newer version is activated meanwhile
+        with request_deadline(Config.INFERENCE_TIMEOUT):
+            async with self.models.lease(model_name, model_version) as entry:
+                return await self._predict_image_bytes(image_bytes, filename, tiling, layout, entry)
+    
+    async def _predict_image_bytes(self, image_bytes: bytes, filename: Optional[str],
+                                   tiling: Optional[Dict[str, Any]], layout: str,
+                                   entry: ModelEntry) -> Dict[str, Any]:
         try:
-            image_bytes = await file.read()
-            
-            self.image_processor.validate_image(image_bytes, file.filename)
-            image_array = self.image_processor.preprocess_image(image_bytes)
-            image_info = self.image_processor.get_image_info(image_array)
+            cache_key = await self._cache_key(image_bytes, tiling, layout, entry)
+            response = self.result_cache.get(cache_key)
+            if response is not None:
+                logger.info(f"Cached prediction returned for {filename}")
+                return response
             
-            prediction_result = self.model.predict(
-                image_array, 
-                timeout=Config.INFERENCE_TIMEOUT
+            # A stage still running when the deadline passes is abandoned with a 504
+            image_array, letterbox = await within_deadline(
+                self.executor.run(
+                    "decode", _decode_image, self.image_processor, self._for_executor(image_bytes), filename,
+                    tiling is not None
+                ),
+                "decode"
             )
             
-            response = self.response_formatter.format_single_prediction(
-                prediction_result["results"],
-                prediction_result["inference_time"],
-                image_info
-            )
+            if tiling is not None:
+                prediction_result = await within_deadline(
+                    self._predict_tiled(image_array, tiling, entry.model), "inference"
+                )
+            else:
+                submitted = time.perf_counter()
+                prediction_result = await within_deadline(
+                    self.batch_scheduler.submit(image_array, entry.model), "inference"
+                )
+                # The shared batch runs outside this request's context, so
+                # attribute its time to the request's trace here
+                inference_time = prediction_result["inference_time"]
+                record_stage("batch_wait", max(0.0, time.perf_counter() - submitted - inference_time))
+                record_stage("inference", inference_time)
+            
+            response = self._format_prediction(prediction_result, image_array, letterbox, layout)
+            # Only after a completed prediction: a failed or cancelled request
+            # may still have its image in a running batch
+            self.image_processor.release(image_array)
+            self._cache_response(cache_key, response)
             
-            logger.info(f"Prediction completed for {file.filename}: {response['total_defects']} defects found")
+            logger.info(f"Prediction completed for {filename}: {response['total_defects']} defects found")
             return response
             
         except HTTPException:
             raise
+        except DeadlineExceeded as e:
+            logger.warning(f"Prediction for {filename} dropped: {str(e)}")
+            raise self._as_http_error(e)
         except Exception as e:
             logger.error(f"Single prediction failed: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
     
-    async def predict_batch(self, files: List[UploadFile]) -> Dict[str, Any]:
-        """Predict defects in multiple images"""
+    async def predict_batch(self, files: List[UploadFile], tiling: Optional[Dict[str, Any]] = None,
+                            layout: str = "objects", model_name: Optional[str] = None,
+                            model_version: Optional[str] = None) -> Dict[str, Any]:
+        """Predict defects in multiple images, tiled when tiling settings are given"""
         if not self.is_ready():
             raise HTTPException(status_code=503, detail="Service not ready")
         
@@ -77,24 +273,298 @@ class DefectDetectionService:
                 detail=f"Maximum {Config.MAX_BATCH_SIZE} images per batch"
             )
         
-        batch_results = []
+        # Its decode and inference work queues behind that of single images
+        with self.admission.admit(PRIORITY_BATCH, len(files)), request_priority(PRIORITY_BATCH):
+            with request_deadline(Config.INFERENCE_TIMEOUT):
+                async with self.models.lease(model_name, model_version) as entry:
+                    return await self._predict_batch(files, tiling, layout, entry)
+    
+    async def _predict_batch(self, files: List[UploadFile], tiling: Optional[Dict[str, Any]],
+                             layout: str, entry: ModelEntry) -> Dict[str, Any]:
+        # Stage 1: read every upload concurrently (oversized or non-image files fail individually)
+        with time_stage("upload_read"):
+            contents = await asyncio.gather(
+                *(self._read_upload(file) for file in files), return_exceptions=True
+            )
+        try:
+            return await self._predict_contents(files, contents, tiling, layout, entry)
+        finally:
+            for content in contents:
+                release_upload(content)
+    
+    async def _predict_contents(self, files: List[UploadFile], contents: List[Any],
+                                tiling: Optional[Dict[str, Any]], layout: str,
+                                entry: ModelEntry) -> Dict[str, Any]:
+        # Stage 2: answer cache hits and collapse duplicate uploads into one computation
+        keys = await asyncio.gather(
+            *(self._cache_key(content, tiling, layout, entry) for content in contents), return_exceptions=True
+        )
+        outcomes: List[Any] = [None] * len(files)
+        first_index: Dict[str, int] = {}
+        duplicates: List[Tuple[int, int]] = []
+        pending: List[int] = []
         
-        for file in files:
-            try:
-                result = await self.predict_single(file)
-                result["filename"] = file.filename
-                batch_results.append(result)
-                
-            except Exception as e:
-                logger.error(f"Batch prediction failed for {file.filename}: {str(e)}")
+        for i, (content, key) in enumerate(zip(contents, keys)):
+            if isinstance(content, BaseException):
+                outcomes[i] = content
+            elif key in first_index:
+                duplicates.append((i, first_index[key]))
+            else:
+                first_index[key] = i
+                outcomes[i] = self.result_cache.get(key)
+                if outcomes[i] is None:
+                    pending.append(i)
+        
+        # Stage 3: decode the remaining uploads in parallel on the decode pool
+        decoded = await asyncio.gather(
+            *(
+                within_deadline(
+                    self.executor.run(
+                        "decode", _decode_image, self.image_processor, self._for_executor(contents[i]),
+                        files[i].filename, tiling is not None
+                    ),
+                    "decode"
+                )
+                for i in pending
+            ),
+            return_exceptions=True
+        )
+        
+        # Stage 4: batched inference over every successfully decoded image
+        # (tiled images are batched per image, tile_batch_size tiles at a time)
+        ready = [j for j, item in enumerate(decoded) if not isinstance(item, BaseException)]
+        if tiling is not None:
+            predictions = await asyncio.gather(
+                *(
+                    within_deadline(self._predict_tiled(decoded[j][0], tiling, entry.model), "inference")
+                    for j in ready
+                ),
+                return_exceptions=True
+            )
+        else:
+            predictions = await self._predict_arrays([decoded[j][0] for j in ready], entry.model)
+        
+        for j, item in enumerate(decoded):
+            outcomes[pending[j]] = item
+        for j, prediction in zip(ready, predictions):
+            i = pending[j]
+            if isinstance(prediction, BaseException):
+                outcomes[i] = prediction
+                continue
+            image_array, letterbox = decoded[j]
+            outcomes[i] = self._format_prediction(prediction, image_array, letterbox, layout)
+            self.image_processor.release(image_array)
+            self._cache_response(keys[i], outcomes[i])
+        
+        for i, source in duplicates:
+            outcomes[i] = outcomes[source]
+        
+        # Stage 5: assemble per-file results, isolating failures
+        batch_results = []
+        for file, outcome in zip(files, outcomes):
+            if isinstance(outcome, BaseException):
+                error = self._as_http_error(outcome)
+                logger.error(f"Batch prediction failed for {file.filename}: {str(error)}")
                 batch_results.append({
                     "filename": file.filename,
-                    "error": str(e),
+                    "error": str(error),
                     "total_defects": 0
                 })
+                continue
+            
+            result = dict(outcome)
+            result["filename"] = file.filename
+            batch_results.append(result)
         
         return self.response_formatter.format_batch_prediction(batch_results)
     
+    def predict_batch_stream(self, files: List[UploadFile], tiling: Optional[Dict[str, Any]] = None,
+                             layout: str = "objects", model_name: Optional[str] = None,
+                             model_version: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Predict defects in multiple images, yielding each result as soon as it completes
+        
+        Validation happens before the iterator is returned so that errors
+        surface as a normal HTTP error rather than mid-stream. Each result
+        carries "filename" and its upload "index"; the last record is the
+        batch summary.
+        """
+        if not self.is_ready():
+            raise HTTPException(status_code=503, detail="Service not ready")
+        
+        if len(files) > Config.MAX_BATCH_SIZE:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Maximum {Config.MAX_BATCH_SIZE} images per batch"
+            )
+        
+        model_name, model_version = self.models.resolve(model_name, model_version)
+        # Decided before the response starts; the stream counts as in flight once it runs
+        self.admission.check(PRIORITY_BATCH, len(files))
+        return self._stream_batch(files, tiling, layout, model_name, model_version)
+    
+    async def _stream_batch(self, files: List[UploadFile], tiling: Optional[Dict[str, Any]],
+                            layout: str, model_name: str, model_version: str) -> AsyncIterator[Dict[str, Any]]:
+        """Run files concurrently and yield results in completion order"""
+        with request_priority(PRIORITY_BATCH):
+            tasks = [
+                asyncio.ensure_future(self._predict_indexed(index, file, tiling, layout, model_name, model_version))
+                for index, file in enumerate(files)
+            ]
+        successful_predictions = 0
+        total_defects = 0
+        
+        try:
+            with self.admission.track(PRIORITY_BATCH, len(files)):
+                for next_result in asyncio.as_completed(tasks):
+                    result = await next_result
+                    if "error" not in result:
+                        successful_predictions += 1
+                    total_defects += result.get("total_defects", 0)
+                    yield result
+        finally:
+            # The client may disconnect mid-stream; stop outstanding work
+            for task in tasks:
+                task.cancel()
+        
+        yield self.response_formatter.format_batch_summary(
+            len(files), successful_predictions, total_defects
+        )
+    
+    async def _predict_indexed(self, index: int, file: UploadFile, tiling: Optional[Dict[str, Any]],
+                               layout: str, model_name: str, model_version: str) -> Dict[str, Any]:
+        """Predict one file of a streamed batch, converting failures into an error record"""
+        try:
+            result = await self._predict_single(file, tiling, layout, model_name, model_version)
+        except Exception as e:
+            logger.error(f"Batch prediction failed for {file.filename}: {str(e)}")
+            result = {"error": str(e), "total_defects": 0}
+        
+        result["filename"] = file.filename
+        result["index"] = index
+        return result
+    
+    async def _read_upload(self, file: UploadFile):
+        """Read an upload in chunks within the file size limit (a memory map when spooled to disk)"""
+        return await read_upload(
+            file, self.image_processor.max_size_bytes, self.image_processor.allowed_formats
+        )
+    
+    def _for_executor(self, image_bytes):
+        """Memory maps cannot be pickled, so process pools get the upload as bytes"""
+        if self.executor.kind == "process" and not isinstance(image_bytes, bytes):
+            return bytes(image_bytes)
+        return image_bytes
+    
+    async def _cache_key(self, image_bytes: bytes, tiling: Optional[Dict[str, Any]],
+                         layout: str, entry: ModelEntry) -> str:
+        """Content-address an upload for the result cache and batch de-duplication
+        
+        Large uploads are hashed on a worker thread (hashlib releases the GIL)
+        so that the event loop is not blocked.
+        """
+        model_info = entry.model.get_model_info()
+        identity = (
+            entry.name,
+            entry.version,
+            model_info["name"],
+            model_info["backend"],
+            model_info.get("model_path", Config.MODEL_PATH),
+            self.response_formatter.confidence_threshold,
+            Config.DECODE_MODE,
+            Config.MODEL_IMAGE_SIZE,
+            sorted(tiling.items()) if tiling else None,
+            layout
+        )
+        if len(image_bytes) < 1024 * 1024:
+            return ResultCache.make_key(image_bytes, *identity)
+        return await asyncio.to_thread(ResultCache.make_key, image_bytes, *identity)
+    
+    def _cache_response(self, key: str, response: Dict[str, Any]) -> None:
+        """Cache a successfully formatted response"""
+        if "error" not in response:
+            self.result_cache.put(key, response)
+    
+    def _format_prediction(self, prediction_result: Dict[str, Any], image_array,
+                           letterbox: Optional[Dict[str, Any]], layout: str = "objects") -> Dict[str, Any]:
+        """Map boxes back to original image coordinates and format the response"""
+        results = prediction_result["results"]
+        if letterbox is not None and hasattr(results, "xyxy"):
+            detections = results.xyxy[0]
+            detections[:, :4] = self.image_processor.scale_boxes(detections[:, :4], letterbox)
+        
+        response = self.response_formatter.format_single_prediction(
+            results,
+            prediction_result["inference_time"],
+            self.image_processor.get_image_info(image_array, letterbox),
+            layout
+        )
+        if "tiles" in prediction_result:
+            response["tiling"] = prediction_result["tiling"]
+        return response
+    
+    async def _predict_tiled(self, image_array, tiling: Dict[str, Any], model: YOLOModel) -> Dict[str, Any]:
+        """Run tiles of a high-resolution image through batched inference and merge the results"""
+        start_time = time.time()
+        tiles, origins = self.image_processor.tile_image(
+            image_array, tiling["tile_size"], tiling["overlap"]
+        )
+        
+        size = tiling["tile_batch_size"]
+        chunk_results = await asyncio.gather(
+            *(self._run_inference_batch(tiles[i:i + size], model) for i in range(0, len(tiles), size))
+        )
+        tile_predictions = [prediction for chunk in chunk_results for prediction in chunk]
+        
+        height, width = image_array.shape[:2]
+        prediction_result = await asyncio.to_thread(
+            model.merge_tiles,
+            tile_predictions,
+            origins,
+            (width, height),
+            tiling["merge_iou"],
+            time.time() - start_time
+        )
+        prediction_result["tiling"] = {
+            "tile_size": tiling["tile_size"],
+            "overlap": tiling["overlap"],
+            "tile_batch_size": size,
+            "tiles": prediction_result["tiles"]
+        }
+        return prediction_result
+    
+    async def _predict_arrays(self, image_arrays: List, model: YOLOModel) -> List[Any]:
+        """Run batched inference in chunks of the micro-batch size
+        
+        Returns one prediction result per image, or the exception raised
+        by the chunk the image belonged to.
+        """
+        chunk_size = self.batch_scheduler.max_batch_size
+        chunks = [
+            image_arrays[i:i + chunk_size]
+            for i in range(0, len(image_arrays), chunk_size)
+        ]
+        chunk_results = await asyncio.gather(
+            *(within_deadline(self._run_inference_batch(chunk, model), "inference") for chunk in chunks),
+            return_exceptions=True
+        )
+        
+        outcomes = []
+        for chunk, results in zip(chunks, chunk_results):
+            if isinstance(results, BaseException):
+                outcomes.extend([results] * len(chunk))
+                continue
+            outcomes.extend(results)
+        return outcomes
+    
+    @staticmethod
+    def _as_http_error(error: BaseException) -> HTTPException:
+        """Map a pipeline failure to the HTTPException predict_single would raise"""
+        if isinstance(error, HTTPException):
+            return error
+        if isinstance(error, DeadlineExceeded):
+            return HTTPException(status_code=504, detail=str(error))
+        return HTTPException(status_code=500, detail=f"Prediction failed: {str(error)}")
+    
     def get_service_info(self) -> Dict[str, Any]:
         """Get service information and status"""
         model_info = self.model.get_model_info() if self.model else {}
@@ -106,5 +576,13 @@ class DefectDetectionService:
                 "max_batch_size": Config.MAX_BATCH_SIZE,
                 "max_file_size_mb": Config.MAX_FILE_SIZE_MB,
                 "confidence_threshold": Config.MODEL_CONFIDENCE_THRESHOLD
-            }
+            },
+            "batching": self.batch_scheduler.get_stats(),
+            "executor": self.executor.get_stats(),
+            "result_cache": self.result_cache.get_stats(),
+            "buffer_pool": self.buffer_pool.get_stats(),
+            "admission": self.admission.get_stats(),
+            "deadlines": {"timeout_seconds": Config.INFERENCE_TIMEOUT, **get_deadline_stats()},
+            "models": self.models.get_stats(),
+            "process": {"pid": os.getpid(), **process_memory()}
         }
@@ -0,0 +1,231 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from ..utils.deadline import DeadlineExceeded, check_deadline, current_deadline, expired, record_timeout
+from ..utils.metrics import EXECUTOR_FAILURES, EXECUTOR_IN_FLIGHT, EXECUTOR_SECONDS
+from .admission import current_priority, priority_rank
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_KINDS = ("thread", "process")
+
+class _RemoteHTTPError(Exception):
+    """Picklable carrier for an HTTPException raised inside a worker process"""
+    
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def _call_before_deadline(deadline: Optional[float], stage: str, fn: Callable, *args) -> Any:
+    """Run fn unless the request's deadline passed while the work was queued for a worker"""
+    if expired(deadline):
+        raise DeadlineExceeded(stage)
+    return fn(*args)
+
+def _call_in_worker(deadline: Optional[float], stage: str, fn: Callable, *args) -> Any:
+    """Run fn in a worker process, converting HTTPException into a picklable error"""
+    try:
+        return _call_before_deadline(deadline, stage, fn, *args)
+    except HTTPException as e:
+        raise _RemoteHTTPError(e.status_code, e.detail)
+
+def _release_from_worker(loop: asyncio.AbstractEventLoop, gate: "_PriorityGate", _work) -> None:
+    """Free a slot from the worker thread that finished abandoned work"""
+    try:
+        loop.call_soon_threadsafe(gate.release)
+    except RuntimeError:
+        pass  # The loop is closed, and the gate with it
+
+class _PriorityGate:
+    """Let at most capacity holders through at once, waking waiters by priority, then arrival"""
+    
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._holders = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._arrivals = itertools.count()
+    
+    @property
+    def waiting(self) -> int:
+        """Callers queued for a slot"""
+        return sum(1 for _, _, future in self._waiters if not future.done())
+    
+    async def acquire(self, rank: int) -> None:
+        """Wait for a slot; lower ranks are let through first"""
+        if self._holders < self.capacity and not self._waiters:
+            self._holders += 1
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (rank, next(self._arrivals), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Handed a slot just as the caller was cancelled; pass it on
+                self.release()
+            raise
+    
+    def release(self) -> None:
+        """Hand the slot to the most urgent waiter, or free it"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._holders -= 1
+
+class StageExecutor:
+    """Run CPU-bound pipeline stages on bounded thread or process pools
+    
+    Each pool is handed at most one call per worker; further calls wait on
+    the event loop and are started in priority order (the calling request's
+    priority class, see admission.request_priority), then in arrival order,
+    so single images are never queued behind batch work already waiting.
+    """
+    
+    def __init__(
+        self,
+        kind: str = "thread",
+        pool_sizes: Optional[Dict[str, int]] = None,
+        initializers: Optional[Dict[str, Tuple[Callable, tuple]]] = None
+    ):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind '{kind}', expected one of {EXECUTOR_KINDS}")
+        
+        self.kind = kind
+        self.pool_sizes = dict(pool_sizes or {"decode": 1, "inference": 1})
+        self._initializers = initializers or {}
+        
+        self._pools: Dict[str, Executor] = {}
+        self._gates: Dict[str, _PriorityGate] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        self._in_flight = {stage: 0 for stage in self.pool_sizes}
+        self._completed = {stage: 0 for stage in self.pool_sizes}
+        self._failed = {stage: 0 for stage in self.pool_sizes}
+    
+    def _get_pool(self, stage: str) -> Executor:
+        """Create the worker pool for a stage on first use"""
+        pool = self._pools.get(stage)
+        if pool is not None:
+            return pool
+        
+        if stage not in self.pool_sizes:
+            raise ValueError(f"Unknown pipeline stage '{stage}'")
+        
+        workers = self.pool_sizes[stage]
+        if self.kind == "process":
+            initializer, initargs = self._initializers.get(stage, (None, ()))
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{stage}-worker")
+        
+        self._pools[stage] = pool
+        logger.info(f"Started {self.kind} pool for '{stage}' stage with {workers} workers")
+        return pool
+    
+    def _get_gate(self, stage: str) -> _PriorityGate:
+        """Get the worker slots of a stage on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._gates = {}
+        
+        gate = self._gates.get(stage)
+        if gate is None:
+            gate = self._gates[stage] = _PriorityGate(self.pool_sizes[stage])
+        return gate
+    
+    async def run(self, stage: str, fn: Callable, *args) -> Any:
+        """Run fn(*args) on the stage's pool without blocking the event loop
+        
+        Work submitted within a request deadline is dropped with
+        DeadlineExceeded if the deadline passes before a worker picks it up.
+        """
+        pool = self._get_pool(stage)
+        gate = self._get_gate(stage)
+        deadline = current_deadline()
+        
+        if self.kind == "process":
+            call = functools.partial(_call_in_worker, deadline, stage, fn, *args)
+        else:
+            # Carry the caller's context (request trace) onto the worker thread
+            call = functools.partial(
+                contextvars.copy_context().run, _call_before_deadline, deadline, stage, fn, *args
+            )
+        
+        start = time.perf_counter()
+        await gate.acquire(priority_rank(current_priority()))
+        release = gate.release
+        try:
+            check_deadline(stage, deadline)
+            self._in_flight[stage] += 1
+            EXECUTOR_IN_FLIGHT.labels(stage).inc()
+            work = pool.submit(call)
+            try:
+                result = await asyncio.wrap_future(work)
+            except asyncio.CancelledError:
+                if not work.cancel() and not work.done():
+                    # Already running: the worker stays busy, so keep its slot until it is free
+                    release = None
+                    work.add_done_callback(functools.partial(_release_from_worker, self._loop, gate))
+                self._failed[stage] += 1
+                EXECUTOR_FAILURES.labels(stage).inc()
+                raise
+            except _RemoteHTTPError as e:
+                self._failed[stage] += 1
+                EXECUTOR_FAILURES.labels(stage).inc()
+                raise HTTPException(status_code=e.status_code, detail=e.detail)
+            except DeadlineExceeded as e:
+                self._failed[stage] += 1
+                EXECUTOR_FAILURES.labels(stage).inc()
+                record_timeout(e.stage)
+                raise
+            except BaseException:
+                self._failed[stage] += 1
+                EXECUTOR_FAILURES.labels(stage).inc()
+                raise
+            finally:
+                self._in_flight[stage] -= 1
+                EXECUTOR_IN_FLIGHT.labels(stage).dec()
+        finally:
+            if release is not None:
+                release()
+        
+        self._completed[stage] += 1
+        EXECUTOR_SECONDS.labels(stage).observe(time.perf_counter() - start)
+        return result
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down all worker pools"""
+        for stage, pool in self._pools.items():
+            pool.shutdown(wait=wait)
+            logger.info(f"Stopped {self.kind} pool for '{stage}' stage")
+        self._pools = {}
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool sizing and per-stage counters"""
+        return {
+            "kind": self.kind,
+            "stages": {
+                stage: {
+                    "pool_size": size,
+                    "in_flight": self._in_flight[stage],
+                    "waiting": self._gates[stage].waiting if stage in self._gates else 0,
+                    "completed": self._completed[stage],
+                    "failed": self._failed[stage]
+                }
+                for stage, size in self.pool_sizes.items()
+            }
+        }
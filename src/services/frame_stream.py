@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from typing import Any, Dict, Set
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect, status
+
+from .admission import PRIORITY_INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+class FrameStream:
+    """Credit-based flow control for a WebSocket stream of image frames
+    
+    The server grants credits and each binary frame consumes one. A credit is
+    returned only after that frame's result has been sent, so at most
+    `credits` frames are ever buffered per connection. A client that sends a
+    frame without credit is disconnected with a policy violation.
+    """
+    
+    def __init__(self, service, websocket: WebSocket, credits: int = 4):
+        self.service = service
+        self.websocket = websocket
+        self.credits = credits
+        
+        self._available = 0
+        self._next_frame = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._send_lock = asyncio.Lock()
+    
+    async def run(self) -> None:
+        """Receive frames until the client disconnects"""
+        await self._grant(self.credits)
+        
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                
+                frame = message.get("bytes")
+                if frame is None:
+                    await self._send({
+                        "type": "error",
+                        **self.service.response_formatter.format_error_response(
+                            "Frames must be sent as binary messages", 400
+                        )
+                    })
+                    continue
+                
+                if self._available <= 0:
+                    logger.warning("Stream client exceeded its credits, closing connection")
+                    await self.websocket.close(
+                        code=status.WS_1008_POLICY_VIOLATION, reason="Frame sent without credit"
+                    )
+                    break
+                
+                self._available -= 1
+                task = asyncio.create_task(self._process(self._next_frame, frame))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                self._next_frame += 1
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    async def _process(self, frame: int, image_bytes: bytes) -> None:
+        """Predict one frame, send its result and return the credit"""
+        try:
+            with self.service.admission.admit(PRIORITY_INTERACTIVE):
+                prediction = await self.service.predict_image_bytes(image_bytes, f"frame-{frame}")
+            message = {"type": "result", "frame": frame, **prediction}
+        except HTTPException as e:
+            message = {
+                "type": "error",
+                "frame": frame,
+                **self.service.response_formatter.format_error_response(str(e.detail), e.status_code)
+            }
+        
+        try:
+            await self._send(message)
+            await self._grant(1)
+        except (WebSocketDisconnect, RuntimeError):
+            # Client went away while the frame was in flight
+            pass
+    
+    async def _grant(self, credits: int) -> None:
+        """Give the client more credits"""
+        self._available += credits
+        await self._send({"type": "credit", "credits": credits})
+    
+    async def _send(self, message: Dict[str, Any]) -> None:
+        """Send one JSON message, serialising concurrent senders"""
+        async with self._send_lock:
+            await self.websocket.send_json(message)
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+
+from ..utils.metrics import pid_alive
+from .admission import PRIORITY_BATCH, request_priority
+from .job_store import JobStore, WorkItem
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Image too large. Maximum size: {max_bytes // (1024 * 1024)}MB"
+    )
+
+class JobManager:
+    """In-process work queue and worker pool for large asynchronous inspection runs"""
+    
+    def __init__(
+        self,
+        service,
+        store: JobStore,
+        storage_path: str,
+        directory_root: str,
+        workers: int = 8,
+        max_images: int = 10000,
+        max_file_bytes: int = 1024 * 1024
+    ):
+        self.service = service
+        self.store = store
+        self.storage_path = storage_path
+        self.directory_root = Path(directory_root).resolve()
+        self.workers = workers
+        self.max_images = max_images
+        self.max_file_bytes = max_file_bytes
+        
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._reclaimed = 0
+    
+    async def start(self) -> None:
+        """Start the worker pool, taking over items left unfinished by a previous run"""
+        self._queue = asyncio.Queue()
+        await self._reclaim(include_own=True)
+        
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._heartbeat(), name="job-heartbeat"))
+    
+    async def stop(self) -> None:
+        """Stop the worker pool; unfinished items stay in the store for the next owner"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    async def submit_uploads(self, files: List[UploadFile]) -> Dict[str, Any]:
+        """Persist uploaded images to local storage and queue them as a job"""
+        if not files:
+            raise HTTPException(status_code=400, detail="No images provided")
+        self._check_job_size(len(files))
+        
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.storage_path, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        
+        items = []
+        try:
+            for idx, file in enumerate(files):
+                filename = file.filename or f"image_{idx}"
+                path = os.path.join(job_dir, f"{idx:06d}_{os.path.basename(filename)}")
+                await asyncio.to_thread(self._save_upload, file, path, self.max_file_bytes)
+                items.append((filename, path))
+        except BaseException:
+            await asyncio.to_thread(shutil.rmtree, job_dir, True)
+            raise
+        
+        return await self._create_job(job_id, "upload", items)
+    
+    async def submit_directory(self, directory: str) -> Dict[str, Any]:
+        """Queue every image under a server-local directory as a job"""
+        target = Path(directory).resolve()
+        if target != self.directory_root and self.directory_root not in target.parents:
+            raise HTTPException(
+                status_code=403,
+                detail=f"Directory must be inside {self.directory_root}"
+            )
+        if not target.is_dir():
+            raise HTTPException(status_code=404, detail=f"Directory not found: {directory}")
+        
+        paths = await asyncio.to_thread(self._list_images, target)
+        if not paths:
+            raise HTTPException(status_code=400, detail=f"No images found in {directory}")
+        self._check_job_size(len(paths))
+        
+        items = [(str(path.relative_to(target)), str(path)) for path in paths]
+        return await self._create_job(uuid.uuid4().hex, "directory", items)
+    
+    async def get_job(self, job_id: str, offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+        """Get job progress and a page of results"""
+        job = await asyncio.to_thread(self.store.get_job, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+        
+        results = await asyncio.to_thread(self.store.get_results, job_id, offset, limit)
+        next_offset = offset + len(results)
+        job["results"] = results
+        job["pagination"] = {
+            "offset": offset,
+            "limit": limit,
+            "next_offset": next_offset if next_offset < job["progress"]["total_images"] else None
+        }
+        return job
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get worker pool and queue statistics"""
+        return {
+            "workers": self.workers,
+            "queued_items": self._queue.qsize() if self._queue else 0,
+            "reclaimed_items": self._reclaimed
+        }
+    
+    async def _create_job(self, job_id: str, source: str, items: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """Record the job and put its items on the work queue"""
+        await asyncio.to_thread(self.store.create_job, job_id, source, items)
+        for idx, (filename, path) in enumerate(items):
+            self._queue.put_nowait((job_id, idx, filename, path, source))
+        
+        logger.info(f"Job {job_id} queued with {len(items)} images ({source})")
+        return {"job_id": job_id, "status": "queued", "total_images": len(items)}
+    
+    def _check_file_size(self, path: str) -> None:
+        """Reject images above the per-file size limit before they are read"""
+        if os.path.getsize(path) > self.max_file_bytes:
+            raise _too_large(self.max_file_bytes)
+    
+    def _check_job_size(self, count: int) -> None:
+        """Reject jobs above the configured image limit"""
+        if count > self.max_images:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Maximum {self.max_images} images per job"
+            )
+    
+    async def _reclaim(self, include_own: bool = False) -> None:
+        """Queue unfinished items whose owning process died or stopped renewing its lease"""
+        items: List[WorkItem] = await asyncio.to_thread(self.store.reclaim_items, pid_alive, include_own)
+        for item in items:
+            self._queue.put_nowait(item)
+        if items:
+            self._reclaimed += len(items)
+            logger.info(f"Reclaimed {len(items)} unfinished job items")
+    
+    async def _heartbeat(self) -> None:
+        """Renew the leases on this process's items and take over those of dead processes"""
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.store.renew_leases)
+                await self._reclaim()
+            except Exception as e:
+                logger.error(f"Job lease renewal failed: {str(e)}")
+    
+    async def _worker(self) -> None:
+        """Process queued items until cancelled"""
+        while True:
+            job_id, idx, filename, path, source = await self._queue.get()
+            try:
+                # Skipped when another process reclaimed the item meanwhile
+                if await asyncio.to_thread(self.store.claim_item, job_id, idx):
+                    await self._process_item(job_id, idx, filename, path, source)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job {job_id} item {idx} could not be recorded: {str(e)}")
+            finally:
+                self._queue.task_done()
+    
+    async def _process_item(self, job_id: str, idx: int, filename: str, path: str, source: str) -> None:
+        """Run one image through the service and persist the outcome"""
+        try:
+            await asyncio.to_thread(self._check_file_size, path)
+            image_bytes = await asyncio.to_thread(Path(path).read_bytes)
+            # Job images are served behind interactive requests
+            with request_priority(PRIORITY_BATCH):
+                result = await self.service.predict_image_bytes(image_bytes, filename)
+            status = "done"
+        except HTTPException as e:
+            result = {"error": str(e.detail), "status_code": e.status_code, "total_defects": 0}
+            status = "failed"
+        except Exception as e:
+            result = {"error": str(e), "total_defects": 0}
+            status = "failed"
+        
+        finished = await asyncio.to_thread(self.store.complete_item, job_id, idx, status, result)
+        if finished is None:
+            logger.warning(f"Job {job_id} item {idx} was reclaimed by another worker; result discarded")
+            return
+        
+        if source == "upload":
+            await asyncio.to_thread(self._remove_file, path, finished)
+        if finished:
+            logger.info(f"Job {job_id} completed")
+    
+    @staticmethod
+    def _save_upload(file: UploadFile, path: str, max_bytes: int) -> None:
+        """Copy an upload to disk in chunks, stopping as soon as it passes max_bytes"""
+        file.file.seek(0)
+        written = 0
+        with open(path, "wb") as out:
+            while True:
+                chunk = file.file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise _too_large(max_bytes)
+                out.write(chunk)
+    
+    @staticmethod
+    def _list_images(directory: Path) -> List[Path]:
+        """List image files under a directory in a stable order"""
+        return sorted(
+            path for path in directory.rglob("*")
+            if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS
+        )
+    
+    @staticmethod
+    def _remove_file(path: str, remove_directory: bool = False) -> None:
+        """Delete a stored upload once processed, and its job directory once the job is finished"""
+        if remove_directory:
+            # Other items of the job may still be removing their files concurrently
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+            return
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "completed")
+ITEM_STATUSES = ("pending", "running", "done", "failed")
+
+# (job_id, idx, filename, path, source) of an item to process
+WorkItem = Tuple[str, int, str, str, str]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    source TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    owner INTEGER,
+    lease_until REAL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS job_items_pending ON job_items (status, job_id);
+"""
+
+# Added after the first release; databases created before get them on open
+_ITEM_OWNERSHIP_COLUMNS = (("owner", "INTEGER"), ("lease_until", "REAL"))
+
+class JobStore:
+    """SQLite-backed persistence for inspection jobs and their per-image results
+    
+    Several worker processes may share one database. Each unfinished item
+    is owned by the process that queued or reclaimed it (its pid) under a
+    lease that the owner renews; items whose owner died or stopped renewing
+    are reclaimed by another process, so a crashed worker's items are not
+    left pending.
+    """
+    
+    def __init__(self, db_path: str, lease_seconds: float = 60.0, owner: Optional[int] = None):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.owner = owner if owner is not None else os.getpid()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._conn.commit()
+    
+    def _migrate(self) -> None:
+        """Add columns missing from databases created by earlier versions"""
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(job_items)")}
+        for name, column_type in _ITEM_OWNERSHIP_COLUMNS:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE job_items ADD COLUMN {name} {column_type}")
+    
+    def create_job(self, job_id: str, source: str, items: List[Tuple[str, str]]) -> None:
+        """Insert a job and its (filename, path) items, owned by this store's process"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, source, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, "queued", source, len(items), now, now)
+            )
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, idx, filename, path, status, owner, lease_until) "
+                "VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+                [
+                    (job_id, idx, filename, path, self.owner, now + self.lease_seconds)
+                    for idx, (filename, path) in enumerate(items)
+                ]
+            )
+    
+    def claim_item(self, job_id: str, idx: int) -> bool:
+        """Mark an owned item as running; False when another process has reclaimed it"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE job_items SET status = 'running', lease_until = ? "
+                "WHERE job_id = ? AND idx = ? AND owner = ? AND status IN ('pending', 'running')",
+                (time.time() + self.lease_seconds, job_id, idx, self.owner)
+            )
+        return cursor.rowcount == 1
+    
+    def complete_item(self, job_id: str, idx: int, status: str, result: Dict[str, Any]) -> Optional[bool]:
+        """Record an item's result; returns True when this finished the job
+        
+        Returns None, recording nothing, when the item is no longer owned by
+        this process.
+        """
+        if status not in ITEM_STATUSES:
+            raise ValueError(f"Unknown item status '{status}'")
+        
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE job_items SET status = ?, result = ?, owner = NULL, lease_until = NULL "
+                "WHERE job_id = ? AND idx = ? AND owner = ? AND status IN ('pending', 'running')",
+                (status, json.dumps(result), job_id, idx, self.owner)
+            )
+            if cursor.rowcount == 0:
+                return None
+            remaining = self._conn.execute(
+                "SELECT COUNT(*) FROM job_items WHERE job_id = ? AND status IN ('pending', 'running')",
+                (job_id,)
+            ).fetchone()[0]
+            job_status = "completed" if remaining == 0 else "running"
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+                (job_status, now, job_id)
+            )
+        return remaining == 0
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get job metadata and progress counters"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, source, total, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status",
+                (job_id,)
+            ).fetchall())
+        
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "source": row[2],
+            "created_at": row[4],
+            "updated_at": row[5],
+            "progress": {
+                "total_images": row[3],
+                "completed": counts.get("done", 0),
+                "failed": counts.get("failed", 0),
+                "pending": counts.get("pending", 0) + counts.get("running", 0)
+            }
+        }
+    
+    def get_results(self, job_id: str, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get a page of per-image results in submission order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, filename, status, result FROM job_items WHERE job_id = ? "
+                "ORDER BY idx LIMIT ? OFFSET ?",
+                (job_id, limit, offset)
+            ).fetchall()
+        
+        return [
+            {
+                "index": idx,
+                "filename": filename,
+                "status": status,
+                "result": json.loads(result) if result else None
+            }
+            for idx, filename, status, result in rows
+        ]
+    
+    def renew_leases(self) -> int:
+        """Extend the lease on every unfinished item this process owns; returns how many"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE job_items SET lease_until = ? WHERE owner = ? AND status IN ('pending', 'running')",
+                (time.time() + self.lease_seconds, self.owner)
+            )
+        return cursor.rowcount
+    
+    def reclaim_items(self, alive: Callable[[int], bool], include_own: bool = False) -> List[WorkItem]:
+        """Take over unfinished items whose owner is dead or whose lease expired
+        
+        alive tells whether an owner pid is still running. include_own also
+        takes items recorded under this process's pid, which at startup can
+        only belong to an earlier process that had the same pid. Returns the
+        reclaimed items, now owned by this process and pending again.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            candidates = self._conn.execute(
+                "SELECT i.job_id, i.idx, i.filename, i.path, j.source, i.owner, i.lease_until FROM job_items i "
+                "JOIN jobs j ON j.id = i.job_id WHERE i.status IN ('pending', 'running') "
+                "ORDER BY j.created_at, i.idx"
+            ).fetchall()
+            
+            reclaimed = []
+            for job_id, idx, filename, path, source, owner, lease_until in candidates:
+                if owner == self.owner and not include_own:
+                    continue
+                stale = owner is None or owner == self.owner or (lease_until or 0) < now or not alive(owner)
+                if not stale:
+                    continue
+                # Only if no other process took the item over since it was read
+                cursor = self._conn.execute(
+                    "UPDATE job_items SET status = 'pending', owner = ?, lease_until = ? "
+                    "WHERE job_id = ? AND idx = ? AND owner IS ? AND lease_until IS ? "
+                    "AND status IN ('pending', 'running')",
+                    (self.owner, now + self.lease_seconds, job_id, idx, owner, lease_until)
+                )
+                if cursor.rowcount == 1:
+                    reclaimed.append((job_id, idx, filename, path, source))
+        return reclaimed
+    
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
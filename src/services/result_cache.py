@@ -0,0 +1,120 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from ..utils.metrics import CACHE_EVICTIONS, CACHE_LOOKUPS, timed_stage
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """Content-addressed LRU cache of prediction responses with a byte budget"""
+    
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        
+        # key -> (serialized response, expiry time or None)
+        self._entries: "OrderedDict[str, Tuple[str, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._current_bytes = 0
+        
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether the cache stores anything at all"""
+        return self.max_bytes > 0
+    
+    @staticmethod
+    @timed_stage("hashing")
+    def make_key(image_bytes: bytes, *identity: Any) -> str:
+        """Hash the upload bytes together with the model identity and settings"""
+        digest = hashlib.sha256(image_bytes)
+        digest.update(json.dumps(identity, default=str).encode())
+        return digest.hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a fresh copy of the cached response, or None on a miss"""
+        if not self.enabled:
+            return None
+        
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+                self._remove(key)
+                self._expirations += 1
+                CACHE_LOOKUPS.labels("expired").inc()
+                entry = None
+            
+            if entry is None:
+                self._misses += 1
+                CACHE_LOOKUPS.labels("miss").inc()
+                return None
+            
+            self._entries.move_to_end(key)
+            self._hits += 1
+            CACHE_LOOKUPS.labels("hit").inc()
+            payload = entry[0]
+        
+        response = json.loads(payload)
+        response["timestamp"] = time.time()
+        return response
+    
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        """Store a response, evicting least recently used entries to stay within budget"""
+        if not self.enabled:
+            return
+        
+        payload = json.dumps(response)
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            
+            while self._entries and self._current_bytes + size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+                CACHE_EVICTIONS.inc()
+            
+            self._entries[key] = (payload, expires_at)
+            self._current_bytes += size
+    
+    def _remove(self, key: str) -> None:
+        """Drop an entry (caller holds the lock)"""
+        payload, _ = self._entries.pop(key)
+        self._current_bytes -= len(payload)
+    
+    def clear(self) -> None:
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache size and hit/miss counters"""
+        lookups = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes_used": self._current_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "evictions": self._evictions,
+            "expirations": self._expirations
+        }
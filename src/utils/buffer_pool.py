@@ -0,0 +1,142 @@
+import threading
+import weakref
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .metrics import BUFFER_POOL_LOOKUPS
+
+# Smallest size class; smaller requests share it
+MIN_BUCKET_BYTES = 64 * 1024
+
+def bucket_size(nbytes: int) -> int:
+    """Round a request up to its size class: eight classes per power of two"""
+    if nbytes <= MIN_BUCKET_BYTES:
+        return MIN_BUCKET_BYTES
+    step = (1 << (nbytes - 1).bit_length()) // 8
+    return -(-nbytes // step) * step
+
+class BufferPool:
+    """Size-bucketed pool of reusable byte buffers for image and tensor data
+    
+    acquire returns an array of the requested shape and dtype viewing a
+    pooled buffer; pass it (or any view of it) to release once nothing
+    references it any more. Buffers that are never released are simply
+    garbage collected. Idle buffers are kept up to max_bytes in total, and
+    requests above max_buffer_bytes are allocated without pooling.
+    
+    A pool does not cross process boundaries: an unpickled copy (e.g. in a
+    process pool worker) allocates without pooling.
+    """
+    
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_buffer_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_buffer_bytes = max_buffer_bytes
+        
+        self._free: Dict[int, List[np.ndarray]] = defaultdict(list)
+        # id(buffer) -> finalizer that forgets the lease if the buffer is never released
+        self._leases: Dict[int, weakref.finalize] = {}
+        # Finalizers can run from garbage collection while the lock is held
+        self._lock = threading.RLock()
+        
+        self._pooled_bytes = 0
+        self._in_use_bytes = 0
+        self._peak_in_use_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._unpooled = 0
+        self._dropped = 0
+    
+    def __reduce__(self):
+        return (BufferPool, (0, 0))
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether the pool keeps buffers at all"""
+        return self.max_bytes > 0
+    
+    def acquire(self, shape: Tuple[int, ...], dtype: Any = np.uint8) -> np.ndarray:
+        """Borrow an uninitialised C-contiguous array of the given shape and dtype"""
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        if not self.enabled or nbytes > self.max_buffer_bytes:
+            with self._lock:
+                self._unpooled += 1
+            BUFFER_POOL_LOOKUPS.labels("unpooled").inc()
+            return np.empty(shape, dtype=dtype)
+        
+        size = bucket_size(nbytes)
+        with self._lock:
+            free = self._free.get(size)
+            if free:
+                buffer = free.pop()
+                self._pooled_bytes -= size
+                self._hits += 1
+                result = "hit"
+            else:
+                buffer = None
+                self._misses += 1
+                result = "miss"
+        BUFFER_POOL_LOOKUPS.labels(result).inc()
+        
+        if buffer is None:
+            buffer = np.empty(size, dtype=np.uint8)
+        
+        with self._lock:
+            self._leases[id(buffer)] = weakref.finalize(buffer, self._forget, id(buffer), size)
+            self._in_use_bytes += size
+            self._peak_in_use_bytes = max(self._peak_in_use_bytes, self._in_use_bytes)
+        return buffer[:nbytes].view(dtype).reshape(shape)
+    
+    def release(self, array: Optional[np.ndarray]) -> None:
+        """Return a borrowed array to the pool; arrays the pool did not lend are ignored"""
+        if array is None:
+            return
+        buffer = array
+        while isinstance(buffer.base, np.ndarray):
+            buffer = buffer.base
+        
+        with self._lock:
+            lease = self._leases.pop(id(buffer), None)
+            if lease is None:
+                return
+            lease.detach()
+            size = buffer.nbytes
+            self._in_use_bytes -= size
+            if self._pooled_bytes + size <= self.max_bytes:
+                self._free[size].append(buffer)
+                self._pooled_bytes += size
+    
+    def _forget(self, key: int, size: int) -> None:
+        """Account for a borrowed buffer that was garbage collected instead of released"""
+        with self._lock:
+            if self._leases.pop(key, None) is not None:
+                self._in_use_bytes -= size
+                self._dropped += 1
+    
+    def clear(self) -> None:
+        """Drop every idle buffer"""
+        with self._lock:
+            self._free.clear()
+            self._pooled_bytes = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool usage and hit rate"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "max_bytes": self.max_bytes,
+                "max_buffer_bytes": self.max_buffer_bytes,
+                "pooled_bytes": self._pooled_bytes,
+                "pooled_buffers": sum(len(free) for free in self._free.values()),
+                "in_use_bytes": self._in_use_bytes,
+                "in_use_buffers": len(self._leases),
+                "peak_in_use_bytes": self._peak_in_use_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "unpooled": self._unpooled,
+                "dropped": self._dropped
+            }
@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+import contextvars
+import threading
+import time
+from collections import Counter
+from typing import Any, Awaitable, Dict, Iterator, Optional, TypeVar
+
+from .metrics import DEADLINE_EXCEEDED, REQUESTS_CANCELLED
+
+# Monotonic time by which the current request must be answered
+_current_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+T = TypeVar("T")
+
+_counts_lock = threading.Lock()
+_timeouts: Counter = Counter()
+_cancelled = 0
+
+class DeadlineExceeded(Exception):
+    """A request's deadline passed before or during a pipeline stage (picklable for process pools)"""
+    
+    def __init__(self, stage: str):
+        super().__init__(stage)
+        self.stage = stage
+    
+    def __str__(self) -> str:
+        return f"Request deadline exceeded (dropped at the {self.stage} stage)"
+
+@contextlib.contextmanager
+def request_deadline(seconds: float) -> Iterator[float]:
+    """Give the work in this context `seconds` to finish (an earlier enclosing deadline still applies)"""
+    deadline = time.monotonic() + seconds
+    enclosing = _current_deadline.get()
+    if enclosing is not None:
+        deadline = min(deadline, enclosing)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+def current_deadline() -> Optional[float]:
+    """Deadline of the current request, None outside a request"""
+    return _current_deadline.get()
+
+def expired(deadline: Optional[float]) -> bool:
+    """Whether a deadline (as from current_deadline) has passed"""
+    return deadline is not None and time.monotonic() >= deadline
+
+def record_timeout(stage: str) -> None:
+    """Count a request dropped at a stage because its deadline passed"""
+    DEADLINE_EXCEEDED.labels(stage).inc()
+    with _counts_lock:
+        _timeouts[stage] += 1
+
+def record_cancellation() -> None:
+    """Count a request abandoned because its client disconnected"""
+    global _cancelled
+    REQUESTS_CANCELLED.inc()
+    with _counts_lock:
+        _cancelled += 1
+
+def check_deadline(stage: str, deadline: Optional[float] = None) -> None:
+    """Raise DeadlineExceeded (and count it) if the deadline, by default the current one, has passed"""
+    if expired(deadline if deadline is not None else current_deadline()):
+        record_timeout(stage)
+        raise DeadlineExceeded(stage)
+
+async def within_deadline(work: Awaitable[T], stage: str, deadline: Optional[float] = None) -> T:
+    """Await a stage for no longer than the deadline, by default the current one
+    
+    Raises DeadlineExceeded (and counts it) once the deadline passes, and
+    cancels the awaited work: work still queued is dropped, while a forward
+    pass or decode already running on a worker finishes in the background.
+    """
+    deadline = deadline if deadline is not None else current_deadline()
+    if deadline is None:
+        return await work
+    
+    try:
+        return await asyncio.wait_for(work, max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        record_timeout(stage)
+        raise DeadlineExceeded(stage) from None
+
+def get_deadline_stats() -> Dict[str, Any]:
+    """Requests dropped per stage for passing their deadline, and requests cancelled by disconnects"""
+    with _counts_lock:
+        return {"exceeded": dict(_timeouts), "cancelled": _cancelled}
@@ -0,0 +1,117 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .postprocess import box_iou
+
+# COCO-style IoU thresholds for mAP@0.5:0.95
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+def load_yolo_labels(label_path: str, width: int, height: int) -> np.ndarray:
+    """Read a YOLO label file into an (n, 5) array of class id, x_min, y_min, x_max, y_max in pixels
+    
+    A missing file means the image has no defects.
+    """
+    if not os.path.exists(label_path):
+        return np.zeros((0, 5))
+    rows = np.loadtxt(label_path, ndmin=2)
+    if rows.size == 0:
+        return np.zeros((0, 5))
+    
+    class_id, cx, cy, w, h = rows[:, :5].T
+    return np.stack([
+        class_id,
+        (cx - w / 2) * width,
+        (cy - h / 2) * height,
+        (cx + w / 2) * width,
+        (cy + h / 2) * height
+    ], axis=1)
+
+def match_detections(detections: np.ndarray, labels: np.ndarray,
+                     iou_thresholds: np.ndarray = IOU_THRESHOLDS) -> np.ndarray:
+    """Mark each detection as a true positive at each IoU threshold
+    
+    detections are (n, 6) xyxy, confidence, class id and labels (m, 5) as
+    from load_yolo_labels. Detections are matched greedily in confidence
+    order to an unmatched label of the same class. Returns an (n, t) bool
+    array in the order of detections.
+    """
+    correct = np.zeros((len(detections), len(iou_thresholds)), dtype=bool)
+    if len(detections) == 0 or len(labels) == 0:
+        return correct
+    
+    iou = box_iou(detections[:, :4], labels[:, 1:5])
+    iou[detections[:, 5][:, None] != labels[:, 0][None, :]] = 0.0
+    order = np.argsort(-detections[:, 4], kind="stable")
+    
+    for t, threshold in enumerate(iou_thresholds):
+        matched = np.zeros(len(labels), dtype=bool)
+        for i in order:
+            candidates = np.where((iou[i] >= threshold) & ~matched)[0]
+            if len(candidates):
+                best = candidates[np.argmax(iou[i, candidates])]
+                matched[best] = True
+                correct[i, t] = True
+    return correct
+
+def average_precision(recall: np.ndarray, precision: np.ndarray) -> float:
+    """Mean interpolated precision at 101 recall points (COCO)
+
+    recall must be non-decreasing, as from a confidence-ordered cumulative sum.
+    """
+    # Best precision at this recall or beyond
+    envelope = np.flip(np.maximum.accumulate(np.flip(precision)))
+    index = np.searchsorted(recall, np.linspace(0, 1, 101), side="left")
+    sampled = np.where(index < len(recall), envelope[np.minimum(index, len(recall) - 1)], 0.0)
+    return float(sampled.mean())
+
+def evaluate_detections(detections: Sequence[np.ndarray], labels: Sequence[np.ndarray],
+                        class_names: List[str],
+                        iou_thresholds: np.ndarray = IOU_THRESHOLDS) -> Dict[str, Any]:
+    """Per-class AP@0.5 and AP@0.5:0.95 over a dataset
+    
+    detections and labels hold one array per image (see match_detections).
+    Classes without labels are reported with null AP and left out of the means.
+    """
+    correct, confidence, predicted = [], [], []
+    for found, truth in zip(detections, labels):
+        correct.append(match_detections(found, truth, iou_thresholds))
+        confidence.append(found[:, 4])
+        predicted.append(found[:, 5])
+    correct = np.concatenate(correct) if correct else np.zeros((0, len(iou_thresholds)), dtype=bool)
+    confidence = np.concatenate(confidence) if confidence else np.zeros(0)
+    predicted = np.concatenate(predicted) if predicted else np.zeros(0)
+    label_classes = np.concatenate([truth[:, 0] for truth in labels]) if labels else np.zeros(0)
+    
+    per_class: Dict[str, Dict[str, Optional[float]]] = {}
+    for class_id, name in enumerate(class_names):
+        n_labels = int(np.sum(label_classes == class_id))
+        mask = predicted == class_id
+        if n_labels == 0:
+            per_class[name] = {"labels": 0, "detections": int(mask.sum()), "ap50": None, "ap50_95": None}
+            continue
+        
+        order = np.argsort(-confidence[mask], kind="stable")
+        hits = correct[mask][order]
+        true_positives = np.cumsum(hits, axis=0)
+        false_positives = np.cumsum(~hits, axis=0)
+        recall = true_positives / n_labels
+        precision = true_positives / np.maximum(true_positives + false_positives, 1)
+        
+        ap = np.array([
+            average_precision(recall[:, t], precision[:, t]) for t in range(len(iou_thresholds))
+        ]) if len(hits) else np.zeros(len(iou_thresholds))
+        per_class[name] = {
+            "labels": n_labels,
+            "detections": int(mask.sum()),
+            "ap50": round(float(ap[0]), 4),
+            "ap50_95": round(float(ap.mean()), 4)
+        }
+    
+    scored = [result for result in per_class.values() if result["ap50"] is not None]
+    return {
+        "map50": round(float(np.mean([r["ap50"] for r in scored])), 4) if scored else None,
+        "map50_95": round(float(np.mean([r["ap50_95"] for r in scored])), 4) if scored else None,
+        "per_class": per_class
+    }
@@ -2,20 +2,41 @@ import numpy as np
 from PIL import Image
 import io
 import logging
-from typing import Tuple, Optional
+import mmap
+from typing import Any, Dict, List, Tuple, Optional
 from fastapi import HTTPException
 
+from .buffer_pool import BufferPool
+from .metrics import timed_stage
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_ALLOWED_FORMATS = ("JPEG", "MPO", "PNG", "BMP", "TIFF")
+
+# Padding colour used by YOLOv5 letterboxing
+LETTERBOX_FILL = 114
+
 class ImageProcessor:
     """Image processing utilities with validation and error handling"""
     
-    def __init__(self, max_size_mb: int = 50):
+    def __init__(self, max_size_mb: int = 50, max_pixels: int = 120_000_000,
+                 allowed_formats: Optional[Tuple[str, ...]] = None,
+                 buffer_pool: Optional[BufferPool] = None):
         self.max_size_mb = max_size_mb
         self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.max_pixels = max_pixels
+        self.allowed_formats = tuple(allowed_formats or DEFAULT_ALLOWED_FORMATS)
+        # Decoded pixels are borrowed from the pool when no `out` is given;
+        # hand arrays back with release() once a request is done with them
+        self.buffer_pool = buffer_pool
     
-    def validate_image(self, image_bytes: bytes, filename: str = None) -> None:
-        """Validate image file before processing"""
+    @timed_stage("validation")
+    def open_image(self, image_bytes: bytes, filename: str = None) -> Image.Image:
+        """Check size, format and pixel count using only the image header
+        
+        image_bytes may also be a memory-mapped upload, which is read in
+        place. The returned image has parsed its header but not decoded any pixels.
+        """
         if len(image_bytes) > self.max_size_bytes:
             raise HTTPException(
                 status_code=413, 
@@ -26,53 +47,272 @@ class ImageProcessor:
             raise HTTPException(status_code=400, detail="Empty image file")
         
         try:
-            image = Image.open(io.BytesIO(image_bytes))
-            image.verify()
+            if isinstance(image_bytes, mmap.mmap):
+                image_bytes.seek(0)
+                image = Image.open(image_bytes)
+            else:
+                # BytesIO shares a bytes object's buffer rather than copying it
+                image = Image.open(io.BytesIO(image_bytes))
+        except Image.DecompressionBombError as e:
+            raise HTTPException(status_code=413, detail=f"Image too large: {str(e)}")
         except Exception as e:
             logger.error(f"Invalid image format: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
+        
+        if image.format not in self.allowed_formats:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported image format: {image.format}. Supported: {', '.join(self.allowed_formats)}"
+            )
+        
+        width, height = image.size
+        if width * height > self.max_pixels:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Image too large: {width}x{height} exceeds {self.max_pixels} pixels"
+            )
+        
+        return image
     
-    def preprocess_image(self, image_bytes: bytes) -> np.ndarray:
-        """Preprocess image for YOLOv5 inference"""
+    def decode_image(self, image_bytes: bytes, filename: str = None,
+                     out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Validate and decode an image to an RGB uint8 array in a single pass
+        
+        Pixels are decoded into an (H, W, 4) buffer and an (H, W, 3) view of it
+        is returned. Pass a contiguous uint8 array as `out` to reuse its memory;
+        it is used when it holds at least H * W * 4 bytes.
+        """
+        image = self.open_image(image_bytes, filename)
+        buffer = None
+        
         try:
-            image = Image.open(io.BytesIO(image_bytes))
+            width, height = image.size
+            buffer = self._pixel_buffer(width, height, out)
+            self._decode_into(image, buffer)
+            return buffer[..., :3]
             
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+        except Exception as e:
+            self._release_unless_out(buffer, out)
+            logger.error(f"Image decoding failed: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
+    
+    def decode_for_model(self, image_bytes: bytes, filename: str = None, target_size: int = 640,
+                         out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """Decode an image straight to a letterboxed target_size x target_size model input
+        
+        JPEGs are decoded at the smallest DCT scale (1/2, 1/4, 1/8) that is still
+        at least the letterboxed size, then resized with a bilinear filter.
+        Returns the (target_size, target_size, 3) input and the letterbox
+        geometry needed to map boxes back with scale_boxes.
+        """
+        image = self.open_image(image_bytes, filename)
+        canvas = None
+        
+        try:
+            original_width, original_height = image.size
+            scale = target_size / max(original_width, original_height)
+            new_width = max(1, round(original_width * scale))
+            new_height = max(1, round(original_height * scale))
             
-            image_array = np.array(image)
+            if scale < 1:
+                image.draft('RGB', (new_width, new_height))
             
-            if image_array.size == 0:
-                raise ValueError("Empty image array")
+            source = self._load_rgb(image)
+            canvas, pad_x, pad_y = self._letterbox_into(source, new_width, new_height, target_size, out)
             
-            return image_array
+            letterbox = {
+                "scale": scale,
+                "pad_x": pad_x,
+                "pad_y": pad_y,
+                "original_width": original_width,
+                "original_height": original_height
+            }
+            return canvas[..., :3], letterbox
             
         except Exception as e:
-            logger.error(f"Image preprocessing failed: {str(e)}")
+            self._release_unless_out(canvas, out)
+            logger.error(f"Image decoding failed: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
     
-    def get_image_info(self, image_array: np.ndarray) -> dict:
-        """Get image information"""
+    def letterbox_image(self, image: np.ndarray, target_size: int = 640,
+                        out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """Letterbox an already decoded RGB array to target_size x target_size"""
+        try:
+            original_height, original_width = image.shape[:2]
+            scale = target_size / max(original_width, original_height)
+            new_width = max(1, round(original_width * scale))
+            new_height = max(1, round(original_height * scale))
+            
+            source = Image.fromarray(np.ascontiguousarray(image[..., :3]))
+            canvas, pad_x, pad_y = self._letterbox_into(source, new_width, new_height, target_size, out)
+            
+            letterbox = {
+                "scale": scale,
+                "pad_x": pad_x,
+                "pad_y": pad_y,
+                "original_width": original_width,
+                "original_height": original_height
+            }
+            return canvas[..., :3], letterbox
+            
+        except Exception as e:
+            logger.error(f"Image letterbox failed: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Image letterbox failed: {str(e)}")
+    
+    @timed_stage("letterbox")
+    def _letterbox_into(self, source: Image.Image, new_width: int, new_height: int,
+                        target_size: int, out: Optional[np.ndarray]) -> Tuple[np.ndarray, int, int]:
+        """Resize source and paste it centred on a padded (target, target, 4) canvas"""
+        if source.size != (new_width, new_height):
+            source = source.resize((new_width, new_height), Image.Resampling.BILINEAR)
+        
+        canvas = self._pixel_buffer(target_size, target_size, out)
+        canvas[...] = LETTERBOX_FILL
+        pad_x = (target_size - new_width) // 2
+        pad_y = (target_size - new_height) // 2
+        
+        canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width, :3] = np.asarray(source)
+        return canvas, pad_x, pad_y
+    
+    @staticmethod
+    @timed_stage("tiling")
+    def tile_image(image: np.ndarray, tile_size: int = 640,
+                   overlap: float = 0.2) -> Tuple[List[np.ndarray], np.ndarray]:
+        """Split an image into overlapping tile_size x tile_size tiles
+        
+        Returns (tiles, origins) where origins holds each tile's (x, y) offset.
+        Tiles are views into the image except at edges narrower than a tile,
+        which are padded with the letterbox fill.
+        """
+        if not 0 <= overlap < 1:
+            raise ValueError("Tile overlap must be in [0, 1)")
+        
+        height, width = image.shape[:2]
+        stride = max(1, int(tile_size * (1 - overlap)))
+        
+        def starts(length: int) -> List[int]:
+            if length <= tile_size:
+                return [0]
+            return list(range(0, length - tile_size, stride)) + [length - tile_size]
+        
+        tiles, origins = [], []
+        for y in starts(height):
+            for x in starts(width):
+                tile = image[y:y + tile_size, x:x + tile_size]
+                if tile.shape[0] < tile_size or tile.shape[1] < tile_size:
+                    padded = np.full((tile_size, tile_size) + image.shape[2:], LETTERBOX_FILL, dtype=image.dtype)
+                    padded[:tile.shape[0], :tile.shape[1]] = tile
+                    tile = padded
+                tiles.append(tile)
+                origins.append((x, y))
+        
+        return tiles, np.array(origins, dtype=np.int64)
+    
+    @staticmethod
+    def scale_boxes(boxes: np.ndarray, letterbox: Dict[str, Any]) -> np.ndarray:
+        """Map xyxy boxes from letterboxed model input back to original image coordinates"""
+        boxes = np.array(boxes, dtype=np.float32, copy=True).reshape(-1, 4)
+        boxes[:, [0, 2]] -= letterbox["pad_x"]
+        boxes[:, [1, 3]] -= letterbox["pad_y"]
+        boxes /= letterbox["scale"]
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, letterbox["original_width"])
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, letterbox["original_height"])
+        return boxes
+    
+    def _pixel_buffer(self, width: int, height: int, out: Optional[np.ndarray]) -> np.ndarray:
+        """Get an (H, W, 4) uint8 buffer, reusing `out` when it is large enough
+        
+        Without a usable `out` the buffer is borrowed from the buffer pool, if any.
+        """
+        required = width * height * 4
+        if (out is not None and out.dtype == np.uint8
+                and out.flags.c_contiguous and out.size >= required):
+            return out.reshape(-1)[:required].reshape(height, width, 4)
+        if self.buffer_pool is not None:
+            return self.buffer_pool.acquire((height, width, 4))
+        return np.empty((height, width, 4), dtype=np.uint8)
+    
+    def release(self, array: Optional[np.ndarray]) -> None:
+        """Return an array decoded by this processor to the buffer pool"""
+        if self.buffer_pool is not None:
+            self.buffer_pool.release(array)
+    
+    def _release_unless_out(self, array: Optional[np.ndarray], out: Optional[np.ndarray]) -> None:
+        """Release a buffer after a failure unless it is the caller's `out`"""
+        if array is not None and (out is None or not np.may_share_memory(array, out)):
+            self.release(array)
+    
+    @staticmethod
+    @timed_stage("decode")
+    def _load_rgb(image: Image.Image) -> Image.Image:
+        """Decode image pixels, converting other modes to RGB"""
+        image.load()
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return image
+    
+    @staticmethod
+    @timed_stage("decode")
+    def _decode_into(image: Image.Image, buffer: np.ndarray) -> None:
+        """Decode image pixels into a (H, W, 4) buffer
+        
+        RGB images are decoded in place: Pillow stores RGB pixels with 4 bytes
+        each, so the buffer is mapped as the decoder's target image. That relies
+        on Pillow internals, so Pillow is pinned in requirements.txt and a test
+        fails if the in-place path stops being taken. Other modes (or a Pillow
+        that reallocates the target) are converted and copied into the buffer.
+        """
+        if image.mode == 'RGB':
+            target = Image.core.map_buffer(buffer, image.size, 'raw', 0, ('RGB', 0, 1))
+            image.im = target
+            image.load()
+            if image.im is target:
+                return
+        
+        image.load()
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        buffer[..., :3] = np.asarray(image)
+    
+    def validate_image(self, image_bytes: bytes, filename: str = None) -> None:
+        """Validate image file before processing"""
+        image = self.open_image(image_bytes, filename)
+        
+        try:
+            image.verify()
+        except Exception as e:
+            logger.error(f"Invalid image format: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
+    
+    def preprocess_image(self, image_bytes: bytes, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Preprocess image for YOLOv5 inference"""
+        return self.decode_image(image_bytes, out=out)
+    
+    def get_image_info(self, image_array: np.ndarray, letterbox: Optional[Dict[str, Any]] = None) -> dict:
+        """Get image information (original dimensions when the array is letterboxed)"""
         return {
-            "width": image_array.shape[1],
-            "height": image_array.shape[0],
+            "width": letterbox["original_width"] if letterbox else image_array.shape[1],
+            "height": letterbox["original_height"] if letterbox else image_array.shape[0],
             "channels": image_array.shape[2] if len(image_array.shape) > 2 else 1,
             "dtype": str(image_array.dtype)
         }
     
-    def resize_image(self, image: np.ndarray, size: Tuple[int, int] = (640, 640)) -> np.ndarray:
+    def resize_image(self, image: np.ndarray, size: Tuple[int, int] = (640, 640),
+                     resample: int = Image.Resampling.BILINEAR) -> np.ndarray:
         """Resize image to specified dimensions"""
         try:
             pil_image = Image.fromarray(image)
-            resized = pil_image.resize(size, Image.Resampling.LANCZOS)
+            resized = pil_image.resize(size, resample)
             return np.array(resized)
         except Exception as e:
             logger.error(f"Image resize failed: {str(e)}")
             raise HTTPException(status_code=400, detail=f"Image resize failed: {str(e)}")
     
-    def normalize_image(self, image: np.ndarray) -> np.ndarray:
-        """Normalize image pixel values to 0-1 range"""
+    def normalize_image(self, image: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Normalize image pixel values to 0-1 range (written into `out` when given)"""
         try:
+            if out is not None:
+                return np.multiply(image, np.float32(1 / 255.0), out=out, casting="unsafe")
             return image.astype(np.float32) / 255.0
         except Exception as e:
             logger.error(f"Image normalization failed: {str(e)}")
@@ -0,0 +1,537 @@
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .tracing import record_stage
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+class _Shards:
+    """Per-thread value slots, so updates never take a lock
+    
+    Each thread increments its own list; readers sum across all slots.
+    Slots of finished threads are kept so totals never go backwards.
+    """
+    
+    __slots__ = ("size", "_local", "_slots")
+    
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._slots: List[List[float]] = []
+    
+    def slot(self) -> List[float]:
+        """Get the calling thread's slot"""
+        try:
+            return self._local.slot
+        except AttributeError:
+            slot = [0.0] * self.size
+            self._local.slot = slot
+            self._slots.append(slot)
+            return slot
+    
+    def totals(self) -> List[float]:
+        """Sum every thread's slot"""
+        totals = [0.0] * self.size
+        for slot in list(self._slots):
+            for i, value in enumerate(slot):
+                totals[i] += value
+        return totals
+
+class _CounterChild:
+    """A monotonically increasing value"""
+    
+    __slots__ = ("_shards",)
+    
+    def __init__(self):
+        self._shards = _Shards(1)
+    
+    def inc(self, amount: float = 1.0) -> None:
+        """Add amount (must not be negative)"""
+        self._shards.slot()[0] += amount
+    
+    def samples(self) -> Iterator[Tuple[str, Tuple, float]]:
+        yield "", (), self._shards.totals()[0]
+
+class _GaugeChild:
+    """A value that goes up and down, or is sampled from a callback at scrape time"""
+    
+    __slots__ = ("_shards", "_value", "_function")
+    
+    def __init__(self):
+        self._shards = _Shards(1)
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+    
+    def inc(self, amount: float = 1.0) -> None:
+        self._shards.slot()[0] += amount
+    
+    def dec(self, amount: float = 1.0) -> None:
+        self._shards.slot()[0] -= amount
+    
+    def set(self, value: float) -> None:
+        """Set the value (use either set or inc/dec on a gauge, not both)"""
+        self._value = value
+    
+    def set_function(self, function: Optional[Callable[[], float]]) -> None:
+        """Sample the value from function whenever metrics are collected"""
+        self._function = function
+    
+    def samples(self) -> Iterator[Tuple[str, Tuple, float]]:
+        if self._function is not None:
+            try:
+                value = float(self._function())
+            except Exception as e:
+                logger.warning(f"Gauge callback failed: {str(e)}")
+                value = math.nan
+        else:
+            value = self._value + self._shards.totals()[0]
+        yield "", (), value
+
+class _Timer:
+    """Context manager observing elapsed wall time into a histogram
+    
+    With a stage name the time is also added to the current request trace.
+    """
+    
+    __slots__ = ("_histogram", "_stage", "_start")
+    
+    def __init__(self, histogram: "_HistogramChild", stage: Optional[str] = None):
+        self._histogram = histogram
+        self._stage = stage
+    
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        elapsed = time.perf_counter() - self._start
+        self._histogram.observe(elapsed)
+        if self._stage is not None:
+            record_stage(self._stage, elapsed)
+
+class _HistogramChild:
+    """Fixed-bucket histogram (slot layout: one count per bucket, +Inf, then the sum)"""
+    
+    __slots__ = ("bounds", "_shards")
+    
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self._shards = _Shards(len(bounds) + 2)
+    
+    def observe(self, value: float) -> None:
+        slot = self._shards.slot()
+        slot[bisect_left(self.bounds, value)] += 1
+        slot[-1] += value
+    
+    def time(self) -> _Timer:
+        """Time a block: `with histogram.time(): ...`"""
+        return _Timer(self)
+    
+    def samples(self) -> Iterator[Tuple[str, Tuple, float]]:
+        totals = self._shards.totals()
+        cumulative = 0.0
+        for bound, count in zip(self.bounds + (math.inf,), totals):
+            cumulative += count
+            yield "_bucket", (("le", _format_value(bound)),), cumulative
+        yield "_count", (), cumulative
+        yield "_sum", (), totals[-1]
+
+class Metric:
+    """A named metric family with optional labels"""
+    
+    def __init__(self, kind: str, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 child_factory: Callable[[], Any] = None):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._child_factory = child_factory
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = child_factory()
+    
+    def labels(self, *values: Any) -> Any:
+        """Get the child for a set of label values, creating it on first use"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is not None:
+            return child
+        
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        with self._lock:
+            return self._children.setdefault(key, self._child_factory())
+    
+    def __getattr__(self, attribute: str) -> Any:
+        # Unlabelled metrics forward inc/observe/time/... to their only child
+        child = self.__dict__.get("_children", {}).get(())
+        if attribute.startswith("_") or child is None:
+            raise AttributeError(attribute)
+        return getattr(child, attribute)
+    
+    def samples(self) -> Iterator[Sample]:
+        """Yield (suffix, labels, value) for every child"""
+        for key, child in list(self._children.items()):
+            labels = tuple(zip(self.labelnames, key))
+            for suffix, extra, value in child.samples():
+                yield suffix, labels + extra, value
+
+class MetricsRegistry:
+    """Process-wide collection of metrics with Prometheus text exposition
+    
+    With a multiprocess directory configured, every process (uvicorn worker
+    or inference pool worker) periodically writes a snapshot of its metrics
+    to <directory>/<pid>.json and render() merges all snapshots: counters and
+    histograms are summed, including those of exited processes, while gauges
+    are summed over live processes only.
+    """
+    
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self.multiprocess_dir: Optional[str] = None
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+    
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Metric:
+        return self._register(Metric("counter", name, documentation, labelnames, _CounterChild))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Metric:
+        return self._register(Metric("gauge", name, documentation, labelnames, _GaugeChild))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Metric:
+        bounds = tuple(sorted(float(bound) for bound in buckets))
+        return self._register(
+            Metric("histogram", name, documentation, labelnames, lambda: _HistogramChild(bounds))
+        )
+    
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot every metric as {name: {type, help, samples}}"""
+        return {
+            name: {
+                "type": metric.kind,
+                "help": metric.documentation,
+                "samples": list(metric.samples())
+            }
+            for name, metric in list(self._metrics.items())
+        }
+    
+    def start(self, multiprocess_dir: Optional[str] = None, flush_seconds: float = 5.0) -> None:
+        """Start writing snapshots for multi-worker aggregation (no-op without a directory)"""
+        if not multiprocess_dir or self._flusher is not None:
+            return
+        
+        os.makedirs(multiprocess_dir, exist_ok=True)
+        self.multiprocess_dir = multiprocess_dir
+        self._stop.clear()
+        self.write_snapshot()
+        
+        def flush_loop():
+            while not self._stop.wait(flush_seconds):
+                self.write_snapshot()
+        
+        self._flusher = threading.Thread(target=flush_loop, name="metrics-flusher", daemon=True)
+        self._flusher.start()
+    
+    def stop(self) -> None:
+        """Write a final snapshot (without gauges) and stop the flusher"""
+        if self._flusher is None:
+            return
+        self._stop.set()
+        self._flusher.join()
+        self._flusher = None
+        self.write_snapshot(include_gauges=False)
+    
+    def write_snapshot(self, include_gauges: bool = True) -> None:
+        """Atomically write this process's metrics to the multiprocess directory"""
+        if not self.multiprocess_dir:
+            return
+        
+        metrics = self.collect()
+        if not include_gauges:
+            metrics = {name: family for name, family in metrics.items() if family["type"] != "gauge"}
+        
+        path = os.path.join(self.multiprocess_dir, f"{os.getpid()}.json")
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                json.dump({"pid": os.getpid(), "metrics": metrics}, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics snapshot: {str(e)}")
+    
+    def _other_snapshots(self) -> Iterator[Tuple[bool, Dict[str, Any]]]:
+        """Yield (process alive, metrics) for every other process's snapshot"""
+        if not self.multiprocess_dir:
+            return
+        
+        for entry in os.scandir(self.multiprocess_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if snapshot.get("pid") == os.getpid():
+                continue
+            yield pid_alive(snapshot["pid"]), snapshot["metrics"]
+    
+    def render(self) -> str:
+        """Render all metrics (merged across processes) in Prometheus text format"""
+        families = self.collect()
+        merged: Dict[str, Dict[Tuple[str, Tuple], float]] = {
+            name: {(suffix, labels): value for suffix, labels, value in family["samples"]}
+            for name, family in families.items()
+        }
+        
+        for alive, metrics in self._other_snapshots():
+            for name, family in metrics.items():
+                if family["type"] == "gauge" and not alive:
+                    continue
+                if name not in families:
+                    families[name] = family
+                    merged[name] = {}
+                samples = merged[name]
+                for suffix, labels, value in family["samples"]:
+                    key = (suffix, tuple(tuple(pair) for pair in labels))
+                    samples[key] = samples.get(key, 0.0) + value
+        
+        lines = []
+        for name, family in families.items():
+            lines.append(f"# HELP {name} {_escape(family['help'], help_text=True)}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for (suffix, labels), value in merged[name].items():
+                label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels)
+                label_text = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{name}{suffix}{label_text} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+def pid_alive(pid: int) -> bool:
+    """Check whether a process on this host still exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def process_memory(pid: Any = "self") -> Dict[str, float]:
+    """Resident memory of a process in MB (Linux; empty elsewhere)
+    
+    pss_mb charges shared pages (such as model weights inherited from a
+    pre-forking master) proportionally to each process sharing them, so
+    summing it over workers gives their real footprint, unlike rss_mb.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[key] = int(value.split()[0]) / 1024
+    except OSError:
+        return {}
+    return {
+        "rss_mb": round(fields.get("Rss", 0.0), 1),
+        "pss_mb": round(fields.get("Pss", 0.0), 1),
+        "shared_mb": round(fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0), 1),
+        "private_mb": round(fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0), 1)
+    }
+
+def _escape(text: str, help_text: bool = False) -> str:
+    """Escape label values (and HELP text) for the text exposition format"""
+    text = text.replace("\\", "\\\\").replace("\n", "\\n")
+    return text if help_text else text.replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    """Format a sample value, writing whole numbers without a decimal point"""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "defectnet_stage_duration_seconds",
+    "Time spent in each prediction pipeline stage",
+    ("stage",)
+)
+EXECUTOR_SECONDS = REGISTRY.histogram(
+    "defectnet_executor_duration_seconds",
+    "Time from submitting work to a stage pool until it completes, including queueing",
+    ("stage",)
+)
+EXECUTOR_IN_FLIGHT = REGISTRY.gauge(
+    "defectnet_executor_in_flight",
+    "Work items admitted to a stage pool and not yet finished",
+    ("stage",)
+)
+EXECUTOR_FAILURES = REGISTRY.counter(
+    "defectnet_executor_failures_total",
+    "Work items that raised on a stage pool",
+    ("stage",)
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    "defectnet_http_requests_total",
+    "HTTP requests by route, method and status code",
+    ("endpoint", "method", "status")
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "defectnet_http_request_duration_seconds",
+    "HTTP request latency by route, until the last body chunk is sent",
+    ("endpoint",)
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "defectnet_http_requests_in_flight",
+    "HTTP requests currently being served"
+)
+BATCH_SIZE = REGISTRY.histogram(
+    "defectnet_inference_batch_size",
+    "Images per micro-batched forward pass",
+    buckets=BATCH_SIZE_BUCKETS
+)
+BATCH_QUEUE_SECONDS = REGISTRY.histogram(
+    "defectnet_batch_queue_wait_seconds",
+    "Time a request waits in the micro-batch queue before its batch is dispatched"
+)
+BATCH_QUEUE_DEPTH = REGISTRY.gauge(
+    "defectnet_batch_queue_depth",
+    "Requests waiting in the micro-batch queue"
+)
+BATCH_REJECTIONS = REGISTRY.counter(
+    "defectnet_batch_rejections_total",
+    "Requests rejected because the micro-batch queue was full"
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "defectnet_result_cache_lookups_total",
+    "Result cache lookups by outcome (hit, miss, expired)",
+    ("result",)
+)
+CACHE_EVICTIONS = REGISTRY.counter(
+    "defectnet_result_cache_evictions_total",
+    "Result cache entries evicted to stay within the byte budget"
+)
+CACHE_BYTES = REGISTRY.gauge(
+    "defectnet_result_cache_bytes",
+    "Bytes of serialized responses held by the result cache"
+)
+CACHE_ENTRIES = REGISTRY.gauge(
+    "defectnet_result_cache_entries",
+    "Responses held by the result cache"
+)
+BUFFER_POOL_LOOKUPS = REGISTRY.counter(
+    "defectnet_buffer_pool_acquires_total",
+    "Buffer pool acquires by outcome (hit, miss, unpooled)",
+    ("result",)
+)
+BUFFER_POOL_BYTES = REGISTRY.gauge(
+    "defectnet_buffer_pool_bytes",
+    "Bytes of pooled image and tensor buffers by state (in_use, pooled)",
+    ("state",)
+)
+ADMISSION_DECISIONS = REGISTRY.counter(
+    "defectnet_admission_decisions_total",
+    "Admission decisions by priority class (interactive, batch) and result (admitted, rejected)",
+    ("priority", "result")
+)
+ADMISSION_IN_FLIGHT = REGISTRY.gauge(
+    "defectnet_admission_in_flight",
+    "Images admitted and not yet finished, by priority class",
+    ("priority",)
+)
+DEADLINE_EXCEEDED = REGISTRY.counter(
+    "defectnet_deadline_exceeded_total",
+    "Requests dropped because their deadline passed, by the stage they were waiting for",
+    ("stage",)
+)
+REQUESTS_CANCELLED = REGISTRY.counter(
+    "defectnet_requests_cancelled_total",
+    "Requests cancelled because the client disconnected before the response"
+)
+
+def time_stage(stage: str) -> _Timer:
+    """Time a pipeline stage: `with time_stage("decode"): ...`"""
+    return _Timer(STAGE_SECONDS.labels(stage), stage)
+
+def timed_stage(stage: str) -> Callable[[Callable], Callable]:
+    """Decorator timing every call of a function as a pipeline stage (and request trace entry)"""
+    histogram = STAGE_SECONDS.labels(stage)
+    
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                histogram.observe(elapsed)
+                record_stage(stage, elapsed)
+        return wrapper
+    
+    return decorator
+
+class MetricsMiddleware:
+    """ASGI middleware recording HTTP request counts, latency and in-flight requests
+    
+    Requests are labelled with the matched route template (e.g. /jobs/{job_id})
+    so that label cardinality stays bounded; unmatched paths share one label.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = 500
+        
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.labels(endpoint, scope["method"], status_code).inc()
+            HTTP_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
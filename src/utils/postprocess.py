@@ -1,5 +1,14 @@
 import numpy as np
-import cv2
+
+try:
+    import cv2
+except ImportError:  # OpenCV is only needed by the contour helpers below
+    cv2 = None
+
+def _require_cv2():
+    """Raise a clear error when an OpenCV helper is used without OpenCV installed"""
+    if cv2 is None:
+        raise ImportError("opencv-python is required for threshold and contour helpers")
 
 def apply_threshold(image, threshold=127):
     """
@@ -12,6 +21,7 @@ def apply_threshold(image, threshold=127):
     Returns:
     numpy.ndarray: Thresholded image.
     """
+    _require_cv2()
     _, binary_image = cv2.threshold(image, threshold, 255, cv2.THRESH_BINARY)
     return binary_image
 
@@ -25,6 +35,7 @@ def find_contours(binary_image):
     Returns:
     list: List of contours found in the image.
     """
+    _require_cv2()
     contours, _ = cv2.findContours(binary_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     return contours
 
@@ -39,6 +50,7 @@ def draw_contours(image, contours):
     Returns:
     numpy.ndarray: Image with contours drawn.
     """
+    _require_cv2()
     return cv2.drawContours(image.copy(), contours, -1, (0, 255, 0), 2)
 
 def postprocess_image(image_path, threshold=127):
@@ -52,6 +64,7 @@ def postprocess_image(image_path, threshold=127):
     Returns:
     numpy.ndarray: Image with contours drawn.
     """
+    _require_cv2()
     image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
     if image is None:
         raise ValueError(f"Image at path {image_path} could not be loaded.")
@@ -60,4 +73,309 @@ def postprocess_image(image_path, threshold=127):
     contours = find_contours(binary_image)
     result_image = draw_contours(image, contours)
     
-    return result_image
\ No newline at end of file
+    return result_image
+
+# Row block size when searching for overlapping pairs; bounds the size of each
+# intermediate overlap matrix
+PAIR_BLOCK_SIZE = 128
+
+MATCH_METRICS = ("iou", "ios")
+
+def box_area(boxes):
+    """
+    Compute the area of xyxy boxes.
+    
+    Parameters:
+    boxes (numpy.ndarray): (..., 4) boxes.
+    
+    Returns:
+    numpy.ndarray: (...) areas.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32)
+    return (boxes[..., 2] - boxes[..., 0]) * (boxes[..., 3] - boxes[..., 1])
+
+def box_overlap(boxes_a, boxes_b, metric="iou"):
+    """
+    Compute pairwise overlap between two sets of xyxy boxes, with optional batch dimensions.
+    
+    Parameters:
+    boxes_a (numpy.ndarray): (..., N, 4) boxes.
+    boxes_b (numpy.ndarray): (..., M, 4) boxes; leading dimensions broadcast against boxes_a.
+    metric (str): "iou" (intersection over union) or "ios" (intersection over the smaller box).
+    
+    Returns:
+    numpy.ndarray: (..., N, M) overlap matrix.
+    """
+    if metric not in MATCH_METRICS:
+        raise ValueError(f"Unknown match metric '{metric}', expected one of {MATCH_METRICS}")
+    
+    boxes_a = np.asarray(boxes_a, dtype=np.float32)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32)
+    
+    top_left = np.maximum(boxes_a[..., :, None, :2], boxes_b[..., None, :, :2])
+    bottom_right = np.minimum(boxes_a[..., :, None, 2:], boxes_b[..., None, :, 2:])
+    size = np.clip(bottom_right - top_left, 0, None)
+    intersection = size[..., 0] * size[..., 1]
+    
+    area_a = box_area(boxes_a)[..., :, None]
+    area_b = box_area(boxes_b)[..., None, :]
+    if metric == "ios":
+        denominator = np.minimum(area_a, area_b)
+    else:
+        denominator = area_a + area_b - intersection
+    return intersection / np.maximum(denominator, 1e-9)
+
+def box_iou(boxes_a, boxes_b):
+    """
+    Compute pairwise IoU between two sets of xyxy boxes, with optional batch dimensions.
+    
+    Parameters:
+    boxes_a (numpy.ndarray): (..., N, 4) boxes.
+    boxes_b (numpy.ndarray): (..., M, 4) boxes.
+    
+    Returns:
+    numpy.ndarray: (..., N, M) IoU matrix.
+    """
+    return box_overlap(boxes_a, boxes_b, "iou")
+
+def _overlapping_pairs(boxes, threshold, metric="iou", block_size=PAIR_BLOCK_SIZE):
+    """
+    Find every pair of boxes overlapping above a threshold without building the full N x N matrix.
+    
+    Boxes are sorted by x_min, so each block of rows only needs to be compared
+    with the boxes that start before the block's right-most edge.
+    
+    Parameters:
+    boxes (numpy.ndarray): (N, 4) boxes.
+    threshold (float): Pairs with overlap strictly above this are returned.
+    metric (str): Overlap metric, see box_overlap.
+    block_size (int): Rows compared per step.
+    
+    Returns:
+    tuple: (first, second) index arrays, one entry per unordered pair.
+    """
+    by_x = np.argsort(boxes[:, 0], kind="stable")
+    sorted_boxes = boxes[by_x]
+    x_min = sorted_boxes[:, 0]
+    
+    firsts, seconds = [], []
+    for start in range(0, len(boxes), block_size):
+        rows = sorted_boxes[start:start + block_size]
+        stop = np.searchsorted(x_min, rows[:, 2].max(), side="left")
+        if stop <= start + 1:
+            continue
+        
+        overlap = box_overlap(rows, sorted_boxes[start:stop], metric)
+        row_index, column_index = np.nonzero(overlap > threshold)
+        row_index += start
+        column_index += start
+        # Keep each unordered pair once (the diagonal is the box itself)
+        upper = column_index > row_index
+        firsts.append(row_index[upper])
+        seconds.append(column_index[upper])
+    
+    if not firsts:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    return by_x[np.concatenate(firsts)], by_x[np.concatenate(seconds)]
+
+def _cluster_boxes(boxes, scores, threshold, classes=None, metric="iou"):
+    """
+    Greedy NMS clustering: which boxes survive, and which survivor absorbs each suppressed box.
+    
+    Uses the Cluster-NMS fixed point iteration over the sparse overlap graph,
+    which gives exactly the greedy NMS result in a handful of vectorized
+    passes instead of one Python step per box.
+    
+    Parameters:
+    boxes (numpy.ndarray): (N, 4) xyxy boxes.
+    scores (numpy.ndarray): (N,) confidence scores.
+    threshold (float): Overlap above which a lower-scoring box is suppressed.
+    classes (numpy.ndarray): Optional (N,) class ids; boxes of different classes never interact.
+    metric (str): Overlap metric, see box_overlap.
+    
+    Returns:
+    tuple: (order, keep, head) where order sorts boxes by descending score and,
+    in that order, keep marks survivors and head gives each box's survivor.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    count = len(boxes)
+    order = np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable")
+    if count == 0:
+        return order, np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int64)
+    
+    if classes is not None:
+        # Move each class into its own x range so classes never overlap
+        span = float(boxes[:, 2].max() - boxes[:, 0].min()) + 1
+        boxes = boxes.copy()
+        boxes[:, [0, 2]] += np.asarray(classes, dtype=np.float32)[:, None] * span
+    
+    first, second = _overlapping_pairs(boxes, threshold, metric)
+    rank = np.empty(count, dtype=np.int64)
+    rank[order] = np.arange(count)
+    # The higher-scoring box of each pair is the one that can suppress the other
+    suppressor = np.minimum(rank[first], rank[second])
+    suppressed = np.maximum(rank[first], rank[second])
+    
+    keep = np.ones(count, dtype=bool)
+    for _ in range(count):
+        next_keep = np.ones(count, dtype=bool)
+        next_keep[suppressed[keep[suppressor]]] = False
+        if np.array_equal(next_keep, keep):
+            break
+        keep = next_keep
+    
+    # Each suppressed box joins the highest-scoring survivor overlapping it
+    head = np.arange(count)
+    active = keep[suppressor]
+    np.minimum.at(head, suppressed[active], suppressor[active])
+    return order, keep, head
+
+def nms(boxes, scores, iou_threshold=0.5, classes=None, metric="iou"):
+    """
+    Greedy non-maximum suppression, per class when classes are given.
+    
+    Parameters:
+    boxes (numpy.ndarray): (N, 4) xyxy boxes.
+    scores (numpy.ndarray): (N,) confidence scores.
+    iou_threshold (float): Boxes overlapping a kept box above this are dropped.
+    classes (numpy.ndarray): Optional (N,) class ids; boxes of different classes never suppress each other.
+    metric (str): "iou" or "ios", see box_overlap.
+    
+    Returns:
+    numpy.ndarray: Indices of kept boxes, highest score first.
+    """
+    order, keep, _ = _cluster_boxes(boxes, scores, iou_threshold, classes, metric)
+    return order[keep]
+
+def weighted_box_fusion(boxes, scores, classes=None, iou_threshold=0.55, metric="iou", num_models=1):
+    """
+    Fuse overlapping boxes into score-weighted averages instead of discarding them.
+    
+    Clusters are formed by greedy NMS; each cluster's box is the score-weighted
+    mean of its members and its score the mean member score, scaled down
+    when fewer than num_models predictions support it.
+    
+    Parameters:
+    boxes (numpy.ndarray): (N, 4) xyxy boxes.
+    scores (numpy.ndarray): (N,) confidence scores.
+    classes (numpy.ndarray): Optional (N,) class ids; only same-class boxes are fused.
+    iou_threshold (float): Overlap above which boxes join a cluster.
+    metric (str): "iou" or "ios", see box_overlap.
+    num_models (int): Number of independent predictions (models, tiles, augmentations) being fused.
+    
+    Returns:
+    tuple: (boxes, scores, classes) of the fused boxes, highest score first.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64)
+    classes = np.zeros(len(boxes)) if classes is None else np.asarray(classes)
+    order, keep, head = _cluster_boxes(boxes, scores, iou_threshold, classes, metric)
+    
+    count = len(order)
+    sorted_boxes = boxes[order]
+    sorted_scores = scores[order]
+    
+    score_sum = np.bincount(head, weights=sorted_scores, minlength=count)
+    members = np.bincount(head, minlength=count)
+    fused = np.stack([
+        np.bincount(head, weights=sorted_scores * sorted_boxes[:, i], minlength=count)
+        for i in range(4)
+    ], axis=1)
+    
+    fused = fused[keep] / np.maximum(score_sum[keep], 1e-12)[:, None]
+    fused_scores = score_sum[keep] / members[keep] * np.minimum(members[keep], num_models) / num_models
+    fused_classes = classes[order][keep]
+    
+    by_score = np.argsort(-fused_scores, kind="stable")
+    return fused[by_score], fused_scores[by_score], fused_classes[by_score]
+
+def merge_tile_detections(tile_detections, origins, image_size, iou_threshold=0.5,
+                          method="nms", metric="ios"):
+    """
+    Shift per-tile detections to panel coordinates and merge duplicates across tile borders.
+    
+    A defect cut by a tile border shows up as a partial box in one tile and a
+    full box in its neighbour. Their IoU is low, so tiles are matched on
+    intersection over the smaller box by default.
+    
+    Parameters:
+    tile_detections (list): One (n, 6) array per tile of x_min, y_min, x_max, y_max, confidence, class id.
+    origins (numpy.ndarray): (T, 2) x, y offset of each tile in the panel.
+    image_size (tuple): Panel (width, height) used to clip boxes off padded tile edges.
+    iou_threshold (float): Overlap above which same-class boxes are merged.
+    method (str): "nms" keeps the best box of each cluster, "wbf" fuses the cluster.
+    metric (str): "ios" or "iou", see box_overlap.
+    
+    Returns:
+    numpy.ndarray: (m, 6) merged detections in panel coordinates.
+    """
+    detections = [np.asarray(d, dtype=np.float64).reshape(-1, 6) for d in tile_detections]
+    if not detections:
+        return np.zeros((0, 6), dtype=np.float64)
+    
+    counts = np.array([len(d) for d in detections])
+    merged = np.concatenate(detections)
+    offsets = np.repeat(np.asarray(origins, dtype=np.float64).reshape(-1, 2), counts, axis=0)
+    merged[:, [0, 2]] += offsets[:, :1]
+    merged[:, [1, 3]] += offsets[:, 1:]
+    
+    width, height = image_size
+    merged[:, [0, 2]] = np.clip(merged[:, [0, 2]], 0, width)
+    merged[:, [1, 3]] = np.clip(merged[:, [1, 3]], 0, height)
+    
+    if method == "wbf":
+        boxes, scores, classes = weighted_box_fusion(
+            merged[:, :4], merged[:, 4], merged[:, 5], iou_threshold, metric, num_models=1
+        )
+        return np.column_stack([boxes, scores, classes])
+    if method != "nms":
+        raise ValueError(f"Unknown merge method '{method}', expected 'nms' or 'wbf'")
+    
+    keep = nms(merged[:, :4], merged[:, 4], iou_threshold, classes=merged[:, 5], metric=metric)
+    return merged[keep]
+
+def decode_yolov5_output(predictions, conf_threshold=0.25, iou_threshold=0.45, max_detections=300):
+    """
+    Decode raw YOLOv5 head output into per-image detections.
+    
+    Each candidate row is cx, cy, w, h, objectness, then one probability per
+    class. A candidate's confidence is objectness times its best class
+    probability; candidates below conf_threshold are dropped before
+    class-aware NMS.
+    
+    Parameters:
+    predictions (numpy.ndarray): (N, candidates, 5 + classes) network output.
+    conf_threshold (float): Minimum confidence kept.
+    iou_threshold (float): NMS overlap threshold.
+    max_detections (int): Detections kept per image, highest confidence first.
+    
+    Returns:
+    list: One (n, 6) float32 array per image of x_min, y_min, x_max, y_max, confidence, class id
+    in network input coordinates.
+    """
+    predictions = np.asarray(predictions)
+    if predictions.ndim == 2:
+        predictions = predictions[None]
+    
+    outputs = []
+    for image_predictions in predictions:
+        # Objectness alone bounds the confidence, so filter on it before touching class scores
+        candidates = image_predictions[image_predictions[:, 4] >= conf_threshold]
+        class_scores = candidates[:, 5:] * candidates[:, 4:5]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(candidates)), class_ids]
+        
+        selected = scores >= conf_threshold
+        candidates, scores, class_ids = candidates[selected], scores[selected], class_ids[selected]
+        
+        boxes = np.empty((len(candidates), 4), dtype=np.float32)
+        half_w, half_h = candidates[:, 2] / 2, candidates[:, 3] / 2
+        boxes[:, 0] = candidates[:, 0] - half_w
+        boxes[:, 1] = candidates[:, 1] - half_h
+        boxes[:, 2] = candidates[:, 0] + half_w
+        boxes[:, 3] = candidates[:, 1] + half_h
+        
+        keep = nms(boxes, scores, iou_threshold, classes=class_ids)[:max_detections]
+        outputs.append(np.column_stack([boxes[keep], scores[keep], class_ids[keep]]).astype(np.float32))
+    return outputs
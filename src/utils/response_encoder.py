@@ -0,0 +1,160 @@
+import json
+import logging
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .metrics import timed_stage
+from .response_formatter import BOX_FIELDS, dumps_json
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are only offered when installed
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+PACKED_MEDIA_TYPE = "application/vnd.defectnet.packed"
+
+MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK_MEDIA_TYPE,
+    "application/vnd.msgpack": MSGPACK_MEDIA_TYPE
+}
+
+# Packed layout: magic, version, header length, then a JSON header and
+# little-endian arrays (confidence float32[n], boxes int32[n, 4], class id uint16[n])
+PACKED_MAGIC = b"DNPK"
+PACKED_VERSION = 1
+PACKED_PREFIX = struct.Struct("<4sHHI")
+
+class ResponseEncoder:
+    """Content negotiation and encoding of prediction responses"""
+    
+    def __init__(self):
+        self.media_types = [JSON_MEDIA_TYPE, PACKED_MEDIA_TYPE]
+        if msgpack is not None:
+            self.media_types.insert(1, MSGPACK_MEDIA_TYPE)
+    
+    def negotiate(self, accept: Optional[str]) -> str:
+        """Pick the supported media type the client prefers, defaulting to JSON"""
+        best, best_quality = JSON_MEDIA_TYPE, 0.0
+        
+        for part in (accept or "").split(","):
+            media_type, _, params = part.partition(";")
+            media_type = media_type.strip().lower()
+            media_type = MEDIA_TYPE_ALIASES.get(media_type, media_type)
+            if media_type not in self.media_types:
+                continue
+            
+            quality = 1.0
+            for param in params.split(";"):
+                key, _, value = param.partition("=")
+                if key.strip() == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            if quality > best_quality:
+                best, best_quality = media_type, quality
+        
+        return best
+    
+    @timed_stage("serialize")
+    def encode(self, data: Dict[str, Any], media_type: str = JSON_MEDIA_TYPE) -> bytes:
+        """Encode a single or batch prediction response"""
+        if media_type == MSGPACK_MEDIA_TYPE and msgpack is not None:
+            return msgpack.packb(data, use_bin_type=True)
+        if media_type == PACKED_MEDIA_TYPE:
+            return self.encode_packed(data)
+        return dumps_json(data)
+    
+    def encode_packed(self, data: Dict[str, Any]) -> bytes:
+        """Encode predictions as packed little-endian arrays behind a small JSON header
+        
+        The header is the response without its predictions; each image
+        records its "detections" count and arrays hold every image's
+        detections back to back.
+        """
+        results = data["batch_results"] if "batch_results" in data else [data]
+        
+        headers, arrays = [], []
+        for result in results:
+            header = {key: value for key, value in result.items() if key not in ("predictions", "layout")}
+            if "predictions" in result:
+                columns = self._columns(result["predictions"])
+                confidence = np.array(columns["confidence"], dtype="<f4")
+                boxes = np.array([columns[field] for field in BOX_FIELDS], dtype="<i4").reshape(4, -1).T
+                class_id = np.array(columns["class_id"], dtype="<u2")
+                
+                ids, first = np.unique(class_id, return_index=True)
+                header["detections"] = len(confidence)
+                header["class_names"] = {str(i): columns["class"][j] for i, j in zip(ids.tolist(), first.tolist())}
+                arrays.append((confidence, boxes, class_id))
+            headers.append(header)
+        
+        if "batch_results" in data:
+            header = {key: value for key, value in data.items() if key != "batch_results"}
+            header["batch_results"] = headers
+        else:
+            header = headers[0]
+        
+        if arrays:
+            confidence, boxes, class_id = (np.concatenate(parts) for parts in zip(*arrays))
+        else:
+            confidence, boxes, class_id = np.zeros(0, "<f4"), np.zeros((0, 4), "<i4"), np.zeros(0, "<u2")
+        
+        header_bytes = dumps_json(header)
+        return b"".join([
+            PACKED_PREFIX.pack(PACKED_MAGIC, PACKED_VERSION, 0, len(header_bytes)),
+            header_bytes,
+            confidence.tobytes(),
+            boxes.tobytes(),
+            class_id.tobytes()
+        ])
+    
+    @staticmethod
+    def decode_packed(payload: bytes) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """Decode a packed response into its header and (confidence, boxes, class_id) arrays"""
+        magic, version, _, header_length = PACKED_PREFIX.unpack_from(payload)
+        if magic != PACKED_MAGIC or version != PACKED_VERSION:
+            raise ValueError("Not a packed prediction response")
+        
+        offset = PACKED_PREFIX.size
+        header = json.loads(payload[offset:offset + header_length])
+        offset += header_length
+        
+        results = header["batch_results"] if "batch_results" in header else [header]
+        count = sum(result.get("detections", 0) for result in results)
+        
+        confidence = np.frombuffer(payload, dtype="<f4", count=count, offset=offset)
+        offset += confidence.nbytes
+        boxes = np.frombuffer(payload, dtype="<i4", count=count * 4, offset=offset).reshape(count, 4)
+        offset += boxes.nbytes
+        class_id = np.frombuffer(payload, dtype="<u2", count=count, offset=offset)
+        
+        return header, {"confidence": confidence, "boxes": boxes, "class_id": class_id}
+    
+    @staticmethod
+    def _columns(predictions) -> Dict[str, List[Any]]:
+        """Get columnar predictions, converting the object layout if needed
+        
+        The object layout carries no class ids, so converted predictions are
+        numbered in order of first appearance (the header maps them to names).
+        """
+        if isinstance(predictions, dict):
+            return predictions
+        
+        columns: Dict[str, List[Any]] = {"class": [], "class_id": [], "confidence": []}
+        columns.update({field: [] for field in BOX_FIELDS})
+        names: Dict[str, int] = {}
+        for prediction in predictions:
+            name = prediction["class"]
+            columns["class"].append(name)
+            columns["class_id"].append(names.setdefault(name, len(names)))
+            columns["confidence"].append(prediction["confidence"])
+            for field in BOX_FIELDS:
+                columns[field].append(prediction["bounding_box"][field])
+        return columns
@@ -1,28 +1,62 @@
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
+import json
 import time
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library encoder
+    orjson = None
+
+from .metrics import timed_stage
 
 logger = logging.getLogger(__name__)
 
+PREDICTION_LAYOUTS = ("objects", "columnar")
+
+BOX_FIELDS = ("x_min", "y_min", "x_max", "y_max")
+
+def dumps_json(data: Any) -> bytes:
+    """Serialize to compact JSON bytes with the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, separators=(",", ":")).encode()
+
 class ResponseFormatter:
     """Format model predictions into standardized API responses"""
     
     def __init__(self, confidence_threshold: float = 0.5):
         self.confidence_threshold = confidence_threshold
     
-    def format_single_prediction(self, results, inference_time: float, image_info: dict) -> Dict[str, Any]:
-        """Format single image prediction results"""
+    @timed_stage("format")
+    def format_single_prediction(self, results, inference_time: float, image_info: dict,
+                                 layout: str = "objects") -> Dict[str, Any]:
+        """Format single image prediction results
+        
+        results is either YOLOv5-style results or a (boxes, scores, class_ids,
+        names) tuple of NumPy arrays. layout "objects" returns one object per
+        defect; "columnar" returns parallel arrays (class, class_id,
+        confidence, x_min, ...) instead.
+        """
         try:
-            predictions = self._extract_predictions(results)
+            detections = self.detections_from_results(results)
+            if detections is not None:
+                predictions = self._build_predictions(*detections, layout=layout)
+            else:
+                predictions = self._extract_predictions(results, layout)
             
-            return {
+            response = {
                 "predictions": predictions,
-                "total_defects": len(predictions),
+                "total_defects": len(predictions["class"]) if layout == "columnar" else len(predictions),
                 "inference_time_ms": round(inference_time * 1000, 2),
                 "image_info": image_info,
                 "confidence_threshold": self.confidence_threshold,
                 "timestamp": time.time()
             }
+            if layout == "columnar":
+                response["layout"] = layout
+            return response
             
         except Exception as e:
             logger.error(f"Response formatting failed: {str(e)}")
@@ -41,12 +75,7 @@ class ResponseFormatter:
             
             return {
                 "batch_results": batch_results,
-                "summary": {
-                    "total_images": len(batch_results),
-                    "successful_predictions": successful_predictions,
-                    "failed_predictions": len(batch_results) - successful_predictions,
-                    "total_defects_found": total_defects
-                },
+                "summary": self._batch_summary(len(batch_results), successful_predictions, total_defects),
                 "timestamp": time.time()
             }
             
@@ -58,29 +87,103 @@ class ResponseFormatter:
                 "timestamp": time.time()
             }
     
-    def _extract_predictions(self, results) -> List[Dict[str, Any]]:
-        """Extract predictions from YOLOv5 results"""
-        predictions = []
+    def format_batch_summary(self, total_images: int, successful_predictions: int,
+                             total_defects: int) -> Dict[str, Any]:
+        """Format the trailing summary record of a streamed batch"""
+        return {
+            "summary": self._batch_summary(total_images, successful_predictions, total_defects),
+            "timestamp": time.time()
+        }
+    
+    @staticmethod
+    def _batch_summary(total_images: int, successful_predictions: int, total_defects: int) -> Dict[str, Any]:
+        """Build the summary block shared by batch and streamed batch responses"""
+        return {
+            "total_images": total_images,
+            "successful_predictions": successful_predictions,
+            "failed_predictions": total_images - successful_predictions,
+            "total_defects_found": total_defects
+        }
+    
+    @staticmethod
+    @timed_stage("serialize")
+    def to_ndjson(record: Dict[str, Any]) -> str:
+        """Encode one record as a newline-delimited JSON line"""
+        return dumps_json(record).decode() + "\n"
+    
+    @staticmethod
+    @timed_stage("serialize")
+    def to_sse(record: Dict[str, Any], event: str) -> str:
+        """Encode one record as a Server-Sent Events message"""
+        return f"event: {event}\ndata: {dumps_json(record).decode()}\n\n"
+    
+    @staticmethod
+    def detections_from_results(results) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, Sequence[str]]]:
+        """Get (boxes, scores, class_ids, names) arrays from YOLOv5-style results
+        
+        Reads the first image of `results.xyxy`, an (n, 6) array of x_min,
+        y_min, x_max, y_max, confidence, class id. A (boxes, scores,
+        class_ids, names) tuple is returned as is. Returns None when results
+        do not carry detection arrays.
+        """
+        if isinstance(results, tuple) and len(results) == 4:
+            return results
+        
+        xyxy = getattr(results, "xyxy", None)
+        if not isinstance(xyxy, (list, tuple)) or not xyxy:
+            return None
+        
+        detections = xyxy[0]
+        if hasattr(detections, "cpu"):
+            detections = detections.cpu().numpy()
+        detections = np.asarray(detections, dtype=np.float64).reshape(-1, 6)
+        
+        names = results.names
+        if isinstance(names, dict):
+            names = [names[i] for i in sorted(names)]
+        return detections[:, :4], detections[:, 4], detections[:, 5].astype(np.int64), names
+    
+    def _build_predictions(self, boxes: np.ndarray, scores: np.ndarray, class_ids: np.ndarray,
+                           names: Sequence[str], layout: str = "objects") -> Union[List[Dict[str, Any]], Dict[str, list]]:
+        """Filter detections by confidence with one vectorized mask and build the output in one pass"""
+        if layout not in PREDICTION_LAYOUTS:
+            raise ValueError(f"Unknown prediction layout '{layout}', expected one of {PREDICTION_LAYOUTS}")
         
+        keep = np.asarray(scores) > self.confidence_threshold
+        boxes = np.asarray(boxes)[keep].astype(np.int64).tolist()
+        confidences = np.asarray(scores, dtype=np.float64)[keep].tolist()
+        class_ids = np.asarray(class_ids)[keep]
+        classes = np.asarray(names, dtype=object)[class_ids].tolist()
+        
+        if layout == "columnar":
+            columns = dict(zip(BOX_FIELDS, map(list, zip(*boxes)))) if boxes else {field: [] for field in BOX_FIELDS}
+            return {
+                "class": classes,
+                "class_id": class_ids.tolist(),
+                "confidence": confidences,
+                **columns
+            }
+        
+        return [
+            {
+                "class": name,
+                "confidence": confidence,
+                "bounding_box": dict(zip(BOX_FIELDS, box))
+            }
+            for name, confidence, box in zip(classes, confidences, boxes)
+        ]
+    
+    def _extract_predictions(self, results, layout: str = "objects") -> Union[List[Dict[str, Any]], Dict[str, list]]:
+        """Extract predictions from results that only offer a pandas view"""
         try:
-            if hasattr(results, 'pandas'):
-                df = results.pandas().xyxy[0]
-                
-                for _, row in df.iterrows():
-                    if row['confidence'] > self.confidence_threshold:
-                        prediction = {
-                            "class": row['name'],
-                            "confidence": float(row['confidence']),
-                            "bounding_box": {
-                                "x_min": int(row['xmin']),
-                                "y_min": int(row['ymin']),
-                                "x_max": int(row['xmax']),
-                                "y_max": int(row['ymax'])
-                            }
-                        }
-                        predictions.append(prediction)
-            
-            return predictions
+            rows = [row for _, row in results.pandas().xyxy[0].iterrows()] if hasattr(results, 'pandas') else []
+            return self._build_predictions(
+                np.array([[row['xmin'], row['ymin'], row['xmax'], row['ymax']] for row in rows]).reshape(-1, 4),
+                np.array([row['confidence'] for row in rows], dtype=np.float64),
+                np.arange(len(rows)),
+                [row['name'] for row in rows],
+                layout
+            )
             
         except Exception as e:
             logger.error(f"Prediction extraction failed: {str(e)}")
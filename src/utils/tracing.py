@@ -0,0 +1,132 @@
+import collections
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_current_trace: contextvars.ContextVar[Optional["RequestTrace"]] = contextvars.ContextVar(
+    "request_trace", default=None
+)
+
+# Leaf frames of threads that are parked rather than working
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker")
+}
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Add a stage duration to the current request's trace, if one is active"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.stages.append((stage, seconds))
+
+class RequestTrace:
+    """Stage durations of one request, collected through a context variable
+    
+    Use as a context manager around the request; stages timed in the same
+    context (including thread pool work submitted through StageExecutor or
+    asyncio.to_thread) are recorded into it.
+    """
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        # (stage, seconds); appended from pool threads, so a list rather than a dict
+        self.stages: List[Tuple[str, float]] = []
+        self._token = None
+    
+    def __enter__(self) -> "RequestTrace":
+        self._token = _current_trace.set(self)
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        _current_trace.reset(self._token)
+    
+    def totals(self) -> Dict[str, float]:
+        """Milliseconds per stage (summed over repeats) plus the total so far"""
+        totals: Dict[str, float] = {}
+        for stage, seconds in list(self.stages):
+            totals[stage] = totals.get(stage, 0.0) + seconds * 1000
+        totals["total"] = (time.perf_counter() - self.started) * 1000
+        return {stage: round(ms, 3) for stage, ms in totals.items()}
+    
+    def server_timing(self) -> str:
+        """Format the stage totals as a Server-Timing header value"""
+        return ", ".join(f"{stage};dur={ms}" for stage, ms in self.totals().items())
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler producing collapsed stacks
+    
+    A background thread snapshots every thread's stack each interval_ms.
+    Samples cover the whole process, so concurrent requests show up too;
+    threads parked in a wait are skipped.
+    """
+    
+    # One profile at a time keeps the overhead bounded
+    _active = threading.Lock()
+    
+    def __init__(self, interval_ms: float = 5.0, max_stacks: int = 50):
+        self.interval = interval_ms / 1000.0
+        self.interval_ms = interval_ms
+        self.max_stacks = max_stacks
+        self.samples = 0
+        self._stacks: "collections.Counter[str]" = collections.Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> bool:
+        """Start sampling; False when another profile is already running"""
+        if not self._active.acquire(blocking=False):
+            return False
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+    
+    def stop(self) -> None:
+        """Stop sampling and release the profiler for the next request"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._active.release()
+    
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = self._collapse(frame)
+                if stack is not None:
+                    self._stacks[stack] += 1
+            self.samples += 1
+    
+    @staticmethod
+    def _collapse(frame) -> Optional[str]:
+        """Render a frame's stack root-first as "file:function;file:function", None when idle"""
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            return None
+        
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+    
+    def summary(self) -> Dict[str, Any]:
+        """The most frequent collapsed stacks ("stack count" lines, flamegraph.pl input)"""
+        return {
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "stacks": [f"{stack} {count}" for stack, count in self._stacks.most_common(self.max_stacks)]
+        }
@@ -0,0 +1,133 @@
+import io
+import mmap
+import os
+import tempfile
+from typing import Dict, Optional, Sequence, Union
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+# Uploads are read this many bytes at a time; the format is sniffed from the first chunk
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# Leading bytes of each supported format, as Pillow names the format
+FILE_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF")
+)
+
+def sniff_format(header: bytes) -> Optional[str]:
+    """Identify an image format from its leading bytes, None when unrecognised"""
+    for signature, image_format in FILE_SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Image too large. Maximum size: {max_bytes // (1024 * 1024)}MB"
+    )
+
+def _on_disk(file) -> bool:
+    """Whether an upload is backed by a file descriptor that can be memory-mapped"""
+    if isinstance(file, tempfile.SpooledTemporaryFile) and file.name is None:
+        # Still held in memory; fileno() would first write it out to disk
+        return False
+    try:
+        file.fileno()
+    except (io.UnsupportedOperation, AttributeError):
+        return False
+    return True
+
+def _map_file(file, max_bytes: int) -> mmap.mmap:
+    """Memory-map an upload that was spooled to disk"""
+    file.flush()
+    size = os.fstat(file.fileno()).st_size
+    if size > max_bytes:
+        raise _too_large(max_bytes)
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+async def read_upload(file: UploadFile, max_bytes: int, allowed_formats: Optional[Sequence[str]] = None,
+                      chunk_size: int = UPLOAD_CHUNK_SIZE) -> Union[bytes, mmap.mmap]:
+    """Read an uploaded image, rejecting oversized or non-image uploads as early as possible
+    
+    The declared size is checked before reading, the format is sniffed from
+    the first chunk and reading stops as soon as max_bytes is exceeded.
+    Uploads already on disk (Starlette spools large ones) are returned as a
+    read-only memory map rather than copied into memory; pass the result
+    to release_upload when the request is done with it.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+    
+    await file.seek(0)
+    head = await file.read(chunk_size)
+    if not head:
+        raise HTTPException(status_code=400, detail="Empty image file")
+    
+    image_format = sniff_format(head)
+    if image_format is None:
+        raise HTTPException(status_code=400, detail="Invalid image format: unrecognised file signature")
+    if allowed_formats is not None and image_format not in allowed_formats:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported image format: {image_format}. Supported: {', '.join(allowed_formats)}"
+        )
+    
+    if _on_disk(file.file):
+        return await run_in_threadpool(_map_file, file.file, max_bytes)
+    
+    chunks = [head]
+    total = len(head)
+    while total <= max_bytes:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        total += len(chunk)
+    if total > max_bytes:
+        raise _too_large(max_bytes)
+    return head if len(chunks) == 1 else b"".join(chunks)
+
+def release_upload(data: Union[bytes, mmap.mmap, BaseException]) -> None:
+    """Unmap an upload returned by read_upload once its request is finished with it"""
+    if isinstance(data, mmap.mmap):
+        try:
+            data.close()
+        except BufferError:
+            # Still in use by a decode abandoned at the deadline; unmapped once that lets go
+            pass
+
+class UploadLimitMiddleware:
+    """ASGI middleware rejecting uploads whose Content-Length exceeds a per-path limit
+    
+    Runs before the multipart body is parsed, so an oversized request is
+    refused with 413 without being buffered or spooled to disk.
+    """
+    
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST":
+            limit = self.limits.get(scope["path"])
+            if limit is not None:
+                content_length = dict(scope["headers"]).get(b"content-length")
+                if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+                    response = JSONResponse(
+                        {"detail": f"Request too large. Maximum size: {limit // (1024 * 1024)}MB"},
+                        status_code=413
+                    )
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
@@ -0,0 +1,149 @@
+import pytest
+import asyncio
+import io
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from src.services.admission import PRIORITY_BATCH, PRIORITY_INTERACTIVE, AdmissionController
+from src.services.defect_detection_service import DefectDetectionService
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+    
+    def __init__(self):
+        self.now = 100.0
+    
+    def __call__(self):
+        return self.now
+
+class TestAdmissionController:
+    """Test queue-depth and latency based load shedding"""
+    
+    def setup_method(self):
+        """Setup test fixtures"""
+        self.clock = FakeClock()
+        self.admission = AdmissionController(
+            max_in_flight=8, batch_share=0.5, latency_slo_ms=500, latency_window_seconds=10, clock=self.clock
+        )
+    
+    def _complete_interactive(self, seconds):
+        with self.admission.admit(PRIORITY_INTERACTIVE):
+            self.clock.now += seconds
+    
+    def test_batch_traffic_leaves_headroom_for_single_images(self):
+        """Test that batches are refused at batch_share while single images are still admitted"""
+        with self.admission.admit(PRIORITY_BATCH, 3):
+            with pytest.raises(HTTPException) as exc_info:
+                self.admission.check(PRIORITY_BATCH, 2)
+            assert exc_info.value.status_code == 503
+            assert exc_info.value.headers == {"Retry-After": "1"}
+            
+            with self.admission.admit(PRIORITY_INTERACTIVE):
+                assert self.admission.in_flight == 4
+            self.admission.check(PRIORITY_BATCH, 1)
+        
+        stats = self.admission.get_stats()
+        assert stats["in_flight"] == {"interactive": 0, "batch": 0}
+        assert stats["admitted"] == {"interactive": 1, "batch": 1}
+        assert stats["rejected"] == {"interactive": 0, "batch": 1}
+    
+    def test_interactive_requests_are_refused_at_max_in_flight(self):
+        """Test the overall in-flight limit"""
+        with self.admission.admit(PRIORITY_BATCH, 4):
+            with self.admission.admit(PRIORITY_INTERACTIVE, 4):
+                with pytest.raises(HTTPException):
+                    self.admission.check(PRIORITY_INTERACTIVE)
+    
+    def test_idle_service_admits_oversized_requests(self):
+        """Test that a batch larger than the batch limit is still served when nothing else runs"""
+        with self.admission.admit(PRIORITY_BATCH, 10):
+            assert self.admission.in_flight == 10
+    
+    def test_latency_over_slo_sheds_batch_traffic(self):
+        """Test that slow interactive requests stop batches and halve the interactive limit"""
+        for _ in range(5):
+            self._complete_interactive(0.8)
+        
+        assert self.admission.over_slo()
+        assert self.admission.limit(PRIORITY_INTERACTIVE) == 4
+        with self.admission.admit(PRIORITY_INTERACTIVE):
+            with pytest.raises(HTTPException) as exc_info:
+                self.admission.check(PRIORITY_BATCH)
+        assert exc_info.value.headers == {"Retry-After": "1"}
+        assert "latency" in exc_info.value.detail
+        
+        # Old samples age out of the window
+        self.clock.now += 11
+        assert not self.admission.over_slo()
+        assert self.admission.get_stats()["recent_p95_ms"] is None
+    
+    def test_retry_after_follows_recent_latency(self):
+        """Test that Retry-After is the recent p95 latency rounded up"""
+        self._complete_interactive(2.2)
+        assert self.admission.retry_after() == 3
+    
+    def test_failed_requests_are_not_latency_samples(self):
+        """Test that errors release their slot without counting towards the SLO"""
+        with pytest.raises(ValueError):
+            with self.admission.admit(PRIORITY_INTERACTIVE):
+                self.clock.now += 5
+                raise ValueError("bad image")
+        
+        assert self.admission.in_flight == 0
+        assert self.admission.recent_latency() is None
+    
+    def test_disabled_controller_admits_everything(self):
+        """Test that ADMISSION_ENABLED=false only tracks"""
+        admission = AdmissionController(max_in_flight=1, enabled=False)
+        with admission.admit(PRIORITY_INTERACTIVE):
+            with admission.admit(PRIORITY_BATCH, 10):
+                assert admission.in_flight == 11
+
+class TestServiceAdmission:
+    """Test admission control on the detection service entry points"""
+    
+    def setup_method(self):
+        """Setup test fixtures"""
+        image_bytes = io.BytesIO()
+        Image.new("RGB", (64, 64), color="green").save(image_bytes, format="PNG")
+        self.image_bytes = image_bytes.getvalue()
+        self.service = DefectDetectionService()
+        self.service.admission = AdmissionController(max_in_flight=4, batch_share=0.5)
+    
+    def teardown_method(self):
+        self.service.shutdown()
+    
+    def _upload(self):
+        return UploadFile(file=io.BytesIO(self.image_bytes), filename="board.png")
+    
+    def test_busy_service_rejects_batches_before_single_images(self):
+        """Test that batch uploads are shed first and single images keep being served"""
+        async def run():
+            with self.service.admission.admit(PRIORITY_INTERACTIVE, 2):
+                with pytest.raises(HTTPException) as exc_info:
+                    await self.service.predict_batch([self._upload()])
+                assert exc_info.value.status_code == 503
+                with pytest.raises(HTTPException):
+                    self.service.predict_batch_stream([self._upload()])
+                return await self.service.predict_single(self._upload())
+        
+        response = asyncio.run(run())
+        
+        assert "predictions" in response
+        stats = self.service.get_service_info()["admission"]
+        assert stats["rejected"]["batch"] == 2
+        assert stats["admitted"]["interactive"] == 2
+        assert stats["in_flight"] == {"interactive": 0, "batch": 0}
+    
+    def test_streamed_batch_counts_as_one_batch_request(self):
+        """Test that a streamed batch is tracked once, not per image"""
+        async def run():
+            stream = self.service.predict_batch_stream([self._upload(), self._upload()])
+            return [record async for record in stream]
+        
+        records = asyncio.run(run())
+        
+        assert len(records) == 3
+        stats = self.service.admission.get_stats()
+        assert stats["admitted"] == {"interactive": 0, "batch": 1}
+        assert stats["in_flight"]["batch"] == 0
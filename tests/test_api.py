@@ -1,10 +1,15 @@
 import pytest
+import asyncio
 import io
+import json
 from fastapi.testclient import TestClient
 from PIL import Image
+from fastapi import HTTPException
 from unittest.mock import Mock, patch
 
-from app import app
+from app import app, cancel_on_disconnect
+from config import Config
+from src.utils.deadline import get_deadline_stats
 
 class TestAPI:
     """Test API endpoints"""
@@ -52,7 +57,7 @@ class TestAPI:
         """Test successful prediction endpoint"""
         mock_service.is_ready.return_value = True
         
-        async def mock_predict_single(file):
+        async def mock_predict_single(file, tiling=None, layout="objects", model_name=None, model_version=None):
             return {
                 "predictions": [{"class": "defect", "confidence": 0.8}],
                 "total_defects": 1
@@ -68,12 +73,110 @@ class TestAPI:
         assert "predictions" in data
         assert "total_defects" in data
     
+    @patch('app.detection_service')
+    def test_predict_server_timing_and_profile(self, mock_service):
+        """Test the Server-Timing header and the config-gated ?profile=1 mode"""
+        from src.utils.tracing import record_stage
+        
+        async def mock_predict_single(file, tiling=None, layout="objects", model_name=None, model_version=None):
+            record_stage("decode", 0.004)
+            record_stage("inference", 0.02)
+            return {"predictions": [], "total_defects": 0}
+        
+        mock_service.predict_single.side_effect = mock_predict_single
+        files = {"file": ("test.jpg", self.sample_image, "image/jpeg")}
+        
+        response = self.client.post("/predict/", files=files)
+        timing = response.headers["server-timing"]
+        assert "decode;dur=4.0" in timing
+        assert "inference;dur=20.0" in timing
+        assert "total;dur=" in timing
+        
+        with patch.object(Config, "PROFILING_ENABLED", False):
+            assert self.client.post("/predict/?profile=1", files=files).status_code == 403
+        
+        with patch.object(Config, "PROFILING_ENABLED", True):
+            response = self.client.post("/predict/?profile=1", files=files)
+        assert response.status_code == 200
+        profile = response.json()["profile"]
+        assert profile["stages_ms"]["inference"] == 20.0
+        assert "stacks" in profile and "samples" in profile
+    
+    @patch('app.detection_service')
+    def test_activate_model_disabled_by_default(self, mock_service):
+        """Test that model activation must be enabled explicitly"""
+        async def mock_activate(name, version):
+            return {"name": name, "active_version": version}
+        
+        mock_service.models.activate.side_effect = mock_activate
+        
+        response = self.client.post("/models/default/activate?version=2")
+        assert response.status_code == 403
+        mock_service.models.activate.assert_not_called()
+        
+        with patch.object(Config, "MODEL_ADMIN_ENABLED", True):
+            response = self.client.post("/models/default/activate?version=2")
+        assert response.status_code == 200
+        assert response.json() == {"name": "default", "active_version": "2"}
+    
+    @patch('app.detection_service')
+    def test_predict_endpoint_binary_encodings(self, mock_service):
+        """Test MessagePack and packed array responses via the Accept header"""
+        msgpack = pytest.importorskip("msgpack")
+        from src.utils.response_encoder import ResponseEncoder
+        
+        layouts = []
+        
+        async def mock_predict_single(file, tiling=None, layout="objects", model_name=None, model_version=None):
+            layouts.append(layout)
+            return {
+                "predictions": {
+                    "class": ["spur"], "class_id": [4], "confidence": [0.8],
+                    "x_min": [1], "y_min": [2], "x_max": [3], "y_max": [4]
+                },
+                "total_defects": 1
+            }
+        
+        mock_service.predict_single.side_effect = mock_predict_single
+        files = {"file": ("test.jpg", self.sample_image, "image/jpeg")}
+        
+        response = self.client.post("/predict/", files=files, headers={"Accept": "application/msgpack"})
+        assert response.headers["content-type"] == "application/msgpack"
+        assert msgpack.unpackb(response.content)["total_defects"] == 1
+        
+        response = self.client.post(
+            "/predict/", files=files, headers={"Accept": "application/vnd.defectnet.packed"}
+        )
+        header, arrays = ResponseEncoder.decode_packed(response.content)
+        assert header["detections"] == 1
+        assert arrays["boxes"].tolist() == [[1, 2, 3, 4]]
+        assert layouts == ["objects", "columnar"]
+    
+    @patch('app.detection_service')
+    def test_predict_endpoint_tiled(self, mock_service):
+        """Test that tiling query parameters reach the service"""
+        mock_service.resolve_tiling.side_effect = lambda **overrides: overrides
+        
+        async def mock_predict_single(file, tiling=None, layout="objects", model_name=None, model_version=None):
+            return {"predictions": [], "total_defects": 0, "tiling": tiling}
+        
+        mock_service.predict_single.side_effect = mock_predict_single
+        
+        files = {"file": ("panel.jpg", self.sample_image, "image/jpeg")}
+        response = self.client.post("/predict/?tile_size=512&tile_overlap=0.1", files=files)
+        
+        assert response.status_code == 200
+        assert response.json()["tiling"] == {"tile_size": 512, "overlap": 0.1, "tile_batch_size": None}
+        
+        response = self.client.post("/predict/?tile_overlap=1.5", files=files)
+        assert response.status_code == 422
+    
     @patch('app.detection_service')
     def test_predict_endpoint_invalid_file(self, mock_service):
         """Test prediction endpoint with invalid file"""
         mock_service.is_ready.return_value = True
         
-        async def mock_predict_single(file):
+        async def mock_predict_single(file, tiling=None, layout="objects", model_name=None, model_version=None):
             from fastapi import HTTPException
             raise HTTPException(status_code=400, detail="Invalid image format")
         
@@ -84,6 +187,44 @@ class TestAPI:
         
         assert response.status_code == 400
     
+    @patch('app.detection_service')
+    def test_predict_endpoint_rejects_oversized_request(self, mock_service):
+        """Test an upload over the size limit is refused from its Content-Length"""
+        files = {"file": ("big.jpg", b"\xff\xd8\xff" + b"\0" * (Config.MAX_FILE_SIZE_MB * 1024 * 1024 + 100_000), "image/jpeg")}
+        response = self.client.post("/predict/", files=files)
+        
+        assert response.status_code == 413
+        mock_service.predict_single.assert_not_called()
+    
+    @patch('app.job_manager')
+    def test_create_job_rejects_oversized_request(self, mock_manager):
+        """Test a job upload above JOB_MAX_UPLOAD_BYTES is refused before its body is read"""
+        limit = Config.get_upload_limits()["/jobs"]
+        assert limit == Config.JOB_MAX_UPLOAD_BYTES
+        
+        received = []
+        sent = []
+        
+        async def receive():
+            received.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        
+        async def send(message):
+            sent.append(message)
+        
+        scope = {
+            "type": "http", "method": "POST", "path": "/jobs", "query_string": b"",
+            "headers": [
+                (b"content-type", b"multipart/form-data; boundary=x"),
+                (b"content-length", str(limit + 1).encode())
+            ]
+        }
+        asyncio.run(app(scope, receive, send))
+        
+        assert sent[0]["status"] == 413
+        assert not received
+        mock_manager.submit_uploads.assert_not_called()
+    
     def test_predict_endpoint_no_file(self):
         """Test prediction endpoint without file"""
         response = self.client.post("/predict/")
@@ -95,7 +236,7 @@ class TestAPI:
         """Test batch prediction endpoint"""
         mock_service.is_ready.return_value = True
         
-        async def mock_predict_batch(files):
+        async def mock_predict_batch(files, tiling=None, layout="objects", model_name=None, model_version=None):
             return {
                 "batch_results": [{"filename": "test.jpg", "total_defects": 1}],
                 "summary": {"total_images": 1, "successful_predictions": 1}
@@ -119,7 +260,7 @@ class TestAPI:
         """Test batch prediction with too many files"""
         mock_service.is_ready.return_value = True
         
-        async def mock_predict_batch(files):
+        async def mock_predict_batch(files, tiling=None, layout="objects", model_name=None, model_version=None):
             from fastapi import HTTPException
             raise HTTPException(status_code=400, detail="Too many files")
         
@@ -133,6 +274,100 @@ class TestAPI:
         
         assert response.status_code == 400
     
+    @patch('app.detection_service')
+    def test_predict_batch_stream_ndjson(self, mock_service):
+        """Test streaming batch prediction as NDJSON"""
+        from src.utils.response_formatter import ResponseFormatter
+        
+        async def mock_stream():
+            yield {"filename": "test1.jpg", "index": 0, "total_defects": 1}
+            yield {"summary": {"total_images": 1, "successful_predictions": 1}}
+        
+        mock_service.predict_batch_stream.return_value = mock_stream()
+        mock_service.response_formatter = ResponseFormatter()
+        
+        files = [("files", ("test1.jpg", self.sample_image, "image/jpeg"))]
+        response = self.client.post("/predict/batch/stream", files=files)
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[0]["filename"] == "test1.jpg"
+        assert "summary" in lines[-1]
+    
+    @patch('app.detection_service')
+    def test_predict_batch_stream_sse(self, mock_service):
+        """Test streaming batch prediction as Server-Sent Events"""
+        from src.utils.response_formatter import ResponseFormatter
+        
+        async def mock_stream():
+            yield {"filename": "test1.jpg", "index": 0, "total_defects": 1}
+            yield {"summary": {"total_images": 1, "successful_predictions": 1}}
+        
+        mock_service.predict_batch_stream.return_value = mock_stream()
+        mock_service.response_formatter = ResponseFormatter()
+        
+        files = [("files", ("test1.jpg", self.sample_image, "image/jpeg"))]
+        response = self.client.post(
+            "/predict/batch/stream", files=files, headers={"Accept": "text/event-stream"}
+        )
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert "event: result" in response.text
+        assert "event: summary" in response.text
+    
+    def _mock_stream_service(self, mock_service):
+        """Configure a mocked service for the frame streaming endpoint"""
+        from src.utils.response_formatter import ResponseFormatter
+        
+        async def mock_predict_image_bytes(image_bytes, filename):
+            if image_bytes == b"slow":
+                await asyncio.sleep(60)
+            if image_bytes == b"bad":
+                raise HTTPException(status_code=400, detail="Invalid image file")
+            return {"predictions": [], "total_defects": 0}
+        
+        mock_service.is_ready.return_value = True
+        mock_service.predict_image_bytes.side_effect = mock_predict_image_bytes
+        mock_service.response_formatter = ResponseFormatter()
+    
+    @patch('app.detection_service')
+    def test_predict_stream_websocket(self, mock_service):
+        """Test frame streaming with credit-based flow control"""
+        self._mock_stream_service(mock_service)
+        
+        with self.client.websocket_connect("/ws/predict") as websocket:
+            assert websocket.receive_json() == {"type": "credit", "credits": Config.STREAM_CREDITS}
+            
+            websocket.send_bytes(self.sample_image)
+            websocket.send_bytes(b"bad")
+            messages = [websocket.receive_json() for _ in range(4)]
+        
+        results = {m["frame"]: m for m in messages if m["type"] in ("result", "error")}
+        assert results[0]["type"] == "result"
+        assert results[1]["type"] == "error"
+        assert results[1]["status_code"] == 400
+        assert sum(m["credits"] for m in messages if m["type"] == "credit") == 2
+    
+    @patch('app.detection_service')
+    def test_predict_stream_websocket_credit_violation(self, mock_service):
+        """Test that sending frames without credit closes the stream"""
+        from starlette.websockets import WebSocketDisconnect
+        self._mock_stream_service(mock_service)
+        
+        with patch.object(Config, "STREAM_CREDITS", 1):
+            with self.client.websocket_connect("/ws/predict") as websocket:
+                websocket.receive_json()
+                websocket.send_bytes(b"slow")
+                websocket.send_bytes(b"slow")
+                
+                with pytest.raises(WebSocketDisconnect) as exc_info:
+                    while True:
+                        websocket.receive_json()
+        
+        assert exc_info.value.code == 1008
+    
     @patch('app.detection_service')
     def test_info_endpoint(self, mock_service):
         """Test info endpoint"""
@@ -148,6 +383,107 @@ class TestAPI:
         assert "service_status" in data
         assert "model_info" in data
     
+    @patch('app.job_manager')
+    def test_create_job_endpoint(self, mock_manager):
+        """Test submitting an asynchronous job"""
+        async def mock_submit_uploads(files):
+            return {"job_id": "abc", "status": "queued", "total_images": len(files)}
+        
+        mock_manager.submit_uploads.side_effect = mock_submit_uploads
+        
+        files = [
+            ("files", ("test1.jpg", self.sample_image, "image/jpeg")),
+            ("files", ("test2.jpg", self.sample_image, "image/jpeg"))
+        ]
+        response = self.client.post("/jobs", files=files)
+        
+        assert response.status_code == 202
+        assert response.json() == {"job_id": "abc", "status": "queued", "total_images": 2}
+    
+    @patch('app.job_manager')
+    def test_create_job_accepts_more_than_1000_files(self, mock_manager):
+        """Test that a job is not capped by the multipart parser's default file limit"""
+        async def mock_submit_uploads(files):
+            return {"job_id": "abc", "status": "queued", "total_images": len(files)}
+        
+        mock_manager.submit_uploads.side_effect = mock_submit_uploads
+        
+        files = [("files", (f"board{i}.jpg", b"\xff\xd8\xff", "image/jpeg")) for i in range(1001)]
+        response = self.client.post("/jobs", files=files)
+        
+        assert response.status_code == 202
+        assert response.json()["total_images"] == 1001
+    
+    @patch('app.job_manager')
+    def test_create_job_with_directory(self, mock_manager):
+        """Test submitting a server-local directory as a form field"""
+        async def mock_submit_directory(directory):
+            return {"job_id": "abc", "status": "queued", "directory": directory}
+        
+        mock_manager.submit_directory.side_effect = mock_submit_directory
+        
+        response = self.client.post("/jobs", data={"directory": "data/line1"})
+        
+        assert response.status_code == 202
+        assert response.json()["directory"] == "data/line1"
+    
+    @patch('app.job_manager')
+    def test_create_job_requires_input(self, mock_manager):
+        """Test that a job needs files or a directory"""
+        response = self.client.post("/jobs", data={})
+        
+        assert response.status_code == 400
+    
+    @patch('app.job_manager')
+    def test_get_job_endpoint(self, mock_manager):
+        """Test polling job progress"""
+        async def mock_get_job(job_id, offset, limit):
+            return {"job_id": job_id, "status": "running", "offset": offset, "limit": limit}
+        
+        mock_manager.get_job.side_effect = mock_get_job
+        
+        response = self.client.get("/jobs/abc?offset=5&limit=10")
+        
+        assert response.status_code == 200
+        assert response.json() == {"job_id": "abc", "status": "running", "offset": 5, "limit": 10}
+    
+    def test_metrics_endpoint(self):
+        """Test Prometheus exposition with route-labelled request counters"""
+        self.client.get("/")
+        response = self.client.get("/metrics")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert "# TYPE defectnet_stage_duration_seconds histogram" in response.text
+        assert 'defectnet_http_requests_total{endpoint="/",method="GET",status="200"}' in response.text
+        assert "defectnet_http_requests_in_flight" in response.text
+    
+    def test_disconnect_cancels_prediction(self):
+        """Test that a client disconnect cancels the prediction and answers 499"""
+        request = Mock()
+        request.url.path = "/predict/"
+        cancelled = []
+        
+        async def receive():
+            return {"type": "http.disconnect"}
+        
+        async def prediction():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        
+        request.receive = receive
+        before = get_deadline_stats()["cancelled"]
+        
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(cancel_on_disconnect(request, prediction()))
+        
+        assert exc_info.value.status_code == 499
+        assert cancelled == [True]
+        assert get_deadline_stats()["cancelled"] == before + 1
+    
     def test_global_exception_handler(self):
         """Test global exception handler"""
         # Test with a route that doesn't exist to trigger 404, not 500
@@ -0,0 +1,186 @@
+import pytest
+import numpy as np
+
+from src.models import backends
+from src.models.backends import (
+    MOCK_DETECTIONS, InferenceBackend, MockBackend, OnnxRuntimeBackend, create_backend, letterbox_batch,
+    onnx_model_path, resize_bilinear, share_model
+)
+from src.models.yolo_model import YOLOModel
+from src.utils.buffer_pool import BufferPool
+
+class FakeSession:
+    """Stands in for an onnxruntime.InferenceSession returning one fixed candidate per image"""
+    
+    def __init__(self):
+        self.batches = []
+    
+    def run(self, output_names, feeds):
+        batch = feeds["images"]
+        self.batches.append(batch.shape)
+        raw = np.zeros((batch.shape[0], 1, 11), dtype=np.float32)
+        # Centre (320, 320), 100 x 60 box, objectness 0.9, class 2 at 0.9
+        raw[:, 0, :5] = [320, 320, 100, 60, 0.9]
+        raw[:, 0, 7] = 0.9
+        return [raw]
+
+def write_tiny_yolov5(path):
+    """Write a YOLOv5-shaped ONNX model emitting the FakeSession candidate for every image"""
+    pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper, save
+    
+    candidate = np.zeros((1, 1, 11), dtype=np.float32)
+    candidate[0, 0, :5] = [320, 320, 100, 60, 0.9]
+    candidate[0, 0, 7] = 0.9
+    nodes = [
+        helper.make_node("ReduceMean", ["images"], ["mean"], axes=[1, 2, 3], keepdims=0),
+        helper.make_node("Unsqueeze", ["mean", "axes"], ["per_image"]),
+        helper.make_node("Mul", ["per_image", "zero"], ["zeros"]),
+        helper.make_node("Add", ["zeros", "candidate"], ["output0"])
+    ]
+    graph = helper.make_graph(
+        nodes, "tiny_yolov5",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["batch", 3, 640, 640])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, ["batch", 1, 11])],
+        initializer=[
+            numpy_helper.from_array(np.array([1, 2], dtype=np.int64), "axes"),
+            numpy_helper.from_array(np.array(0, dtype=np.float32), "zero"),
+            numpy_helper.from_array(candidate, "candidate")
+        ]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    helper.set_model_props(model, {"names": str({i: f"class_{i}" for i in range(6)})})
+    save(model, str(path))
+
+class TestBackends:
+    """Test inference backends"""
+    
+    def test_resize_bilinear(self):
+        """Test bilinear resizing keeps flat images flat and matches the target shape"""
+        image = np.full((40, 80, 3), 200, dtype=np.uint8)
+        
+        resized = resize_bilinear(image, 20, 10)
+        
+        assert resized.shape == (10, 20, 3)
+        assert np.allclose(resized, 200)
+    
+    def test_letterbox_batch(self):
+        """Test letterboxing into a normalised NCHW batch"""
+        square = np.full((64, 64, 3), 255, dtype=np.uint8)
+        wide = np.full((32, 128, 3), 255, dtype=np.uint8)
+        
+        batch, geometry = letterbox_batch([square, wide], 64)
+        
+        assert batch.shape == (2, 3, 64, 64)
+        assert batch.dtype == np.float32
+        assert np.allclose(batch[0], 1.0)
+        assert geometry[0] == (1.0, 0, 0)
+        assert geometry[1] == (0.5, 0, 24)
+        assert np.allclose(batch[1, :, 24:40], 1.0)
+        assert np.allclose(batch[1, :, :24], 114 / 255)
+    
+    def test_mock_backend_through_model(self):
+        """Test YOLOModel runs a batch through the default mock backend"""
+        model = YOLOModel({"name": "yolov5s", "confidence_threshold": 0.5, "image_size": 640})
+        images = [np.zeros((640, 640, 3), dtype=np.uint8)] * 3
+        
+        predictions = model.predict_batch(images)
+        
+        assert isinstance(model.model, MockBackend)
+        assert len(predictions) == 3
+        assert np.array_equal(predictions[0]["results"].xyxy[0], MOCK_DETECTIONS)
+        assert model.get_model_info()["backend"] == "mock"
+    
+    def test_onnx_backend_maps_boxes_to_image(self):
+        """Test ONNX outputs are decoded and mapped back through the letterbox"""
+        backend = OnnxRuntimeBackend.__new__(OnnxRuntimeBackend)
+        backend.session = FakeSession()
+        backend.input_name = "images"
+        backend.batch_size = 1
+        backend.image_size = 640
+        backend.conf_threshold = 0.25
+        backend.iou_threshold = 0.45
+        backend.max_detections = 300
+        backend.buffer_pool = BufferPool()
+        
+        image = np.zeros((320, 1280, 3), dtype=np.uint8)
+        detections = backend.predict([image, image])
+        backend.predict([image, image])
+        
+        # A fixed batch dimension of 1 runs the batch one image at a time
+        assert backend.session.batches[:2] == [(1, 3, 640, 640), (1, 3, 640, 640)]
+        # The input tensor is reused from the pool on the second call
+        assert backend.buffer_pool.get_stats()["hits"] == 1
+        assert backend.buffer_pool.get_stats()["in_use_bytes"] == 0
+        assert len(detections) == 2
+        # Scale 0.5 and 240 px of vertical padding
+        assert np.allclose(detections[0], [[540, 100, 740, 220, 0.81, 2]], atol=1e-4)
+    
+    def test_onnx_backend_close_drops_session_and_shared_bytes(self):
+        """Test closing an ONNX backend releases what it holds so unloading frees memory"""
+        backend = OnnxRuntimeBackend.__new__(OnnxRuntimeBackend)
+        backend.session = FakeSession()
+        backend.model_path = "models/shared.onnx"
+        backend.shared_weights = True
+        backends._shared_models["models/shared.onnx"] = b"ort"
+        
+        backend.close()
+        
+        assert backend.session is None
+        assert "models/shared.onnx" not in backends._shared_models
+    
+    def test_onnx_runtime_session(self, tmp_path):
+        """Test the ONNX Runtime path end to end, with and without shared model bytes"""
+        pytest.importorskip("onnxruntime")
+        path = str(tmp_path / "tiny.onnx")
+        write_tiny_yolov5(path)
+        image = np.zeros((320, 1280, 3), dtype=np.uint8)
+        
+        backend = OnnxRuntimeBackend(path)
+        detections = backend.predict([image, image])
+        
+        assert backend.batch_size is None and backend.image_size == 640
+        assert backend.class_names[2] == "class_2"
+        assert len(detections) == 2
+        assert np.allclose(detections[1], [[540, 100, 740, 220, 0.81, 2]], atol=1e-4)
+        
+        share_model(path)
+        shared = OnnxRuntimeBackend(path)
+        assert shared.get_info()["shared_weights"] is True
+        assert np.allclose(shared.predict([image])[0], detections[0], atol=1e-4)
+        
+        shared.close()
+        backend.close()
+        assert shared.session is None
+        assert path not in backends._shared_models
+    
+    def test_incomplete_backend_fails_on_creation(self):
+        """Test a backend without predict cannot be instantiated"""
+        class Incomplete(InferenceBackend):
+            name = "incomplete"
+        
+        with pytest.raises(TypeError):
+            Incomplete()
+    
+    def test_onnx_model_path(self):
+        """Test MODEL_PATH selects the served ONNX file when it names one"""
+        config = {"path": "models/trained_model.pt", "onnx_path": "models/trained_model.onnx"}
+        
+        assert onnx_model_path(config) == "models/trained_model.onnx"
+        assert onnx_model_path(dict(config, path="models/trained_model.int8.onnx")) == "models/trained_model.int8.onnx"
+    
+    def test_unknown_backend(self):
+        """Test an unknown backend name is rejected"""
+        with pytest.raises(ValueError):
+            create_backend({"backend": "tensorrt"})
+    
+    def test_onnx_backend_requires_onnxruntime(self):
+        """Test a clear error when onnxruntime is not installed"""
+        try:
+            import onnxruntime  # noqa: F401
+        except ImportError:
+            with pytest.raises(RuntimeError, match="onnxruntime"):
+                create_backend({"backend": "onnx", "onnx_path": "missing.onnx"})
+        else:
+            pytest.skip("onnxruntime is installed")
@@ -0,0 +1,175 @@
+import pytest
+import asyncio
+from fastapi import HTTPException
+
+from src.services.admission import PRIORITY_BATCH, request_priority
+from src.services.batch_scheduler import MicroBatchScheduler
+from src.utils.deadline import DeadlineExceeded, request_deadline
+
+class TestMicroBatchScheduler:
+    """Test request coalescing in the micro-batching scheduler"""
+    
+    def setup_method(self):
+        """Setup test fixtures"""
+        self.calls = []
+    
+    def _predict_batch(self, images):
+        """Record each forward pass and echo the inputs back"""
+        self.calls.append(list(images))
+        return [{"results": image, "batch_size": len(images)} for image in images]
+    
+    def test_concurrent_requests_are_coalesced(self):
+        """Test that concurrent submissions share one forward pass"""
+        scheduler = MicroBatchScheduler(self._predict_batch, max_batch_size=8, max_wait_ms=20)
+        
+        async def run():
+            return await asyncio.gather(*(scheduler.submit(i) for i in range(5)))
+        
+        results = asyncio.run(run())
+        
+        assert [r["results"] for r in results] == [0, 1, 2, 3, 4]
+        assert len(self.calls) == 1
+        assert all(r["batch_size"] == 5 for r in results)
+    
+    def test_batches_respect_max_batch_size(self):
+        """Test that large bursts are split into max_batch_size batches"""
+        scheduler = MicroBatchScheduler(self._predict_batch, max_batch_size=3, max_wait_ms=20)
+        
+        async def run():
+            return await asyncio.gather(*(scheduler.submit(i) for i in range(7)))
+        
+        results = asyncio.run(run())
+        
+        assert [r["results"] for r in results] == list(range(7))
+        assert [len(c) for c in self.calls] == [3, 3, 1]
+        
+        stats = scheduler.get_stats()
+        assert stats["batches_run"] == 3
+        assert stats["requests_processed"] == 7
+        assert stats["max_batch_size_seen"] == 3
+    
+    def test_keyed_requests_are_batched_per_key(self):
+        """Test that requests for different models never share a forward pass"""
+        keys = []
+        
+        def predict(images, key):
+            keys.append(key)
+            return self._predict_batch(images)
+        
+        scheduler = MicroBatchScheduler(predict, max_batch_size=8, max_wait_ms=20)
+        
+        async def run():
+            return await asyncio.gather(*(scheduler.submit(i, "ab"[i % 2]) for i in range(6)))
+        
+        results = asyncio.run(run())
+        
+        assert [r["results"] for r in results] == list(range(6))
+        assert sorted(zip(keys, self.calls)) == [("a", [0, 2, 4]), ("b", [1, 3, 5])]
+    
+    def test_single_image_is_dispatched_ahead_of_batch_work(self):
+        """Test that an interactive request queued behind batch work gets the next forward pass"""
+        async def predict(images):
+            await asyncio.sleep(0.05)
+            return self._predict_batch(images)
+        
+        scheduler = MicroBatchScheduler(predict, max_batch_size=2, max_wait_ms=1)
+        
+        async def batch_item(i):
+            with request_priority(PRIORITY_BATCH):
+                return await scheduler.submit(i)
+        
+        async def run():
+            # The first batch holds the only in-flight slot while the rest queue up
+            first = asyncio.ensure_future(scheduler.submit("first"))
+            await asyncio.sleep(0.01)
+            queued = [asyncio.ensure_future(batch_item(i)) for i in range(4)]
+            await asyncio.sleep(0.01)
+            single = asyncio.ensure_future(scheduler.submit("single"))
+            await asyncio.gather(first, single, *queued)
+        
+        asyncio.run(run())
+        
+        assert self.calls[0] == ["first"]
+        assert self.calls[1] == ["single"]
+        assert self.calls[2:] == [[0, 1], [2, 3]]
+    
+    def test_queue_full_rejects_request(self):
+        """Test that submissions beyond the queue depth are rejected with 503"""
+        scheduler = MicroBatchScheduler(self._predict_batch, max_batch_size=1, max_queue_depth=2)
+        
+        async def run():
+            pending = [asyncio.ensure_future(scheduler.submit(i)) for i in range(2)]
+            await asyncio.sleep(0)
+            try:
+                await scheduler.submit(99)
+            finally:
+                await asyncio.gather(*pending)
+        
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(run())
+        
+        assert exc_info.value.status_code == 503
+        assert scheduler.get_stats()["requests_rejected"] == 1
+    
+    def test_expired_and_cancelled_requests_skip_the_forward_pass(self):
+        """Test that requests past their deadline or abandoned by their caller are not inferred"""
+        scheduler = MicroBatchScheduler(self._predict_batch, max_batch_size=8, max_wait_ms=20)
+        
+        async def expiring(i):
+            with request_deadline(0.001):
+                return await scheduler.submit(i)
+        
+        async def run():
+            abandoned = asyncio.ensure_future(scheduler.submit(2))
+            waiting = asyncio.gather(scheduler.submit(0), expiring(1), return_exceptions=True)
+            await asyncio.sleep(0)
+            abandoned.cancel()
+            return await waiting
+        
+        results = asyncio.run(run())
+        
+        assert results[0]["results"] == 0
+        assert isinstance(results[1], DeadlineExceeded)
+        assert self.calls == [[0]]
+        assert scheduler.get_stats()["requests_expired"] == 1
+    
+    def test_inference_failure_propagates_to_callers(self):
+        """Test that a failed forward pass raises in every waiting caller"""
+        def failing_predict(images):
+            raise RuntimeError("model exploded")
+        
+        scheduler = MicroBatchScheduler(failing_predict, max_wait_ms=10)
+        
+        async def run():
+            return await asyncio.gather(
+                *(scheduler.submit(i) for i in range(3)), return_exceptions=True
+            )
+        
+        results = asyncio.run(run())
+        
+        assert all(isinstance(r, RuntimeError) for r in results)
+    
+    def test_requests_fail_when_the_worker_dies(self):
+        """Test that queued requests are failed, not left waiting, when the batching worker dies"""
+        scheduler = MicroBatchScheduler(self._predict_batch, max_batch_size=2, max_wait_ms=20)
+        collect_batch = scheduler._collect_batch
+        
+        async def broken_collect():
+            await collect_batch()
+            raise ValueError("collector bug")
+        
+        async def run():
+            scheduler._collect_batch = broken_collect
+            failed = await asyncio.wait_for(
+                asyncio.gather(*(scheduler.submit(i) for i in range(3)), return_exceptions=True), timeout=2
+            )
+            # The next request starts a fresh worker
+            scheduler._collect_batch = collect_batch
+            return failed, await asyncio.wait_for(scheduler.submit(9), timeout=2)
+        
+        failed, result = asyncio.run(run())
+        
+        assert all(isinstance(r, RuntimeError) for r in failed)
+        assert "collector bug" in str(failed[0])
+        assert result["results"] == 9
+        assert self.calls == [[9]]
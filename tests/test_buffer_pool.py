@@ -0,0 +1,75 @@
+import gc
+import pickle
+
+import numpy as np
+
+from src.utils.buffer_pool import BufferPool, MIN_BUCKET_BYTES, bucket_size
+
+class TestBufferPool:
+    """Test the preprocessing buffer pool"""
+    
+    def setup_method(self):
+        """Set up a small pool"""
+        self.pool = BufferPool(max_bytes=16 * 1024 * 1024, max_buffer_bytes=4 * 1024 * 1024)
+    
+    def test_bucket_size(self):
+        """Test requests round up to at most a quarter more than asked for"""
+        assert bucket_size(1) == MIN_BUCKET_BYTES
+        assert bucket_size(640 * 640 * 4) == 1835008
+        for nbytes in (70_000, 1_000_001, 5_000_000):
+            assert nbytes <= bucket_size(nbytes) <= nbytes * 1.25
+    
+    def test_acquire_and_reuse(self):
+        """Test released buffers are handed out again for same-bucket requests"""
+        first = self.pool.acquire((640, 640, 4))
+        assert first.shape == (640, 640, 4) and first.dtype == np.uint8
+        self.pool.release(first[..., :3])
+        
+        second = self.pool.acquire((640, 640), np.float32)
+        stats = self.pool.get_stats()
+        
+        assert second.dtype == np.float32 and second.flags.c_contiguous
+        assert np.shares_memory(first, second)
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["in_use_bytes"] == stats["peak_in_use_bytes"] == bucket_size(640 * 640 * 4)
+    
+    def test_release_ignores_foreign_arrays(self):
+        """Test arrays the pool did not lend (or already took back) are ignored"""
+        borrowed = self.pool.acquire((100, 100))
+        self.pool.release(np.zeros((100, 100)))
+        self.pool.release(borrowed)
+        self.pool.release(borrowed)
+        
+        stats = self.pool.get_stats()
+        assert stats["in_use_buffers"] == 0
+        assert stats["pooled_buffers"] == 1
+    
+    def test_limits(self):
+        """Test oversized requests bypass the pool and idle buffers stay within budget"""
+        self.pool.acquire((8 * 1024 * 1024,))
+        assert self.pool.get_stats()["unpooled"] == 1
+        
+        buffers = [self.pool.acquire((3 * 1024 * 1024,)) for _ in range(8)]
+        for buffer in buffers:
+            self.pool.release(buffer)
+        assert self.pool.get_stats()["pooled_bytes"] <= 16 * 1024 * 1024
+    
+    def test_dropped_buffers_are_forgotten(self):
+        """Test a buffer that is never released stops counting as in use once collected"""
+        self.pool.acquire((1000,))
+        gc.collect()
+        
+        stats = self.pool.get_stats()
+        assert stats["in_use_bytes"] == 0
+        assert stats["dropped"] == 1
+    
+    def test_pickled_pool_does_not_pool(self):
+        """Test a copy sent to a worker process allocates without pooling"""
+        copy = pickle.loads(pickle.dumps(self.pool))
+        
+        array = copy.acquire((10, 10))
+        
+        assert not copy.enabled
+        assert array.shape == (10, 10)
+        assert copy.get_stats()["unpooled"] == 1
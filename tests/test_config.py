@@ -32,6 +32,22 @@ class TestConfig:
         assert config["max_batch_size"] == 10
         assert config["max_file_size_mb"] == 50
     
+    def test_batching_config(self):
+        """Test micro-batching configuration retrieval"""
+        config = Config.get_batching_config()
+        
+        assert config["max_batch_size"] >= 1
+        assert config["max_wait_ms"] >= 0
+        assert config["max_queue_depth"] >= config["max_batch_size"]
+    
+    def test_executor_config(self):
+        """Test executor configuration retrieval"""
+        config = Config.get_executor_config()
+        
+        assert config["kind"] in ("thread", "process")
+        assert config["pool_sizes"]["decode"] >= 1
+        assert config["pool_sizes"]["inference"] >= 1
+    
     def test_environment_variables(self):
         """Test environment variable handling"""
         original_log_level = os.environ.get("LOG_LEVEL")
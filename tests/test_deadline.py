@@ -0,0 +1,144 @@
+import pytest
+import asyncio
+import io
+import time
+from unittest.mock import patch
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from config import Config
+from src.services.defect_detection_service import DefectDetectionService
+from src.utils.deadline import (
+    DeadlineExceeded, check_deadline, current_deadline, get_deadline_stats, request_deadline, within_deadline
+)
+
+class TestRequestDeadline:
+    """Test deadline propagation through the request context"""
+    
+    def test_nested_deadline_keeps_the_earlier_one(self):
+        """Test that an inner scope cannot extend an enclosing deadline"""
+        assert current_deadline() is None
+        with request_deadline(1.0) as outer:
+            with request_deadline(60.0) as inner:
+                assert inner == outer
+            with request_deadline(0.5) as inner:
+                assert inner < outer
+            assert current_deadline() == outer
+        assert current_deadline() is None
+    
+    def test_deadline_follows_tasks(self):
+        """Test that tasks started within a request inherit its deadline"""
+        async def run():
+            with request_deadline(5.0) as deadline:
+                seen = await asyncio.ensure_future(asyncio.sleep(0, current_deadline()))
+            return deadline, seen
+        
+        deadline, seen = asyncio.run(run())
+        assert seen == deadline
+    
+    def test_check_deadline_counts_expired_stages(self):
+        """Test that an expired deadline raises and is counted per stage"""
+        before = get_deadline_stats()["exceeded"].get("decode", 0)
+        
+        check_deadline("decode")
+        with request_deadline(-1):
+            with pytest.raises(DeadlineExceeded) as exc_info:
+                check_deadline("decode")
+        
+        assert exc_info.value.stage == "decode"
+        assert "decode" in str(exc_info.value)
+        assert get_deadline_stats()["exceeded"]["decode"] == before + 1
+    
+    def test_within_deadline_stops_waiting_for_slow_work(self):
+        """Test that a stage still running at the deadline is abandoned with DeadlineExceeded"""
+        async def run():
+            slow = asyncio.ensure_future(asyncio.sleep(5, "late"))
+            with request_deadline(0.05):
+                fast = await within_deadline(asyncio.sleep(0, "on time"), "inference")
+                with pytest.raises(DeadlineExceeded) as exc_info:
+                    await within_deadline(slow, "inference")
+            await asyncio.sleep(0)
+            return exc_info.value, slow.cancelled(), fast
+        
+        start = time.monotonic()
+        error, cancelled, fast = asyncio.run(run())
+        
+        assert time.monotonic() - start < 1
+        assert error.stage == "inference"
+        assert cancelled
+        assert fast == "on time"
+
+class TestServiceDeadlines:
+    """Test deadline enforcement on the detection service"""
+    
+    def setup_method(self):
+        """Setup test fixtures"""
+        image_bytes = io.BytesIO()
+        Image.new("RGB", (64, 64), color="green").save(image_bytes, format="PNG")
+        self.image_bytes = image_bytes.getvalue()
+        self.service = DefectDetectionService()
+    
+    def teardown_method(self):
+        self.service.shutdown()
+    
+    def test_expired_request_is_dropped_with_504(self):
+        """Test that a request past its deadline never reaches decode or inference"""
+        async def run():
+            with request_deadline(-1):
+                await self.service.predict_image_bytes(self.image_bytes, "late.png")
+        
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(run())
+        
+        assert exc_info.value.status_code == 504
+        info = self.service.get_service_info()
+        assert info["executor"]["stages"]["decode"]["completed"] == 0
+        assert info["batching"]["requests_processed"] == 0
+        assert info["deadlines"]["exceeded"]["decode"] >= 1
+    
+    def test_expired_batch_images_fail_individually(self):
+        """Test that batch images dropped at their deadline are reported as 504 errors"""
+        upload = UploadFile(file=io.BytesIO(self.image_bytes), filename="late.png")
+        
+        async def run():
+            with request_deadline(-1):
+                return await self.service.predict_batch([upload])
+        
+        response = asyncio.run(run())
+        
+        assert response["batch_results"][0]["error"].startswith("504")
+        assert response["summary"]["failed_predictions"] == 1
+    
+    def test_request_within_deadline_completes(self):
+        """Test that the configured deadline leaves normal requests alone"""
+        start = time.monotonic()
+        response = asyncio.run(self.service.predict_image_bytes(self.image_bytes, "board.png"))
+        
+        assert response["total_defects"] >= 0
+        assert time.monotonic() - start < 5
+    
+    def test_slow_inference_answered_at_the_deadline(self):
+        """Test that a forward pass running past the deadline does not hold the response"""
+        self.service.model.model.latency = 1.0
+        before = get_deadline_stats()["exceeded"].get("inference", 0)
+        
+        start = time.monotonic()
+        with patch.object(Config, "INFERENCE_TIMEOUT", 0.2):
+            with pytest.raises(HTTPException) as exc_info:
+                asyncio.run(self.service.predict_image_bytes(self.image_bytes, "slow.png"))
+        
+        assert exc_info.value.status_code == 504
+        assert time.monotonic() - start < 0.8
+        assert get_deadline_stats()["exceeded"]["inference"] == before + 1
+    
+    def test_slow_batch_inference_fails_at_the_deadline(self):
+        """Test that batch images still in a forward pass at the deadline fail with 504"""
+        self.service.model.model.latency = 1.0
+        upload = UploadFile(file=io.BytesIO(self.image_bytes), filename="slow.png")
+        
+        start = time.monotonic()
+        with patch.object(Config, "INFERENCE_TIMEOUT", 0.2):
+            response = asyncio.run(self.service.predict_batch([upload]))
+        
+        assert time.monotonic() - start < 0.8
+        assert response["batch_results"][0]["error"].startswith("504")
@@ -0,0 +1,77 @@
+import pytest
+import numpy as np
+
+from src.utils.evaluation import average_precision, evaluate_detections, load_yolo_labels, match_detections
+from quantize_model import compare_models, format_report
+
+CLASSES = ['missing_hole', 'mouse_bite', 'open_circuit', 'short', 'spur', 'spurious_copper']
+
+class TestEvaluation:
+    """Test detection accuracy metrics"""
+    
+    def setup_method(self):
+        """Set up one image with two labelled defects"""
+        self.labels = np.array([
+            [0, 10, 10, 50, 50],
+            [4, 100, 100, 140, 160]
+        ], dtype=np.float64)
+    
+    def test_load_yolo_labels(self, tmp_path):
+        """Test YOLO label rows are converted to pixel xyxy"""
+        label_path = tmp_path / "board.txt"
+        label_path.write_text("2 0.5 0.25 0.2 0.1\n")
+        
+        labels = load_yolo_labels(str(label_path), 640, 640)
+        
+        assert np.allclose(labels, [[2, 256, 128, 384, 192]])
+        assert load_yolo_labels(str(tmp_path / "missing.txt"), 640, 640).shape == (0, 5)
+    
+    def test_match_detections(self):
+        """Test greedy matching by class and IoU, with duplicates counted as false positives"""
+        detections = np.array([
+            [10, 10, 50, 50, 0.9, 0],
+            [12, 10, 50, 50, 0.8, 0],   # duplicate of the first box
+            [100, 100, 140, 160, 0.7, 1]  # right place, wrong class
+        ])
+        
+        correct = match_detections(detections, self.labels)
+        
+        assert correct.shape == (3, 10)
+        assert correct[0].all()
+        assert not correct[1].any()
+        assert not correct[2].any()
+    
+    def test_average_precision(self):
+        """Test AP of a perfect and a half-recall PR curve"""
+        assert average_precision(np.array([0.5, 1.0]), np.array([1.0, 1.0])) == pytest.approx(1.0)
+        assert average_precision(np.array([0.5]), np.array([1.0])) == pytest.approx(0.505, abs=0.01)
+    
+    def test_evaluate_detections(self):
+        """Test per-class AP and mAP over labelled classes only"""
+        detections = np.array([
+            [10, 10, 50, 50, 0.9, 0],
+            [300, 300, 340, 340, 0.6, 4]  # misses the spur
+        ])
+        
+        result = evaluate_detections([detections], [self.labels], CLASSES)
+        
+        assert result["per_class"]["missing_hole"]["ap50"] == pytest.approx(1.0)
+        assert result["per_class"]["spur"]["ap50"] == 0.0
+        assert result["per_class"]["short"]["ap50"] is None
+        assert result["map50"] == pytest.approx(0.5)
+    
+    def test_quantization_report(self):
+        """Test the FP32 vs INT8 comparison and its Markdown rendering"""
+        per_class = {name: {"labels": 1, "detections": 1, "ap50": 0.9, "ap50_95": 0.6} for name in CLASSES}
+        fp32 = {"size_mb": 28.0, "latency_ms": {"p50": 40.0, "p95": 50.0}, "throughput_ips": 30.0,
+                "map50": 0.9, "map50_95": 0.6, "per_class": per_class}
+        int8 = dict(fp32, size_mb=7.0, latency_ms={"p50": 20.0, "p95": 25.0}, throughput_ips=60.0, map50=0.88)
+        
+        change = compare_models(fp32, int8)
+        markdown = format_report({"mode": "static", "images": 10, "batch_size": 8,
+                                  "fp32": fp32, "int8": int8, "change": change})
+        
+        assert change["size_change_pct"] == -75.0
+        assert change["throughput_change_pct"] == 100.0
+        assert change["map50_delta"] == pytest.approx(-0.02)
+        assert "| spurious_copper | 1 | 0.9 | 0.9 |" in markdown
@@ -0,0 +1,134 @@
+import pytest
+import asyncio
+import time
+from fastapi import HTTPException
+
+from src.services.admission import PRIORITY_BATCH, request_priority
+from src.services.executor import StageExecutor
+from src.utils.deadline import DeadlineExceeded, get_deadline_stats, request_deadline
+from src.utils.image_processor import ImageProcessor
+
+class TestStageExecutor:
+    """Test the executor layer for CPU-bound pipeline stages"""
+    
+    def test_thread_pool_runs_stage(self):
+        """Test running a function on a thread pool stage"""
+        executor = StageExecutor(kind="thread", pool_sizes={"decode": 2})
+        
+        try:
+            result = asyncio.run(executor.run("decode", pow, 2, 10))
+        finally:
+            executor.shutdown()
+        
+        assert result == 1024
+        assert executor.get_stats()["stages"]["decode"]["completed"] == 1
+    
+    def test_blocking_stage_does_not_block_event_loop(self):
+        """Test that the event loop keeps serving while a stage blocks"""
+        executor = StageExecutor(kind="thread", pool_sizes={"inference": 1})
+        ticks = []
+        
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+        
+        async def run():
+            await asyncio.gather(executor.run("inference", time.sleep, 0.2), ticker())
+        
+        try:
+            asyncio.run(run())
+        finally:
+            executor.shutdown()
+        
+        assert len(ticks) == 5
+        assert ticks[-1] - ticks[0] < 0.15
+    
+    def test_process_pool_propagates_http_exception(self):
+        """Test that HTTPException raised in a worker process reaches the caller"""
+        executor = StageExecutor(kind="process", pool_sizes={"decode": 1})
+        processor = ImageProcessor(max_size_mb=1)
+        
+        try:
+            with pytest.raises(HTTPException) as exc_info:
+                asyncio.run(executor.run("decode", processor.validate_image, b""))
+        finally:
+            executor.shutdown()
+        
+        assert exc_info.value.status_code == 400
+        assert executor.get_stats()["stages"]["decode"]["failed"] == 1
+    
+    def test_work_queued_past_its_deadline_is_dropped(self):
+        """Test that work waiting for a busy worker does not run once its deadline has passed"""
+        executor = StageExecutor(kind="thread", pool_sizes={"inference": 1})
+        calls = []
+        
+        async def late():
+            with request_deadline(0.05):
+                return await executor.run("inference", calls.append, "late")
+        
+        async def run():
+            return await asyncio.gather(
+                executor.run("inference", time.sleep, 0.2), late(), return_exceptions=True
+            )
+        
+        before = get_deadline_stats()["exceeded"].get("inference", 0)
+        try:
+            results = asyncio.run(run())
+        finally:
+            executor.shutdown()
+        
+        assert isinstance(results[1], DeadlineExceeded)
+        assert calls == []
+        assert get_deadline_stats()["exceeded"]["inference"] == before + 1
+    
+    def test_interactive_work_runs_ahead_of_queued_batch_work(self):
+        """Test that a single image queued behind batch chunks is served as soon as a worker frees up"""
+        executor = StageExecutor(kind="thread", pool_sizes={"inference": 1})
+        order = []
+        
+        async def batch_chunk(i):
+            with request_priority(PRIORITY_BATCH):
+                await executor.run("inference", order.append, f"chunk-{i}")
+        
+        async def run():
+            blocker = asyncio.ensure_future(executor.run("inference", time.sleep, 0.1))
+            await asyncio.sleep(0.01)
+            chunks = [asyncio.ensure_future(batch_chunk(i)) for i in range(3)]
+            await asyncio.sleep(0.01)
+            single = asyncio.ensure_future(executor.run("inference", order.append, "single"))
+            await asyncio.sleep(0.01)
+            waiting = executor.get_stats()["stages"]["inference"]["waiting"]
+            await asyncio.gather(blocker, single, *chunks)
+            return waiting
+        
+        try:
+            waiting = asyncio.run(run())
+        finally:
+            executor.shutdown()
+        
+        assert waiting == 4
+        assert order == ["single", "chunk-0", "chunk-1", "chunk-2"]
+    
+    def test_process_pool_checks_the_deadline(self):
+        """Test that an expired deadline is also enforced in a worker process"""
+        executor = StageExecutor(kind="process", pool_sizes={"decode": 1})
+        
+        async def run():
+            with request_deadline(-1):
+                return await executor.run("decode", pow, 2, 2)
+        
+        try:
+            with pytest.raises(DeadlineExceeded):
+                asyncio.run(run())
+        finally:
+            executor.shutdown()
+    
+    def test_unknown_stage_and_kind(self):
+        """Test validation of executor kind and stage names"""
+        with pytest.raises(ValueError):
+            StageExecutor(kind="fiber")
+        
+        executor = StageExecutor(kind="thread", pool_sizes={"decode": 1})
+        with pytest.raises(ValueError):
+            asyncio.run(executor.run("format", pow, 2, 2))
@@ -2,6 +2,7 @@ import pytest
 import numpy as np
 from PIL import Image
 import io
+from unittest.mock import patch
 from fastapi import HTTPException
 
 from src.utils.image_processor import ImageProcessor
@@ -72,6 +73,139 @@ class TestImageProcessor:
         assert result.shape[2] == 3  # Converted to RGB
         assert result.dtype == np.uint8
     
+    def test_decode_image_matches_pillow(self):
+        """Test single-pass decode against a plain Pillow decode"""
+        pixels = np.random.randint(0, 255, (30, 40, 3), dtype=np.uint8)
+        img_bytes = io.BytesIO()
+        Image.fromarray(pixels).save(img_bytes, format='PNG')
+        
+        result = self.processor.decode_image(img_bytes.getvalue())
+        
+        assert result.shape == (30, 40, 3)
+        assert result.dtype == np.uint8
+        assert np.array_equal(result, pixels)
+    
+    def test_decode_image_reuses_buffer(self):
+        """Test decoding into a caller-supplied buffer"""
+        buffer = np.zeros(100 * 100 * 4 + 16, dtype=np.uint8)
+        
+        result = self.processor.decode_image(self.sample_image, out=buffer)
+        
+        assert result.shape == (100, 100, 3)
+        assert np.shares_memory(result, buffer)
+        assert result[50, 50, 0] > 200  # red sample image
+    
+    def test_decode_image_rgb_is_decoded_in_place(self):
+        """Test that RGB images skip the copying fallback (guards the Pillow pin)"""
+        buffer = np.zeros(100 * 100 * 4, dtype=np.uint8)
+        copying = AssertionError("RGB pixels were copied instead of decoded in place")
+        
+        with patch.object(Image.Image, "tobytes", side_effect=copying):
+            result = self.processor.decode_image(self.sample_image, out=buffer)
+        
+        assert np.shares_memory(result, buffer)
+        assert result[50, 50, 0] > 200
+    
+    def test_decode_image_grayscale_into_buffer(self):
+        """Test that non-RGB images are converted while decoding"""
+        gray_image = Image.new('L', (20, 10), color=128)
+        img_bytes = io.BytesIO()
+        gray_image.save(img_bytes, format='PNG')
+        
+        result = self.processor.decode_image(img_bytes.getvalue())
+        
+        assert result.shape == (10, 20, 3)
+        assert np.all(result == 128)
+    
+    def test_decode_image_unsupported_format(self):
+        """Test rejection of formats outside the allowed list"""
+        gif_image = Image.new('P', (10, 10))
+        img_bytes = io.BytesIO()
+        gif_image.save(img_bytes, format='GIF')
+        
+        with pytest.raises(HTTPException) as exc_info:
+            self.processor.decode_image(img_bytes.getvalue())
+        
+        assert exc_info.value.status_code == 400
+    
+    def test_decode_image_pixel_limit(self):
+        """Test that the pixel-count limit is enforced from the header"""
+        processor = ImageProcessor(max_size_mb=1, max_pixels=50 * 50)
+        
+        with pytest.raises(HTTPException) as exc_info:
+            processor.decode_image(self.sample_image)
+        
+        assert exc_info.value.status_code == 413
+    
+    def test_decode_for_model_letterbox(self):
+        """Test decoding straight to a letterboxed model input"""
+        image = Image.new('RGB', (200, 100), color=(0, 255, 0))
+        img_bytes = io.BytesIO()
+        image.save(img_bytes, format='PNG')
+        
+        model_input, letterbox = self.processor.decode_for_model(img_bytes.getvalue(), target_size=640)
+        
+        assert model_input.shape == (640, 640, 3)
+        assert letterbox["scale"] == pytest.approx(3.2)
+        assert (letterbox["pad_x"], letterbox["pad_y"]) == (0, 160)
+        assert (letterbox["original_width"], letterbox["original_height"]) == (200, 100)
+        assert np.all(model_input[0, 0] == 114)  # padding
+        assert tuple(model_input[320, 320]) == (0, 255, 0)
+    
+    def test_decode_for_model_downscales_large_jpeg(self):
+        """Test reduced-resolution decode of an image larger than the model input"""
+        processor = ImageProcessor(max_size_mb=5)
+        image = Image.new('RGB', (4000, 3000), color=(200, 10, 10))
+        img_bytes = io.BytesIO()
+        image.save(img_bytes, format='JPEG')
+        
+        model_input, letterbox = processor.decode_for_model(img_bytes.getvalue(), target_size=640)
+        
+        assert model_input.shape == (640, 640, 3)
+        assert letterbox["scale"] == pytest.approx(0.16)
+        assert (letterbox["pad_x"], letterbox["pad_y"]) == (0, 80)
+        assert abs(int(model_input[320, 320, 0]) - 200) < 10
+    
+    def test_scale_boxes_to_original(self):
+        """Test mapping letterboxed boxes back to original coordinates"""
+        letterbox = {
+            "scale": 0.16, "pad_x": 0, "pad_y": 80,
+            "original_width": 4000, "original_height": 3000
+        }
+        boxes = np.array([[64, 96, 128, 160], [600, 500, 700, 700]], dtype=np.float32)
+        
+        scaled = self.processor.scale_boxes(boxes, letterbox)
+        
+        assert np.allclose(scaled[0], [400, 100, 800, 500])
+        assert scaled[1, 2] == 4000  # clipped to image width
+        assert scaled[1, 3] == 3000  # clipped to image height
+    
+    def test_tile_image_covers_panel(self):
+        """Test that overlapping tiles cover every pixel of a large image"""
+        image = np.zeros((1000, 1500, 3), dtype=np.uint8)
+        
+        tiles, origins = self.processor.tile_image(image, tile_size=640, overlap=0.25)
+        
+        assert all(tile.shape == (640, 640, 3) for tile in tiles)
+        assert np.shares_memory(tiles[0], image)
+        covered = np.zeros(image.shape[:2], dtype=bool)
+        for x, y in origins:
+            covered[y:y + 640, x:x + 640] = True
+        assert covered.all()
+        assert origins[:, 0].max() == 1500 - 640
+        assert origins[:, 1].max() == 1000 - 640
+    
+    def test_tile_image_pads_small_image(self):
+        """Test that an image smaller than a tile becomes one padded tile"""
+        image = np.full((300, 400, 3), 7, dtype=np.uint8)
+        
+        tiles, origins = self.processor.tile_image(image, tile_size=640)
+        
+        assert len(tiles) == 1
+        assert origins.tolist() == [[0, 0]]
+        assert tiles[0][299, 399, 0] == 7
+        assert tiles[0][639, 639, 0] == 114
+    
     def test_get_image_info(self):
         """Test image information extraction"""
         image_array = np.random.randint(0, 255, (100, 150, 3), dtype=np.uint8)
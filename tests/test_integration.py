@@ -107,6 +107,167 @@ class TestIntegration:
         assert "model_info" in service_info
         assert "config" in service_info
         assert service_info["service_status"] == "ready"
+        assert "batching" in service_info
+    
+    def test_service_concurrent_predictions_share_batch(self):
+        """Test that concurrent single predictions are coalesced into one forward pass"""
+        import asyncio
+        import io
+        from fastapi import UploadFile
+        from PIL import Image
+        
+        service = DefectDetectionService()
+        image_bytes = io.BytesIO()
+        Image.new('RGB', (64, 64), color='green').save(image_bytes, format='JPEG')
+        
+        async def run():
+            uploads = [
+                UploadFile(file=io.BytesIO(image_bytes.getvalue()), filename=f"board{i}.jpg")
+                for i in range(4)
+            ]
+            return await asyncio.gather(*(service.predict_single(f) for f in uploads))
+        
+        responses = asyncio.run(run())
+        
+        assert all(r["total_defects"] == 2 for r in responses)
+        stats = service.get_service_info()["batching"]
+        assert stats["requests_processed"] == 4
+        assert stats["batches_run"] < 4
+    
+    def test_service_batch_pipeline_isolates_errors(self):
+        """Test that the batch pipeline keeps per-file errors and ordering"""
+        import asyncio
+        import io
+        from fastapi import UploadFile
+        from PIL import Image
+        
+        service = DefectDetectionService()
+        image_bytes = io.BytesIO()
+        Image.new('RGB', (64, 48), color='blue').save(image_bytes, format='PNG')
+        payloads = [image_bytes.getvalue(), b"not an image", image_bytes.getvalue()]
+        
+        async def run():
+            uploads = [
+                UploadFile(file=io.BytesIO(data), filename=f"board{i}.png")
+                for i, data in enumerate(payloads)
+            ]
+            return await service.predict_batch(uploads)
+        
+        response = asyncio.run(run())
+        results = response["batch_results"]
+        
+        assert [r["filename"] for r in results] == ["board0.png", "board1.png", "board2.png"]
+        assert "error" in results[1] and results[1]["total_defects"] == 0
+        assert results[0]["image_info"]["width"] == 64
+        assert results[0]["image_info"]["height"] == 48
+        box = results[0]["predictions"][0]["bounding_box"]
+        assert 0 <= box["x_min"] < box["x_max"] <= 64
+        assert 0 <= box["y_min"] < box["y_max"] <= 48
+        assert response["summary"]["successful_predictions"] == 2
+        assert response["summary"]["failed_predictions"] == 1
+        assert service.get_service_info()["executor"]["stages"]["inference"]["completed"] == 1
+    
+    def test_service_result_cache_and_batch_dedup(self):
+        """Test that duplicate uploads are computed once and repeats hit the cache"""
+        import asyncio
+        import io
+        from fastapi import UploadFile
+        from PIL import Image
+        
+        service = DefectDetectionService()
+        image_bytes = io.BytesIO()
+        Image.new('RGB', (32, 32), color='white').save(image_bytes, format='PNG')
+        data = image_bytes.getvalue()
+        
+        async def run():
+            batch = [UploadFile(file=io.BytesIO(data), filename=f"dup{i}.png") for i in range(3)]
+            batch_response = await service.predict_batch(batch)
+            single = await service.predict_single(UploadFile(file=io.BytesIO(data), filename="again.png"))
+            return batch_response, single
+        
+        batch_response, single = asyncio.run(run())
+        
+        assert [r["filename"] for r in batch_response["batch_results"]] == ["dup0.png", "dup1.png", "dup2.png"]
+        assert batch_response["summary"]["successful_predictions"] == 3
+        assert single["total_defects"] == batch_response["batch_results"][0]["total_defects"]
+        
+        info = service.get_service_info()
+        assert info["executor"]["stages"]["decode"]["completed"] == 1
+        assert info["executor"]["stages"]["inference"]["completed"] == 1
+        assert info["result_cache"]["hits"] == 1
+    
+    def test_service_batch_stream(self):
+        """Test that streamed batch results end with the batch summary"""
+        import asyncio
+        import io
+        from fastapi import UploadFile
+        from PIL import Image
+        
+        service = DefectDetectionService()
+        image_bytes = io.BytesIO()
+        Image.new('RGB', (64, 64), color='green').save(image_bytes, format='JPEG')
+        
+        async def run():
+            uploads = [
+                UploadFile(file=io.BytesIO(image_bytes.getvalue()), filename="good.jpg"),
+                UploadFile(file=io.BytesIO(b"not an image"), filename="bad.jpg")
+            ]
+            return [record async for record in service.predict_batch_stream(uploads)]
+        
+        records = asyncio.run(run())
+        
+        assert len(records) == 3
+        assert sorted(r["index"] for r in records[:2]) == [0, 1]
+        assert "error" in next(r for r in records if r.get("filename") == "bad.jpg")
+        summary = records[-1]["summary"]
+        assert summary["total_images"] == 2
+        assert summary["successful_predictions"] == 1
+        assert summary["failed_predictions"] == 1
+        assert summary["total_defects_found"] == 2
+    
+    def test_service_tiled_prediction(self):
+        """Test tiled inference maps merged boxes into full panel coordinates"""
+        import asyncio
+        import io
+        from PIL import Image
+        
+        service = DefectDetectionService()
+        image_bytes = io.BytesIO()
+        Image.new('RGB', (1500, 1000), color='green').save(image_bytes, format='JPEG')
+        tiling = service.resolve_tiling(tile_size=640, overlap=0.25, tile_batch_size=4)
+        
+        response = asyncio.run(service.predict_image_bytes(image_bytes.getvalue(), "panel.jpg", tiling))
+        
+        assert response["tiling"]["tiles"] == 6
+        assert response["tiling"]["tile_batch_size"] == 4
+        assert response["image_info"]["width"] == 1500
+        assert response["total_defects"] == 12  # two mock detections per tile
+        for prediction in response["predictions"]:
+            bbox = prediction["bounding_box"]
+            assert 0 <= bbox["x_min"] < bbox["x_max"] <= 1500
+            assert 0 <= bbox["y_min"] < bbox["y_max"] <= 1000
+    
+    def test_service_columnar_layout(self):
+        """Test that the columnar layout carries the same detections as the object layout"""
+        import asyncio
+        import io
+        from PIL import Image
+        
+        service = DefectDetectionService()
+        image_bytes = io.BytesIO()
+        Image.new('RGB', (64, 64), color='green').save(image_bytes, format='JPEG')
+        
+        async def run():
+            objects = await service.predict_image_bytes(image_bytes.getvalue(), "board.jpg")
+            columnar = await service.predict_image_bytes(image_bytes.getvalue(), "board.jpg", layout="columnar")
+            return objects, columnar
+        
+        objects, columnar = asyncio.run(run())
+        
+        assert columnar["layout"] == "columnar"
+        assert columnar["total_defects"] == objects["total_defects"] == 2
+        assert columnar["predictions"]["class"] == [p["class"] for p in objects["predictions"]]
+        assert columnar["predictions"]["x_min"] == [p["bounding_box"]["x_min"] for p in objects["predictions"]]
     
     def test_error_handling_integration(self):
         """Test error handling across components"""
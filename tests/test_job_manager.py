@@ -0,0 +1,291 @@
+import pytest
+import asyncio
+import io
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import textwrap
+import time
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from src.services.defect_detection_service import DefectDetectionService
+from src.services.job_manager import JobManager
+from src.services.job_store import JobStore
+
+class TestJobManager:
+    """Test the asynchronous job subsystem"""
+    
+    def setup_method(self):
+        """Setup test fixtures"""
+        self.service = DefectDetectionService()
+        self.sample_image = self._create_sample_image()
+    
+    def _create_sample_image(self, size=(64, 64)):
+        """Create a sample image for testing"""
+        image = Image.new('RGB', size, color='red')
+        img_bytes = io.BytesIO()
+        image.save(img_bytes, format='JPEG')
+        return img_bytes.getvalue()
+    
+    def _create_manager(self, tmp_path, workers=2, lease_seconds=60.0):
+        """Create a job manager backed by a temporary store"""
+        store = JobStore(str(tmp_path / "jobs.db"), lease_seconds=lease_seconds)
+        return JobManager(
+            self.service,
+            store,
+            storage_path=str(tmp_path / "uploads"),
+            directory_root=str(tmp_path),
+            workers=workers
+        )
+    
+    def test_upload_job_runs_to_completion(self, tmp_path):
+        """Test submitting uploads and paging through results"""
+        manager = self._create_manager(tmp_path)
+        
+        async def run():
+            await manager.start()
+            files = [
+                UploadFile(file=io.BytesIO(self.sample_image), filename="a.jpg"),
+                UploadFile(file=io.BytesIO(b"not an image"), filename="b.jpg"),
+                UploadFile(file=io.BytesIO(self.sample_image), filename="c.jpg")
+            ]
+            submitted = await manager.submit_uploads(files)
+            await manager._queue.join()
+            first_page = await manager.get_job(submitted["job_id"], offset=0, limit=2)
+            second_page = await manager.get_job(submitted["job_id"], offset=2, limit=2)
+            await manager.stop()
+            return submitted, first_page, second_page
+        
+        submitted, first_page, second_page = asyncio.run(run())
+        
+        assert submitted["total_images"] == 3
+        assert first_page["status"] == "completed"
+        assert first_page["progress"] == {"total_images": 3, "completed": 2, "failed": 1, "pending": 0}
+        assert [r["filename"] for r in first_page["results"]] == ["a.jpg", "b.jpg"]
+        assert first_page["results"][1]["status"] == "failed"
+        assert first_page["pagination"]["next_offset"] == 2
+        assert second_page["results"][0]["result"]["total_defects"] == 2
+        assert second_page["pagination"]["next_offset"] is None
+        assert not any((tmp_path / "uploads").iterdir())
+    
+    def test_directory_job(self, tmp_path):
+        """Test queuing a server-local directory"""
+        boards = tmp_path / "boards"
+        (boards / "line1").mkdir(parents=True)
+        (boards / "line1" / "x.jpg").write_bytes(self.sample_image)
+        (boards / "y.jpg").write_bytes(self.sample_image)
+        (boards / "notes.txt").write_text("ignored")
+        manager = self._create_manager(tmp_path)
+        
+        async def run():
+            await manager.start()
+            submitted = await manager.submit_directory(str(boards))
+            await manager._queue.join()
+            job = await manager.get_job(submitted["job_id"])
+            await manager.stop()
+            return job
+        
+        job = asyncio.run(run())
+        
+        assert job["progress"]["completed"] == 2
+        assert [r["filename"] for r in job["results"]] == ["line1/x.jpg", "y.jpg"]
+        assert (boards / "y.jpg").exists()  # directory sources are never deleted
+    
+    def test_directory_outside_root_rejected(self, tmp_path):
+        """Test that directories outside the allowed root are refused"""
+        manager = self._create_manager(tmp_path / "root")
+        
+        async def run():
+            await manager.start()
+            try:
+                await manager.submit_directory(str(tmp_path))
+            finally:
+                await manager.stop()
+        
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(run())
+        
+        assert exc_info.value.status_code == 403
+    
+    def test_oversized_upload_rejected(self, tmp_path):
+        """Test that an upload over the per-file limit is refused with 413 and nothing is kept"""
+        manager = self._create_manager(tmp_path)
+        manager.max_file_bytes = len(self.sample_image)
+        
+        async def run():
+            await manager.start()
+            try:
+                files = [
+                    UploadFile(file=io.BytesIO(self.sample_image), filename="a.jpg"),
+                    UploadFile(file=io.BytesIO(self.sample_image + b"\0"), filename="b.jpg")
+                ]
+                await manager.submit_uploads(files)
+            finally:
+                await manager.stop()
+        
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(run())
+        
+        assert exc_info.value.status_code == 413
+        assert not any((tmp_path / "uploads").iterdir())
+    
+    def test_oversized_directory_image_fails(self, tmp_path):
+        """Test that directory images over the per-file limit fail without being read"""
+        boards = tmp_path / "boards"
+        boards.mkdir()
+        (boards / "big.jpg").write_bytes(self.sample_image + b"\0")
+        (boards / "ok.jpg").write_bytes(self.sample_image)
+        manager = self._create_manager(tmp_path)
+        manager.max_file_bytes = len(self.sample_image)
+        
+        async def run():
+            await manager.start()
+            submitted = await manager.submit_directory(str(boards))
+            await manager._queue.join()
+            job = await manager.get_job(submitted["job_id"])
+            await manager.stop()
+            return job
+        
+        job = asyncio.run(run())
+        
+        assert job["progress"]["completed"] == 1
+        assert job["progress"]["failed"] == 1
+        assert job["results"][0]["result"]["status_code"] == 413
+    
+    def test_pending_items_resume_after_restart(self, tmp_path):
+        """Test that unfinished items are picked up by a new manager"""
+        image_path = tmp_path / "board.jpg"
+        image_path.write_bytes(self.sample_image)
+        store = JobStore(str(tmp_path / "jobs.db"))
+        store.create_job("job1", "directory", [("board.jpg", str(image_path))])
+        store.close()
+        
+        manager = self._create_manager(tmp_path)
+        
+        async def run():
+            await manager.start()
+            await manager._queue.join()
+            job = await manager.get_job("job1")
+            await manager.stop()
+            return job
+        
+        job = asyncio.run(run())
+        
+        assert job["status"] == "completed"
+        assert job["progress"]["completed"] == 1
+    
+    def test_items_of_a_live_worker_are_left_alone(self, tmp_path):
+        """Test that a manager does not take items another running worker owns"""
+        image_path = tmp_path / "board.jpg"
+        image_path.write_bytes(self.sample_image)
+        store = JobStore(str(tmp_path / "jobs.db"), owner=os.getppid())
+        store.create_job("job1", "directory", [("board.jpg", str(image_path))])
+        store.close()
+        
+        manager = self._create_manager(tmp_path)
+        
+        async def run():
+            await manager.start()
+            queued = manager._queue.qsize()
+            job = await manager.get_job("job1")
+            await manager.stop()
+            return queued, job
+        
+        queued, job = asyncio.run(run())
+        
+        assert queued == 0
+        assert job["progress"]["pending"] == 1
+    
+    def test_expired_lease_is_reclaimed(self, tmp_path):
+        """Test that items whose owner stopped renewing are taken over, and the old owner loses them"""
+        db_path = str(tmp_path / "jobs.db")
+        stalled = JobStore(db_path, lease_seconds=0.0, owner=os.getppid())
+        stalled.create_job("job1", "directory", [("a.jpg", "a.jpg"), ("b.jpg", "b.jpg")])
+        assert stalled.claim_item("job1", 0)
+        assert stalled.get_results("job1")[0]["status"] == "running"
+        
+        store = JobStore(db_path)
+        reclaimed = store.reclaim_items(lambda pid: True)
+        
+        assert [item[:2] for item in reclaimed] == [("job1", 0), ("job1", 1)]
+        assert not stalled.claim_item("job1", 1)
+        assert stalled.complete_item("job1", 0, "done", {}) is None
+        assert store.claim_item("job1", 0)
+        assert store.complete_item("job1", 0, "done", {}) is False
+        assert store.get_job("job1")["progress"]["pending"] == 1
+        stalled.close()
+        store.close()
+    
+    def test_database_from_an_earlier_version_is_migrated(self, tmp_path):
+        """Test that items stored before ownership was recorded are picked up"""
+        db_path = str(tmp_path / "jobs.db")
+        conn = sqlite3.connect(db_path)
+        conn.executescript("""
+            CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, source TEXT NOT NULL,
+                               total INTEGER NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL);
+            CREATE TABLE job_items (job_id TEXT NOT NULL, idx INTEGER NOT NULL, filename TEXT NOT NULL,
+                                    path TEXT NOT NULL, status TEXT NOT NULL, result TEXT,
+                                    PRIMARY KEY (job_id, idx));
+            INSERT INTO jobs VALUES ('job1', 'running', 'directory', 1, 0, 0);
+            INSERT INTO job_items VALUES ('job1', 0, 'a.jpg', 'a.jpg', 'pending', NULL);
+        """)
+        conn.close()
+        
+        store = JobStore(db_path)
+        reclaimed = store.reclaim_items(lambda pid: True)
+        store.close()
+        
+        assert reclaimed == [("job1", 0, "a.jpg", "a.jpg", "directory")]
+    
+    def test_killed_worker_items_are_reclaimed(self, tmp_path):
+        """Test that a surviving worker finishes a job whose worker was killed partway through"""
+        boards = tmp_path / "boards"
+        boards.mkdir()
+        for name in ("a.jpg", "b.jpg", "c.jpg"):
+            (boards / name).write_bytes(self.sample_image)
+        db_path = str(tmp_path / "jobs.db")
+        
+        # A worker that queues the job, finishes one image, starts another and is killed
+        worker = textwrap.dedent(f"""
+            import os, signal
+            from src.services.job_store import JobStore
+            store = JobStore({db_path!r})
+            names = ["a.jpg", "b.jpg", "c.jpg"]
+            store.create_job("job1", "directory", [(name, os.path.join({str(boards)!r}, name)) for name in names])
+            store.complete_item("job1", 0, "done", {{"total_defects": 7}})
+            store.claim_item("job1", 1)
+            os.kill(os.getpid(), signal.SIGKILL)
+        """)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        manager = self._create_manager(tmp_path, lease_seconds=0.3)
+        
+        async def run():
+            await manager.start()
+            killed = await asyncio.to_thread(subprocess.run, [sys.executable, "-c", worker], cwd=root)
+            deadline = time.monotonic() + 10
+            job = await manager.get_job("job1")
+            while job["status"] != "completed" and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                job = await manager.get_job("job1")
+            await manager.stop()
+            return killed, job
+        
+        killed, job = asyncio.run(run())
+        
+        assert killed.returncode == -signal.SIGKILL
+        assert job["status"] == "completed"
+        assert job["progress"]["completed"] == 3
+        assert job["results"][0]["result"] == {"total_defects": 7}
+        assert manager.get_stats()["reclaimed_items"] == 2
+    
+    def test_unknown_job(self, tmp_path):
+        """Test polling a job id that does not exist"""
+        manager = self._create_manager(tmp_path)
+        
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(manager.get_job("missing"))
+        
+        assert exc_info.value.status_code == 404
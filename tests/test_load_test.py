@@ -0,0 +1,58 @@
+import pytest
+import json
+
+from benchmarks.load_test import compare, latency_summary, main, parse_mix
+
+class TestLoadTest:
+    """Test the load-testing benchmark suite"""
+    
+    def test_parse_mix(self):
+        """Test that endpoint weights are normalized and validated"""
+        assert parse_mix("predict=3,batch=1") == {"predict": 0.75, "batch": 0.25}
+        assert parse_mix("batch") == {"batch": 1.0}
+        with pytest.raises(ValueError):
+            parse_mix("predict=1,health=1")
+    
+    def test_latency_summary(self):
+        """Test percentile summary of latencies"""
+        summary = latency_summary([float(ms) for ms in range(1, 101)])
+        
+        assert summary["p50"] == 50.5
+        assert summary["p99"] == pytest.approx(99.01)
+        assert summary["max"] == 100.0
+        assert latency_summary([])["p95"] == 0.0
+    
+    def test_compare_flags_regressions(self):
+        """Test that slower latency or lower throughput beyond tolerance is flagged"""
+        baseline = {"throughput_rps": 100.0, "latency_ms": {"p50": 10.0, "p95": 20.0, "p99": 40.0}}
+        current = {"throughput_rps": 95.0, "latency_ms": {"p50": 10.5, "p95": 30.0, "p99": 30.0}}
+        
+        rows = {row["metric"]: row for row in compare(current, baseline, tolerance=0.1)}
+        
+        assert not rows["throughput_rps"]["regression"]
+        assert not rows["latency_ms.p50"]["regression"]
+        assert rows["latency_ms.p95"]["regression"]
+        assert not rows["latency_ms.p99"]["regression"]  # faster is never a regression
+    
+    def test_inprocess_run_writes_report(self, tmp_path):
+        """Test a short in-process run end to end, including the baseline check"""
+        output = tmp_path / "run.json"
+        args = [
+            "--duration", "0.5", "--warmup", "0", "--concurrency", "2",
+            "--width", "64", "--height", "64", "--output", str(output)
+        ]
+        
+        assert main(args) == 0
+        report = json.loads(output.read_text())
+        
+        assert report["requests"] > 0
+        assert report["errors"] == 0
+        assert set(report["endpoints"]) == {"predict", "batch"}
+        assert report["latency_ms"]["p99"] >= report["latency_ms"]["p50"] > 0
+        assert report["peak_rss_mb"] > 0
+        assert report["settings"]["transport"] == "inprocess"
+        
+        # A baseline with impossible throughput makes the run a regression
+        baseline = tmp_path / "baseline.json"
+        baseline.write_text(json.dumps({"throughput_rps": 1e9}))
+        assert main(args + ["--baseline", str(baseline)]) == 1
@@ -0,0 +1,96 @@
+import pytest
+import json
+import os
+import threading
+
+from src.utils.metrics import MetricsRegistry
+
+class TestMetrics:
+    """Test the metrics registry and Prometheus exposition"""
+    
+    def setup_method(self):
+        """Setup test fixtures"""
+        self.registry = MetricsRegistry()
+        self.requests = self.registry.counter("test_requests_total", "Requests", ("status",))
+        self.in_flight = self.registry.gauge("test_in_flight", "In flight")
+        self.latency = self.registry.histogram("test_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    
+    def test_render_text_format(self):
+        """Test counters, gauges and cumulative histogram buckets"""
+        self.requests.labels(200).inc()
+        self.requests.labels(200).inc(2)
+        self.in_flight.inc()
+        for value in (0.05, 0.5, 5.0):
+            self.latency.observe(value)
+        
+        text = self.registry.render()
+        
+        assert "# TYPE test_requests_total counter" in text
+        assert 'test_requests_total{status="200"} 3' in text
+        assert "test_in_flight 1" in text
+        assert 'test_latency_seconds_bucket{le="0.1"} 1' in text
+        assert 'test_latency_seconds_bucket{le="1"} 2' in text
+        assert 'test_latency_seconds_bucket{le="+Inf"} 3' in text
+        assert "test_latency_seconds_count 3" in text
+        assert "test_latency_seconds_sum 5.55" in text
+    
+    def test_updates_from_many_threads(self):
+        """Test that per-thread shards add up without losing increments"""
+        def work():
+            for _ in range(10_000):
+                self.requests.labels("ok").inc()
+                self.latency.observe(0.01)
+        
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        text = self.registry.render()
+        assert 'test_requests_total{status="ok"} 80000' in text
+        assert "test_latency_seconds_count 80000" in text
+    
+    def test_gauge_function_and_label_checks(self):
+        """Test scrape-time gauges and label arity validation"""
+        self.in_flight.set_function(lambda: 7)
+        
+        assert "test_in_flight 7" in self.registry.render()
+        with pytest.raises(ValueError):
+            self.requests.labels("200", "extra")
+        with pytest.raises(ValueError):
+            self.registry.counter("test_requests_total", "Duplicate")
+    
+    def test_multiprocess_merge(self, tmp_path):
+        """Test that snapshots of other workers are merged, dropping gauges of exited ones"""
+        self.requests.labels(200).inc()
+        self.in_flight.inc()
+        self.registry.start(str(tmp_path), flush_seconds=60)
+        
+        def other_worker(pid):
+            return {
+                "pid": pid,
+                "metrics": {
+                    "test_requests_total": {
+                        "type": "counter", "help": "Requests",
+                        "samples": [["", [["status", "200"]], 4]]
+                    },
+                    "test_in_flight": {
+                        "type": "gauge", "help": "In flight", "samples": [["", [], 2]]
+                    }
+                }
+            }
+        
+        live_pid = os.getppid()
+        (tmp_path / f"{live_pid}.json").write_text(json.dumps(other_worker(live_pid)))
+        (tmp_path / "999999999.json").write_text(json.dumps(other_worker(999999999)))
+        try:
+            text = self.registry.render()
+        finally:
+            self.registry.stop()
+        
+        assert 'test_requests_total{status="200"} 9' in text
+        assert "test_in_flight 3" in text
+        
+        own = json.loads((tmp_path / f"{os.getpid()}.json").read_text())
+        assert "test_in_flight" not in own["metrics"]  # final snapshot drops gauges
@@ -0,0 +1,245 @@
+import pytest
+import asyncio
+import io
+import os
+import tempfile
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+from unittest.mock import patch
+
+from config import Config
+from src.models.model_registry import ModelRegistry, version_sort_key
+from src.services import defect_detection_service
+from src.services.defect_detection_service import DefectDetectionService
+
+class FakeBackend:
+    """Records whether a model was closed"""
+    
+    def __init__(self):
+        self.closed = False
+    
+    def close(self):
+        self.closed = True
+
+class FakeModel:
+    """Stand-in for YOLOModel that records forward passes"""
+    
+    def __init__(self, config):
+        self.config = config
+        self.model = FakeBackend()
+        self.predictions = 0
+    
+    def predict_batch(self, image_arrays, timeout=30):
+        self.predictions += 1
+        return [{"results": None, "inference_time": 0.0} for _ in image_arrays]
+
+class TestModelRegistry:
+    """Test on-demand loading, LRU residency and hot swapping of model versions"""
+    
+    def setup_method(self):
+        """Setup test fixtures"""
+        self.registry_dir = tempfile.mkdtemp()
+        self.loaded = []
+    
+    def _add_version(self, name, version, size=1024):
+        path = os.path.join(self.registry_dir, name, version)
+        os.makedirs(path)
+        with open(os.path.join(path, "model.onnx"), "wb") as f:
+            f.write(b"\0" * size)
+    
+    def _loader(self, config):
+        self.loaded.append((config["model"], config["version"]))
+        return FakeModel(config)
+    
+    def _registry(self, **kwargs):
+        registry = ModelRegistry(
+            {"name": "yolov5s", "backend": "onnx", "image_size": 32, "path": "models/trained_model.pt"},
+            self.registry_dir,
+            loader=self._loader,
+            **kwargs
+        )
+        registry.preload_default()
+        return registry
+    
+    def test_versions_sort_naturally(self):
+        """Test that the newest version is the default for a model that was never activated"""
+        for version in ("v2", "v10", "v9"):
+            self._add_version("boards", version)
+        registry = self._registry()
+        
+        assert registry.available_versions("boards") == ["v2", "v9", "v10"]
+        assert registry.active_version("boards") == "v10"
+        assert registry.model_names() == ["boards", "default"]
+        assert version_sort_key("1.10") > version_sort_key("1.9")
+    
+    def test_unknown_models_are_rejected(self):
+        """Test that unknown names and versions give 404 and malformed names 400"""
+        self._add_version("boards", "v1")
+        registry = self._registry()
+        
+        with pytest.raises(HTTPException) as exc_info:
+            registry.resolve("missing")
+        assert exc_info.value.status_code == 404
+        with pytest.raises(HTTPException) as exc_info:
+            registry.resolve("boards", "v2")
+        assert exc_info.value.status_code == 404
+        with pytest.raises(HTTPException) as exc_info:
+            registry.resolve("../boards", "v1")
+        assert exc_info.value.status_code == 400
+    
+    def test_concurrent_requests_load_a_model_once(self):
+        """Test that requests arriving while a model loads share the load"""
+        self._add_version("boards", "v1")
+        registry = self._registry()
+        
+        async def run():
+            return await asyncio.gather(*(registry.acquire("boards") for _ in range(5)))
+        
+        entries = asyncio.run(run())
+        
+        assert self.loaded.count(("boards", "v1")) == 1
+        assert all(entry is entries[0] for entry in entries)
+        assert entries[0].leases == 5
+        # Loaded on demand, so warmed with a forward pass
+        assert entries[0].model.predictions == 1
+    
+    def test_least_recently_used_idle_model_is_evicted(self):
+        """Test that the resident limit unloads the least recently used idle model"""
+        for name in ("a", "b", "c"):
+            self._add_version(name, "v1")
+        registry = self._registry(max_resident=3)
+        
+        async def run():
+            async with registry.lease("a") as a:
+                pass
+            async with registry.lease("b"):
+                pass
+            async with registry.lease("a"):
+                pass
+            async with registry.lease("c"):
+                pass
+            return a
+        
+        a = asyncio.run(run())
+        
+        resident = [(entry["name"], entry["version"]) for entry in registry.get_stats()["resident"]]
+        assert resident == [("default", "1"), ("a", "v1"), ("c", "v1")]
+        assert registry.get_stats()["evictions"] == 1
+        assert not a.model.model.closed
+    
+    def test_memory_budget_evicts_and_leased_models_are_kept(self):
+        """Test that the memory budget is enforced without unloading models in use"""
+        self._add_version("a", "v1", size=600)
+        self._add_version("b", "v1", size=600)
+        registry = self._registry(max_resident=5, memory_budget_bytes=1000)
+        
+        async def run():
+            async with registry.lease("a"):
+                with pytest.raises(HTTPException) as exc_info:
+                    await registry.acquire("b")
+                assert exc_info.value.status_code == 503
+            return await registry.acquire("b")
+        
+        b = asyncio.run(run())
+        
+        assert b.name == "b"
+        assert [entry["name"] for entry in registry.get_stats()["resident"]] == ["default", "b"]
+        assert registry.get_stats()["resident_bytes"] == 600
+    
+    def test_activate_swaps_after_running_requests_finish(self):
+        """Test that a running request keeps the old version until it finishes"""
+        self._add_version("boards", "v1")
+        self._add_version("boards", "v2")
+        registry = self._registry()
+        
+        async def run():
+            await registry.activate("boards", "v1")
+            old = await registry.acquire("boards")
+            
+            status = await registry.activate("boards", "v2")
+            assert status["active_version"] == "v2"
+            new = await registry.acquire("boards")
+            assert new.version == "v2"
+            assert new.model.predictions == 1
+            
+            # The running request still holds v1
+            assert old.version == "v1" and old.retired and not old.model.model.closed
+            registry.release(old)
+            registry.release(new)
+            return old
+        
+        old = asyncio.run(run())
+        
+        assert old.model.model.closed
+        assert [entry["version"] for entry in registry.get_model_status("boards")["resident"]] == ["v2"]
+        assert registry.get_stats()["swaps"] == 2
+    
+    def test_activate_default_model(self):
+        """Test that activating a registry version of the default model switches the default"""
+        self._add_version("default", "2")
+        registry = self._registry()
+        original = registry.default_model
+        
+        asyncio.run(registry.activate("default", "2"))
+        
+        assert registry.default_model is not original
+        assert registry.default_model.config["version"] == "2"
+        assert original.model.closed
+    
+    def test_worker_models_stay_within_the_memory_budget(self):
+        """Test that an inference pool worker applies the memory budget to its own copies"""
+        for version in ("v1", "v2"):
+            self._add_version("boards", version, size=600)
+        configs = [
+            {"model": "boards", "version": version, "backend": "onnx",
+             "path": os.path.join(self.registry_dir, "boards", version, "model.onnx")}
+            for version in ("v1", "v2")
+        ]
+        
+        budget_mb = 1000 / (1024 * 1024)
+        
+        with patch.dict(defect_detection_service._worker_models, clear=True):
+            with patch.object(defect_detection_service, "YOLOModel", FakeModel):
+                with patch.object(Config, "MODEL_MEMORY_BUDGET_MB", budget_mb):
+                    first = defect_detection_service._worker_model(configs[0])
+                    second = defect_detection_service._worker_model(configs[1])
+                    resident = list(defect_detection_service._worker_models)
+        
+        assert first.model.closed and not second.model.closed
+        assert resident == [("boards", "v2")]
+
+class TestModelRegistryService:
+    """Test model selection through the detection service"""
+    
+    def setup_method(self):
+        """Setup test fixtures"""
+        self.registry_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.registry_dir, "boards", "v1"))
+        open(os.path.join(self.registry_dir, "boards", "v1", "model.onnx"), "wb").close()
+        
+        image_bytes = io.BytesIO()
+        Image.new("RGB", (64, 64), color="green").save(image_bytes, format="PNG")
+        self.image_bytes = image_bytes.getvalue()
+    
+    def test_requests_select_a_model(self):
+        """Test that a named model serves the request and is cached separately"""
+        with patch.object(Config, "MODEL_REGISTRY_DIR", self.registry_dir):
+            service = DefectDetectionService()
+        
+        async def run():
+            default = await service.predict_image_bytes(self.image_bytes, "board.png")
+            named = await service.predict_image_bytes(self.image_bytes, "board.png", model_name="boards")
+            upload = UploadFile(file=io.BytesIO(self.image_bytes), filename="board.png")
+            batch = await service.predict_batch([upload], model_name="boards", model_version="v1")
+            return default, named, batch
+        
+        default, named, batch = asyncio.run(run())
+        
+        assert default["total_defects"] == named["total_defects"]
+        assert batch["batch_results"][0]["total_defects"] == named["total_defects"]
+        info = service.get_service_info()
+        assert {entry["name"] for entry in info["models"]["resident"]} == {"default", "boards"}
+        # Same image, different models: two computations
+        assert info["result_cache"]["entries"] == 2
+        assert info["batching"]["requests_processed"] == 2
+        service.shutdown()
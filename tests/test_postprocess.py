@@ -0,0 +1,127 @@
+import pytest
+import numpy as np
+
+from src.utils.postprocess import (
+    box_iou, box_overlap, nms, weighted_box_fusion, merge_tile_detections, decode_yolov5_output
+)
+from benchmarks.bench_postprocess import make_detections, naive_nms
+
+class TestPostprocess:
+    """Test detection post-processing"""
+    
+    def test_box_iou(self):
+        """Test pairwise IoU of xyxy boxes"""
+        boxes_a = np.array([[0, 0, 10, 10], [20, 20, 30, 30]])
+        boxes_b = np.array([[0, 0, 10, 10], [5, 0, 15, 10]])
+        
+        iou = box_iou(boxes_a, boxes_b)
+        
+        assert iou.shape == (2, 2)
+        assert iou[0, 0] == pytest.approx(1.0)
+        assert iou[0, 1] == pytest.approx(50 / 150)
+        assert iou[1, 0] == 0
+    
+    def test_box_iou_batched(self):
+        """Test IoU matrices over a leading batch dimension"""
+        boxes_a = np.array([[[0, 0, 10, 10]], [[0, 0, 20, 20]]])
+        boxes_b = np.array([[[0, 0, 10, 10], [0, 0, 5, 10]], [[0, 0, 10, 10], [0, 0, 20, 20]]])
+        
+        iou = box_iou(boxes_a, boxes_b)
+        
+        assert iou.shape == (2, 1, 2)
+        assert np.allclose(iou, [[[1.0, 0.5]], [[0.25, 1.0]]])
+    
+    def test_box_overlap_ios(self):
+        """Test intersection over the smaller box for partial boxes at tile borders"""
+        full = np.array([[0, 0, 100, 100]])
+        partial = np.array([[60, 0, 100, 100]])
+        
+        assert box_overlap(full, partial, "iou")[0, 0] == pytest.approx(0.4)
+        assert box_overlap(full, partial, "ios")[0, 0] == pytest.approx(1.0)
+        with pytest.raises(ValueError):
+            box_overlap(full, partial, "dice")
+    
+    def test_nms_matches_naive_loop(self):
+        """Test that vectorized NMS keeps exactly what greedy per-box NMS keeps"""
+        boxes, scores, classes = make_detections(1500, panel_size=2000, seed=3)
+        
+        keep = nms(boxes, scores, 0.45, classes=classes)
+        
+        assert keep.tolist() == naive_nms(boxes, scores, 0.45, classes)
+    
+    def test_nms_empty(self):
+        """Test NMS with no boxes"""
+        assert nms(np.zeros((0, 4)), np.zeros(0)).tolist() == []
+    
+    def test_weighted_box_fusion(self):
+        """Test that overlapping same-class boxes are fused by score weight"""
+        boxes = np.array([[0, 0, 10, 10], [2, 0, 12, 10], [50, 50, 60, 60], [0, 0, 10, 10]])
+        scores = np.array([0.9, 0.3, 0.8, 0.6])
+        classes = np.array([1, 1, 1, 2])
+        
+        fused, fused_scores, fused_classes = weighted_box_fusion(boxes, scores, classes, iou_threshold=0.5)
+        
+        assert len(fused) == 3
+        assert np.allclose(fused[1], [0.5, 0, 10.5, 10])
+        assert fused_scores.tolist() == pytest.approx([0.8, 0.6, 0.6])
+        assert fused_classes.tolist() == [1, 1, 2]
+    
+    def test_nms_class_aware(self):
+        """Test that NMS only suppresses overlapping boxes of the same class"""
+        boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [0, 0, 10, 10]])
+        scores = np.array([0.9, 0.8, 0.7])
+        classes = np.array([0, 0, 1])
+        
+        assert nms(boxes, scores, 0.5).tolist() == [0]
+        assert nms(boxes, scores, 0.5, classes=classes).tolist() == [0, 2]
+    
+    def test_merge_tile_detections(self):
+        """Test shifting tile boxes to panel coordinates and merging border duplicates"""
+        tile_detections = [
+            np.array([[500, 100, 600, 200, 0.9, 4]]),
+            np.array([[4, 100, 104, 200, 0.8, 4], [600, 600, 700, 700, 0.7, 1]])
+        ]
+        origins = np.array([[0, 0], [496, 0]])
+        
+        merged = merge_tile_detections(tile_detections, origins, image_size=(1136, 650))
+        
+        assert merged.shape == (2, 6)
+        assert merged[0].tolist() == [500, 100, 600, 200, 0.9, 4]
+        assert merged[1].tolist() == [1096, 600, 1136, 650, 0.7, 1]  # clipped to the panel
+    
+    def test_merge_tile_detections_partial_box(self):
+        """Test that a defect cut by a tile border collapses into the full box"""
+        tile_detections = [
+            np.array([[600, 100, 640, 160, 0.6, 4]]),
+            np.array([[80, 100, 160, 160, 0.9, 4]])
+        ]
+        origins = np.array([[0, 0], [520, 0]])
+        
+        merged = merge_tile_detections(tile_detections, origins, image_size=(1160, 640))
+        fused = merge_tile_detections(tile_detections, origins, image_size=(1160, 640), method="wbf")
+        
+        assert merged.tolist() == [[600, 100, 680, 160, 0.9, 4]]
+        assert len(fused) == 1
+        assert fused[0, 5] == 4
+    
+    def test_merge_tile_detections_empty(self):
+        """Test merging when no tile has detections"""
+        merged = merge_tile_detections([np.zeros((0, 6))], np.array([[0, 0]]), image_size=(640, 640))
+        
+        assert merged.shape == (0, 6)
+    
+    def test_decode_yolov5_output(self):
+        """Test decoding raw (cx, cy, w, h, obj, classes) rows with class-aware NMS"""
+        raw = np.zeros((2, 4, 8), dtype=np.float32)
+        raw[0, 0] = [50, 50, 20, 20, 0.9, 0.1, 0.8, 0.1]
+        raw[0, 1] = [51, 50, 20, 20, 0.8, 0.1, 0.8, 0.1]  # duplicate of row 0
+        raw[0, 2] = [51, 50, 20, 20, 0.8, 0.9, 0.1, 0.0]  # same box, other class
+        raw[0, 3] = [10, 10, 4, 4, 0.1, 1.0, 0.0, 0.0]    # below threshold
+        
+        detections = decode_yolov5_output(raw, conf_threshold=0.25, iou_threshold=0.45)
+        
+        assert len(detections) == 2
+        assert detections[0].shape == (2, 6)
+        assert np.allclose(detections[0][0], [40, 40, 60, 60, 0.72, 1])
+        assert detections[0][1, 5] == 0
+        assert detections[1].shape == (0, 6)
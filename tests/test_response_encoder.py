@@ -0,0 +1,102 @@
+import pytest
+import json
+import numpy as np
+
+from src.utils.response_encoder import (
+    ResponseEncoder, JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, PACKED_MEDIA_TYPE
+)
+
+class TestResponseEncoder:
+    """Test response content negotiation and encoding"""
+    
+    def setup_method(self):
+        """Setup test fixtures"""
+        self.encoder = ResponseEncoder()
+        self.columnar = {
+            "predictions": {
+                "class": ["missing_hole", "spur"],
+                "class_id": [0, 4],
+                "confidence": [0.85, 0.72],
+                "x_min": [100, 300],
+                "y_min": [150, 100],
+                "x_max": [200, 350],
+                "y_max": [250, 180]
+            },
+            "total_defects": 2,
+            "inference_time_ms": 12.5,
+            "layout": "columnar",
+            "timestamp": 1640995200.0
+        }
+    
+    def test_negotiate(self):
+        """Test media type selection from Accept headers"""
+        assert self.encoder.negotiate(None) == JSON_MEDIA_TYPE
+        assert self.encoder.negotiate("*/*") == JSON_MEDIA_TYPE
+        assert self.encoder.negotiate("text/html, application/json") == JSON_MEDIA_TYPE
+        assert self.encoder.negotiate(PACKED_MEDIA_TYPE) == PACKED_MEDIA_TYPE
+        assert self.encoder.negotiate(
+            f"application/json;q=0.5, {PACKED_MEDIA_TYPE};q=0.9"
+        ) == PACKED_MEDIA_TYPE
+    
+    def test_encode_json_default(self):
+        """Test that the default encoding is compact JSON"""
+        payload = self.encoder.encode(self.columnar)
+        
+        assert json.loads(payload) == self.columnar
+        assert b": " not in payload
+    
+    def test_encode_msgpack(self):
+        """Test MessagePack round trip"""
+        msgpack = pytest.importorskip("msgpack")
+        
+        assert self.encoder.negotiate("application/x-msgpack") == MSGPACK_MEDIA_TYPE
+        payload = self.encoder.encode(self.columnar, MSGPACK_MEDIA_TYPE)
+        
+        assert msgpack.unpackb(payload) == self.columnar
+        assert len(payload) < len(self.encoder.encode(self.columnar))
+    
+    def test_encode_packed_single(self):
+        """Test packed array round trip for a single prediction"""
+        payload = self.encoder.encode(self.columnar, PACKED_MEDIA_TYPE)
+        
+        header, arrays = self.encoder.decode_packed(payload)
+        
+        assert header["total_defects"] == 2
+        assert header["detections"] == 2
+        assert header["class_names"] == {"0": "missing_hole", "4": "spur"}
+        assert "predictions" not in header
+        assert arrays["class_id"].tolist() == [0, 4]
+        assert np.allclose(arrays["confidence"], [0.85, 0.72])
+        assert arrays["boxes"].tolist() == [[100, 150, 200, 250], [300, 100, 350, 180]]
+    
+    def test_encode_packed_batch(self):
+        """Test packed arrays for a batch, including failed images and the object layout"""
+        objects = {
+            "predictions": [{
+                "class": "short",
+                "confidence": 0.9,
+                "bounding_box": {"x_min": 1, "y_min": 2, "x_max": 3, "y_max": 4}
+            }],
+            "total_defects": 1
+        }
+        batch = {
+            "batch_results": [
+                dict(self.columnar, filename="a.jpg"),
+                {"filename": "b.jpg", "error": "Invalid image file", "total_defects": 0},
+                dict(objects, filename="c.jpg")
+            ],
+            "summary": {"total_images": 3, "successful_predictions": 2}
+        }
+        
+        header, arrays = self.encoder.decode_packed(self.encoder.encode(batch, PACKED_MEDIA_TYPE))
+        
+        assert [r.get("detections") for r in header["batch_results"]] == [2, None, 1]
+        assert header["batch_results"][1]["error"] == "Invalid image file"
+        assert header["summary"]["total_images"] == 3
+        assert arrays["boxes"].tolist()[-1] == [1, 2, 3, 4]
+        assert len(arrays["confidence"]) == 3
+    
+    def test_decode_packed_rejects_other_payloads(self):
+        """Test that non-packed bodies are rejected"""
+        with pytest.raises(ValueError):
+            self.encoder.decode_packed(b"{\"predictions\": []}   ")
@@ -1,3 +1,5 @@
+import json
+import numpy as np
 import pytest
 import time
 from unittest.mock import Mock
@@ -74,6 +76,58 @@ class TestResponseFormatter:
         assert response["total_defects"] == 0
         assert len(response["predictions"]) == 0
     
+    def test_format_single_prediction_from_arrays(self):
+        """Test formatting detections given as NumPy arrays"""
+        boxes = np.array([[10.7, 20.2, 30.9, 40.1], [50, 60, 70, 80], [1, 2, 3, 4]])
+        scores = np.array([0.8, 0.3, 0.9])
+        class_ids = np.array([1, 0, 0])
+        
+        response = self.formatter.format_single_prediction(
+            (boxes, scores, class_ids, ["short", "spur"]), 0.1, {"width": 100, "height": 100}
+        )
+        
+        assert response["total_defects"] == 2
+        assert response["predictions"][0] == {
+            "class": "spur",
+            "confidence": 0.8,
+            "bounding_box": {"x_min": 10, "y_min": 20, "x_max": 30, "y_max": 40}
+        }
+        assert response["predictions"][1]["class"] == "short"
+    
+    def test_format_single_prediction_columnar(self):
+        """Test the compact columnar layout of YOLOv5-style results"""
+        mock_results = Mock()
+        mock_results.xyxy = [np.array([
+            [10, 20, 30, 40, 0.8, 1],
+            [50, 60, 70, 80, 0.3, 0],
+            [1, 2, 3, 4, 0.9, 0]
+        ])]
+        mock_results.names = {0: "short", 1: "spur"}
+        
+        response = self.formatter.format_single_prediction(mock_results, 0.1, {}, layout="columnar")
+        
+        assert response["layout"] == "columnar"
+        assert response["total_defects"] == 2
+        assert response["predictions"] == {
+            "class": ["spur", "short"],
+            "class_id": [1, 0],
+            "confidence": [0.8, 0.9],
+            "x_min": [10, 1],
+            "y_min": [20, 2],
+            "x_max": [30, 3],
+            "y_max": [40, 4]
+        }
+    
+    def test_format_single_prediction_columnar_empty(self):
+        """Test the columnar layout with nothing above the threshold"""
+        detections = (np.zeros((1, 4)), np.array([0.1]), np.array([0]), ["short"])
+        
+        response = self.formatter.format_single_prediction(detections, 0.1, {}, layout="columnar")
+        
+        assert response["total_defects"] == 0
+        assert response["predictions"]["class"] == []
+        assert response["predictions"]["x_max"] == []
+    
     def test_format_batch_prediction(self):
         """Test batch prediction formatting"""
         batch_results = [
@@ -94,6 +148,32 @@ class TestResponseFormatter:
         assert summary["failed_predictions"] == 1
         assert summary["total_defects_found"] == 3
     
+    def test_format_batch_summary_matches_batch_prediction(self):
+        """Test that the streamed summary matches the batch summary block"""
+        batch_results = [
+            {"filename": "img1.jpg", "total_defects": 2, "predictions": []},
+            {"filename": "img2.jpg", "error": "Processing failed", "total_defects": 0}
+        ]
+        
+        batch = self.formatter.format_batch_prediction(batch_results)
+        summary = self.formatter.format_batch_summary(2, 1, 2)
+        
+        assert summary["summary"] == batch["summary"]
+        assert "timestamp" in summary
+    
+    def test_stream_encodings(self):
+        """Test NDJSON and SSE record encoding"""
+        record = {"filename": "img1.jpg", "total_defects": 1}
+        
+        line = self.formatter.to_ndjson(record)
+        event = self.formatter.to_sse(record, "result")
+        
+        assert line.endswith("\n") and line.count("\n") == 1
+        assert json.loads(line) == record
+        assert event.startswith("event: result\ndata: ")
+        assert event.endswith("\n\n")
+        assert json.loads(event.split("data: ", 1)[1]) == record
+    
     def test_format_error_response(self):
         """Test error response formatting"""
         error_msg = "Test error"
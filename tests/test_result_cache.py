@@ -0,0 +1,80 @@
+import time
+
+from src.services.result_cache import ResultCache
+
+class TestResultCache:
+    """Test the content-addressed prediction result cache"""
+    
+    def setup_method(self):
+        """Setup test fixtures"""
+        self.response = {"predictions": [], "total_defects": 0, "timestamp": 1.0}
+    
+    def test_hit_and_miss_counters(self):
+        """Test lookups before and after storing a response"""
+        cache = ResultCache(max_bytes=10_000)
+        key = ResultCache.make_key(b"image", "yolov5s", 0.5)
+        
+        assert cache.get(key) is None
+        cache.put(key, self.response)
+        cached = cache.get(key)
+        
+        assert cached["total_defects"] == 0
+        assert cached["timestamp"] != 1.0  # refreshed on every hit
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+    
+    def test_key_includes_model_identity(self):
+        """Test that keys differ by model and threshold"""
+        base = ResultCache.make_key(b"image", "yolov5s", 0.5)
+        
+        assert base == ResultCache.make_key(b"image", "yolov5s", 0.5)
+        assert base != ResultCache.make_key(b"image", "yolov5m", 0.5)
+        assert base != ResultCache.make_key(b"image", "yolov5s", 0.6)
+        assert base != ResultCache.make_key(b"other", "yolov5s", 0.5)
+    
+    def test_returned_copies_are_independent(self):
+        """Test that mutating a hit does not corrupt the cache"""
+        cache = ResultCache(max_bytes=10_000)
+        cache.put("k", self.response)
+        
+        first = cache.get("k")
+        first["predictions"].append("mutated")
+        
+        assert cache.get("k")["predictions"] == []
+    
+    def test_lru_eviction_respects_byte_budget(self):
+        """Test that least recently used entries are evicted first"""
+        entry_size = len('{"predictions": [], "total_defects": 0, "timestamp": 1.0}')
+        cache = ResultCache(max_bytes=entry_size * 2)
+        
+        cache.put("a", self.response)
+        cache.put("b", self.response)
+        cache.get("a")  # "b" is now least recently used
+        cache.put("c", self.response)
+        
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        stats = cache.get_stats()
+        assert stats["evictions"] == 1
+        assert stats["bytes_used"] <= stats["max_bytes"]
+    
+    def test_ttl_expiry(self):
+        """Test that entries expire after the TTL"""
+        cache = ResultCache(max_bytes=10_000, ttl_seconds=0.01)
+        cache.put("k", self.response)
+        
+        time.sleep(0.02)
+        
+        assert cache.get("k") is None
+        assert cache.get_stats()["expirations"] == 1
+    
+    def test_disabled_cache(self):
+        """Test that a zero budget disables caching"""
+        cache = ResultCache(max_bytes=0)
+        cache.put("k", self.response)
+        
+        assert cache.get("k") is None
+        assert cache.get_stats()["enabled"] is False
@@ -0,0 +1,100 @@
+import pytest
+import json
+from PIL import Image
+
+import score_directory
+
+class TestScoreDirectory:
+    """Test the offline directory scoring CLI"""
+    
+    def setup_method(self):
+        """Setup test fixtures"""
+        self.options = ["--workers", "1", "--batch-size", "2", "--report-seconds", "60"]
+    
+    def _create_archive(self, tmp_path, count=5):
+        """Create a nested directory of boards plus one unreadable file"""
+        root = tmp_path / "archive"
+        for i in range(count):
+            folder = root / f"line{i % 2}"
+            folder.mkdir(parents=True, exist_ok=True)
+            Image.new("RGB", (128, 96), color=(i * 40, 0, 0)).save(folder / f"board_{i}.jpg")
+        (root / "line0" / "notes.txt").write_text("not an image")
+        (root / "line0" / "broken.png").write_bytes(b"not an image")
+        return root
+    
+    def _read(self, path):
+        return [json.loads(line) for line in path.read_text().splitlines()]
+    
+    def test_scores_every_image_in_order(self, tmp_path):
+        """Test records in directory order with the /predict/ response fields"""
+        root = self._create_archive(tmp_path)
+        output = tmp_path / "scores.jsonl"
+        
+        manifest = score_directory.main([str(root), "--output", str(output)] + self.options)
+        
+        records = self._read(output)
+        filenames = [record["filename"] for record in records]
+        assert filenames == sorted(filenames)
+        assert len(filenames) == 6
+        assert filenames[0] == "line0/board_0.jpg"
+        
+        broken = records[filenames.index("line0/broken.png")]
+        assert "error" in broken and broken["total_defects"] == 0
+        board = records[filenames.index("line1/board_1.jpg")]
+        assert board["total_defects"] == 2
+        assert board["image_info"]["width"] == 128
+        assert all(box["bounding_box"]["x_max"] <= 128 for box in board["predictions"])
+        
+        assert manifest["finished"]
+        assert manifest["images"] == 6 and manifest["failed"] == 1
+        assert json.loads((tmp_path / "scores.jsonl.manifest.json").read_text())["output_bytes"] == output.stat().st_size
+    
+    def test_resumes_from_the_last_checkpoint(self, tmp_path):
+        """Test that an interrupted run continues without repeating or losing images"""
+        root = self._create_archive(tmp_path)
+        output = tmp_path / "scores.jsonl"
+        args = [str(root), "--output", str(output), "--checkpoint-every", "2"] + self.options
+        
+        first = score_directory.main(args + ["--limit", "3"])
+        assert not first["finished"]
+        # A crash after the checkpoint leaves records the manifest does not cover
+        with open(output, "a") as f:
+            f.write('{"filename": "line1/board_1.jpg", "partial"')
+        
+        second = score_directory.main(args)
+        
+        filenames = [record["filename"] for record in self._read(output)]
+        assert filenames == sorted(set(filenames))
+        assert len(filenames) == 6
+        assert second["finished"] and second["images"] == 6
+    
+    def test_refuses_to_overwrite_results_without_a_checkpoint(self, tmp_path):
+        """Test that existing output is only replaced with --restart"""
+        root = self._create_archive(tmp_path, count=1)
+        output = tmp_path / "scores.jsonl"
+        output.write_text("previous results\n")
+        
+        with pytest.raises(SystemExit):
+            score_directory.main([str(root), "--output", str(output)] + self.options)
+        
+        score_directory.main([str(root), "--output", str(output), "--restart"] + self.options)
+        assert len(self._read(output)) == 2
+    
+    def test_parquet_output(self, tmp_path):
+        """Test Parquet part files with the same records"""
+        if score_directory.pyarrow is None:
+            with pytest.raises(SystemExit, match="pyarrow"):
+                score_directory.main([str(tmp_path), "--format", "parquet", "--output", str(tmp_path / "out")])
+            return
+        
+        import pyarrow.parquet
+        root = self._create_archive(tmp_path)
+        output = tmp_path / "scores.parquet"
+        
+        score_directory.main([str(root), "--format", "parquet", "--output", str(output),
+                              "--checkpoint-every", "4"] + self.options)
+        
+        table = pyarrow.parquet.read_table(str(output))
+        assert sorted(p.name for p in output.iterdir()) == ["part-00000.parquet", "part-00001.parquet"]
+        assert table.column("filename").to_pylist() == sorted(table.column("filename").to_pylist())
+        assert table.num_rows == 6
@@ -0,0 +1,74 @@
+import pytest
+import os
+import socket
+
+import serve
+from src.utils.metrics import process_memory
+
+THREAD_VARIABLES = (
+    "ORT_INTRA_OP_THREADS", "ORT_INTER_OP_THREADS", "DECODE_POOL_SIZE", "INFERENCE_POOL_SIZE",
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "PROMETHEUS_MULTIPROC_DIR"
+)
+
+class TestServe:
+    """Test the pre-fork server's worker sizing"""
+    
+    @pytest.fixture(autouse=True)
+    def clean_environment(self, monkeypatch):
+        """Start every test without thread settings and with 8 CPUs"""
+        for variable in THREAD_VARIABLES:
+            monkeypatch.delenv(variable, raising=False)
+        monkeypatch.setattr(serve, "available_cpus", lambda: 8)
+    
+    def test_workers_split_the_cpus(self, tmp_path, monkeypatch):
+        """Test that each worker's thread pools get an equal share of the CPUs"""
+        monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+        
+        threads = serve.configure_worker_threads(4)
+        
+        assert threads == 2
+        assert os.environ["ORT_INTRA_OP_THREADS"] == "2"
+        assert os.environ["ORT_INTER_OP_THREADS"] == "1"
+        assert os.environ["DECODE_POOL_SIZE"] == "2"
+        assert os.environ["OMP_NUM_THREADS"] == "1"
+    
+    def test_explicit_settings_win(self, tmp_path, monkeypatch):
+        """Test that thread counts set in the environment are kept"""
+        monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+        monkeypatch.setenv("ORT_INTRA_OP_THREADS", "6")
+        monkeypatch.setenv("INFERENCE_POOL_SIZE", "2")
+        
+        threads = serve.configure_worker_threads(2, threads=3)
+        
+        assert threads == 3
+        assert os.environ["ORT_INTRA_OP_THREADS"] == "6"
+        assert os.environ["DECODE_POOL_SIZE"] == "3"
+    
+    def test_several_workers_aggregate_metrics(self):
+        """Test that a metrics directory is created when there is more than one worker"""
+        serve.configure_worker_threads(16)
+        
+        directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+        assert os.path.isdir(directory)
+        assert os.environ["ORT_INTRA_OP_THREADS"] == "1"
+        os.rmdir(directory)
+    
+    def test_bind_socket_is_shared_with_workers(self):
+        """Test that the listening socket survives fork into the workers"""
+        sock = serve.bind_socket("127.0.0.1", 0, 16)
+        try:
+            assert sock.get_inheritable()
+            assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_ACCEPTCONN)
+        finally:
+            sock.close()
+    
+    def test_process_memory(self):
+        """Test the per-process memory report used by /info"""
+        memory = process_memory()
+        if not os.path.exists("/proc/self/smaps_rollup"):
+            assert memory == {}
+            return
+        
+        assert memory["rss_mb"] > 0
+        assert memory["pss_mb"] <= memory["rss_mb"]
+        assert process_memory(999999999) == {}
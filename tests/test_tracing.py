@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+from src.services.batch_scheduler import MicroBatchScheduler
+from src.services.executor import StageExecutor
+from src.utils.metrics import time_stage, timed_stage
+from src.utils.tracing import RequestTrace, SamplingProfiler
+
+@timed_stage("test_work")
+def _work(seconds):
+    time.sleep(seconds)
+    return seconds
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+class TestTracing:
+    """Test per-request stage traces and the sampling profiler"""
+    
+    def test_trace_collects_stages_across_pool_threads(self):
+        """Test that stages timed on executor threads land in the caller's trace"""
+        executor = StageExecutor(pool_sizes={"decode": 2})
+        
+        async def run():
+            with RequestTrace() as trace:
+                with time_stage("test_read"):
+                    await asyncio.sleep(0.01)
+                await asyncio.gather(executor.run("decode", _work, 0.01), executor.run("decode", _work, 0.01))
+            return trace
+        
+        try:
+            trace = asyncio.run(run())
+        finally:
+            executor.shutdown()
+        
+        totals = trace.totals()
+        assert totals["test_read"] >= 10
+        assert totals["test_work"] >= 20  # summed over both calls
+        assert totals["total"] >= totals["test_read"]
+        header = trace.server_timing()
+        assert header.startswith("test_read;dur=") and header.split(", ")[-1].startswith("total;dur=")
+    
+    def test_untraced_work_records_nothing(self):
+        """Test that timing without an active trace only feeds the metrics"""
+        with RequestTrace() as trace:
+            pass
+        _work(0)
+        
+        assert list(trace.totals()) == ["total"]
+    
+    def test_batch_worker_does_not_inherit_caller_trace(self):
+        """Test that the shared micro-batch worker runs outside the first caller's trace"""
+        scheduler = MicroBatchScheduler(lambda images: [_work(0) for _ in images], max_wait_ms=1)
+        
+        async def run():
+            with RequestTrace() as first:
+                await scheduler.submit("a")
+            await scheduler.submit("b")
+            return first
+        
+        first = asyncio.run(run())
+        
+        assert "test_work" not in first.totals()
+    
+    def test_profiler_collects_collapsed_stacks(self):
+        """Test that a busy function shows up in the collapsed stacks"""
+        profiler = SamplingProfiler(interval_ms=1)
+        assert profiler.start()
+        assert not SamplingProfiler().start()  # one profile at a time
+        try:
+            _spin(0.1)
+        finally:
+            profiler.stop()
+        
+        summary = profiler.summary()
+        assert summary["samples"] > 10
+        stack, count = summary["stacks"][0].rsplit(" ", 1)
+        assert stack.endswith("test_tracing.py:_spin")
+        assert int(count) > 0
+        
+        next_profiler = SamplingProfiler()
+        assert next_profiler.start()  # released for the next request
+        next_profiler.stop()
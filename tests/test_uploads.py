@@ -0,0 +1,140 @@
+import pytest
+import asyncio
+import io
+import mmap
+import tempfile
+from unittest.mock import patch
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from src.services.defect_detection_service import DefectDetectionService
+from src.utils.image_processor import ImageProcessor
+from src.utils.uploads import read_upload, release_upload, sniff_format
+
+class CountingBytesIO(io.BytesIO):
+    """BytesIO recording how many bytes were read"""
+    
+    bytes_read = 0
+    
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+class TestUploads:
+    """Test chunked upload reading"""
+    
+    def setup_method(self):
+        """Create a sample JPEG"""
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), color='green').save(buffer, format='JPEG')
+        self.jpeg = buffer.getvalue()
+        self.allowed = ("JPEG", "PNG", "BMP", "TIFF")
+    
+    def test_sniff_format(self):
+        """Test formats are identified from their leading bytes"""
+        assert sniff_format(self.jpeg) == "JPEG"
+        assert sniff_format(b"\x89PNG\r\n\x1a\n....") == "PNG"
+        assert sniff_format(b"II*\x00") == "TIFF"
+        assert sniff_format(b"GIF89a") == "GIF"
+        assert sniff_format(b"not an image") is None
+    
+    def test_read_in_memory_upload(self):
+        """Test an in-memory upload is read whole in chunks"""
+        upload = UploadFile(file=io.BytesIO(self.jpeg), filename="board.jpg")
+        
+        data = asyncio.run(read_upload(upload, 1024 * 1024, self.allowed, chunk_size=100))
+        
+        assert data == self.jpeg
+    
+    def test_rejects_before_reading_everything(self):
+        """Test reading stops at the limit and the format is checked on the first chunk"""
+        oversized = CountingBytesIO(self.jpeg + b"\0" * 1_000_000)
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(read_upload(UploadFile(file=oversized), 100_000, self.allowed, chunk_size=10_000))
+        assert exc_info.value.status_code == 413
+        assert oversized.bytes_read <= 110_000
+        
+        declared = CountingBytesIO(self.jpeg)
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(read_upload(UploadFile(file=declared, size=10 ** 9), 100_000, self.allowed))
+        assert exc_info.value.status_code == 413
+        assert declared.bytes_read == 0
+        
+        text = CountingBytesIO(b"not an image" * 100_000)
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(read_upload(UploadFile(file=text), 10 ** 7, self.allowed, chunk_size=1000))
+        assert exc_info.value.status_code == 400
+        assert text.bytes_read == 1000
+        
+        gif = io.BytesIO(b"GIF89a" + b"\0" * 100)
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(read_upload(UploadFile(file=gif), 10 ** 7, self.allowed))
+        assert "Unsupported image format: GIF" in exc_info.value.detail
+    
+    def test_spooled_upload_is_memory_mapped(self):
+        """Test an upload spooled to disk is decoded through a memory map"""
+        spooled = tempfile.SpooledTemporaryFile(max_size=10)
+        spooled.write(self.jpeg)
+        upload = UploadFile(file=spooled, size=len(self.jpeg), filename="board.jpg")
+        
+        data = asyncio.run(read_upload(upload, 1024 * 1024, self.allowed))
+        
+        assert isinstance(data, mmap.mmap)
+        assert data[:] == self.jpeg
+        image = ImageProcessor().decode_image(data)
+        assert image.shape == (48, 64, 3)
+        spooled.close()
+    
+    def test_in_memory_spooled_upload_is_read(self):
+        """Test an upload still spooled in memory is read without being written to disk"""
+        spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        spooled.write(self.jpeg)
+        upload = UploadFile(file=spooled, size=len(self.jpeg), filename="board.jpg")
+        
+        data = asyncio.run(read_upload(upload, 1024 * 1024, self.allowed))
+        
+        assert data == self.jpeg
+        assert spooled.name is None
+        spooled.close()
+    
+    def test_release_upload_unmaps(self):
+        """Test a memory-mapped upload is closed on release and other results are left alone"""
+        spooled = tempfile.SpooledTemporaryFile(max_size=10)
+        spooled.write(self.jpeg)
+        upload = UploadFile(file=spooled, size=len(self.jpeg), filename="board.jpg")
+        data = asyncio.run(read_upload(upload, 1024 * 1024, self.allowed))
+        
+        release_upload(data)
+        release_upload(self.jpeg)
+        release_upload(ValueError("failed read"))
+        
+        assert data.closed
+        spooled.close()
+    
+    def test_service_unmaps_uploads_after_the_request(self):
+        """Test the service closes memory-mapped uploads once single and batch predictions finish"""
+        service = DefectDetectionService()
+        released = []
+        
+        def spooled_upload():
+            spooled = tempfile.SpooledTemporaryFile(max_size=10)
+            spooled.write(self.jpeg)
+            return UploadFile(file=spooled, size=len(self.jpeg), filename="board.jpg")
+        
+        def record(data):
+            released.append(data)
+            release_upload(data)
+        
+        async def run():
+            await service.predict_single(spooled_upload())
+            await service.predict_batch([spooled_upload(), spooled_upload()])
+        
+        try:
+            with patch("src.services.defect_detection_service.release_upload", side_effect=record):
+                asyncio.run(run())
+        finally:
+            service.shutdown()
+        
+        assert len(released) == 3
+        assert all(isinstance(data, mmap.mmap) and data.closed for data in released)
@@ -3,6 +3,45 @@ import torch.hub
 import os
 from pathlib import Path
 
+def export_onnx(model, onnx_path='models/trained_model.onnx', imgsz=640, opset=12):
+    """
+    Export a trained YOLOv5 model to ONNX for the onnx serving backend
+    
+    The graph takes "images" of shape (batch, 3, imgsz, imgsz) in [0, 1] and
+    returns raw predictions (batch, candidates, 5 + classes); NMS runs in the
+    service. The batch axis is dynamic so micro-batches of any size fit.
+    """
+    model = model.float().eval()
+    # Detect heads return the concatenated raw grid predictions in export mode
+    for module in model.modules():
+        if type(module).__name__ == 'Detect':
+            module.export = True
+    
+    dummy = torch.zeros(1, 3, imgsz, imgsz)
+    os.makedirs(os.path.dirname(onnx_path) or '.', exist_ok=True)
+    torch.onnx.export(
+        model,
+        dummy,
+        onnx_path,
+        opset_version=opset,
+        input_names=['images'],
+        output_names=['output0'],
+        dynamic_axes={'images': {0: 'batch'}, 'output0': {0: 'batch'}}
+    )
+    
+    # Store class names the way the YOLOv5 exporter does
+    names = getattr(model, 'names', None)
+    if names:
+        import onnx
+        onnx_model = onnx.load(onnx_path)
+        entry = onnx_model.metadata_props.add()
+        entry.key = 'names'
+        entry.value = str(dict(enumerate(names)) if isinstance(names, list) else names)
+        onnx.save(onnx_model, onnx_path)
+    
+    print(f"ONNX model exported to {onnx_path}")
+    return onnx_path
+
 def train_pcb_model():
     """
     Train YOLOv5 model for PCB defect detection
@@ -40,6 +79,9 @@ def train_pcb_model():
     torch.save(model.state_dict(), model_path)
     print(f"Model saved to {model_path}")
     
+    # Export for serving with MODEL_BACKEND=onnx
+    export_onnx(model, 'models/trained_model.onnx', imgsz=640)
+    
     return model
 
 if __name__ == "__main__":